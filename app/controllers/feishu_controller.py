@@ -1,13 +1,23 @@
 from fastapi import APIRouter, Request, Response
+import asyncio
 import logging
 import lark_oapi
+from concurrent.futures import ThreadPoolExecutor
+from app.core.config import settings
 from app.core.feishu import event_dispatcher
+from app.handlers.feishu_handler import bind_event_loop
 
 # 获取 logger 实例 (使用全局配置)
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/feishu", tags=["飞书接口"])
 
+# 验签、AES 解密与事件反序列化是同步 CPU 操作，放到专用线程池中执行，避免阻塞进行中的流式输出
+_dispatch_executor = ThreadPoolExecutor(
+    max_workers=settings.FEISHU_DISPATCH_THREADS,
+    thread_name_prefix="feishu-dispatch"
+) if settings.FEISHU_DISPATCH_THREADS > 0 else None
+
 async def process_feishu_event(request: Request) -> Response:
     """
     统一的飞书事件处理入口
@@ -57,8 +67,13 @@ async def process_feishu_event(request: Request) -> Response:
         req.body = body
 
         # 5. 调用事件分发器
-        # event_dispatcher.do 会处理验签、解密、并调用注册的 handler
-        resp = event_dispatcher.do(req)
+        # event_dispatcher.do 会处理验签、解密、并调用注册的 handler (handler 再切回事件循环派发任务)
+        if _dispatch_executor is not None:
+            loop = asyncio.get_running_loop()
+            bind_event_loop(loop)
+            resp = await loop.run_in_executor(_dispatch_executor, event_dispatcher.do, req)
+        else:
+            resp = event_dispatcher.do(req)
 
         return Response(
             content=resp.content,
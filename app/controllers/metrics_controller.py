@@ -0,0 +1,29 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.core.metrics import metrics
+# 导入以注册 LLM 调用指标与组件统计
+import app.core.llm_metrics  # noqa: F401
+
+router = APIRouter(prefix="/metrics", tags=["监控指标"])
+
+
+@router.get(
+    "",
+    summary="Prometheus 指标",
+    description="以 Prometheus 文本格式导出进程内指标",
+    response_class=PlainTextResponse
+)
+async def prometheus_metrics() -> PlainTextResponse:
+    return PlainTextResponse(
+        metrics.render_prometheus(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@router.get(
+    "/json",
+    summary="JSON 指标",
+    description="以 JSON 格式导出进程内指标与各组件统计 (缓存、限流、路由)"
+)
+async def json_metrics() -> dict:
+    return metrics.dump()
@@ -0,0 +1,217 @@
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# 渲染回调：(content, finished, **extra) -> 是否更新成功
+CardRender = Callable[..., Awaitable[Any]]
+
+CARD_UPDATES = metrics.counter("card_updates_total", "Streaming card patches sent to Feishu", ("status", "final"))
+CARD_UPDATE_LATENCY = metrics.histogram(
+    "card_update_seconds", "Latency of a single streaming card patch", (),
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0)
+)
+CARD_PUSHES_COALESCED = metrics.counter("card_pushes_coalesced_total", "Intermediate contents dropped in favour of newer ones")
+
+
+class CardStreamer:
+    """
+    单张卡片的流式更新调度器
+    - 生产者调用 push() 只记录最新内容，不等待飞书接口
+    - 同一张卡片同时最多一个 update 请求在途，期间的多次 push 只保留最新一次 (latest-wins)
+    - 更新间隔根据实测的 patch 延迟自适应调整，并限制在 [min_interval, max_interval] 内
+    - finish() 等待在途请求结束后，保证发送最终内容
+    """
+
+    def __init__(self,
+                 message_id: str,
+                 render: CardRender,
+                 min_interval: float = None,
+                 max_interval: float = None,
+                 on_close: Callable[["CardStreamer"], None] = None):
+        self.message_id = message_id
+        self.render = render
+        self.min_interval = settings.CARD_STREAM_MIN_INTERVAL if min_interval is None else min_interval
+        self.max_interval = settings.CARD_STREAM_MAX_INTERVAL if max_interval is None else max_interval
+        self.interval = self.min_interval
+        self._on_close = on_close
+
+        self._pending: Optional[Tuple[str, Dict[str, Any]]] = None
+        self._latest: Tuple[str, Dict[str, Any]] = ("", {})
+        self._task: Optional[asyncio.Task] = None
+        self._in_flight = False
+        self._last_sent = 0.0
+        self._latency_ewma: Optional[float] = None
+        self._closed = False
+        self.updates = 0
+        self.coalesced = 0
+
+    def push(self, content: str, **extra):
+        """
+        提交最新内容 (非阻塞)
+        """
+        if self._closed:
+            return
+        if self._pending is not None:
+            self.coalesced += 1
+            CARD_PUSHES_COALESCED.inc()
+        self._pending = (content, extra)
+        self._latest = self._pending
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        try:
+            while self._pending is not None:
+                delay = self._last_sent + self.interval - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if self._pending is None:
+                    break
+                content, extra = self._pending
+                self._pending = None
+                self._in_flight = True
+                try:
+                    await self._send(content, False, extra)
+                finally:
+                    self._in_flight = False
+        finally:
+            self._task = None
+
+    async def _send(self, content: str, finished: bool, extra: Dict[str, Any]) -> bool:
+        started = time.monotonic()
+        try:
+            ok = await self.render(content, finished, **extra)
+            ok = ok is not False
+        except Exception as e:
+            logger.error(f"Card stream update failed for {self.message_id}: {e}")
+            ok = False
+        now = time.monotonic()
+        latency = now - started
+        self._last_sent = now
+        self.updates += 1
+        CARD_UPDATE_LATENCY.observe(latency)
+        CARD_UPDATES.inc(status="ok" if ok else "error", final=str(finished).lower())
+
+        # 自适应间隔：patch 越慢，更新越稀疏 (也给飞书单消息编辑频率留出余量)
+        if self._latency_ewma is None:
+            self._latency_ewma = latency
+        else:
+            self._latency_ewma += 0.3 * (latency - self._latency_ewma)
+        self.interval = min(self.max_interval,
+                            max(self.min_interval, self._latency_ewma * settings.CARD_STREAM_LATENCY_FACTOR))
+        return ok
+
+    async def _stop_flusher(self):
+        """
+        丢弃待发送内容；在途请求等待其完成，尚在等待间隔的则直接取消
+        """
+        self._pending = None
+        task = self._task
+        if task is None:
+            return
+        if self._in_flight:
+            await asyncio.shield(task)
+        else:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def finish(self, content: str = None, retries: int = 2, **extra) -> bool:
+        """
+        发送最终内容 (is_finished=True)，失败时重试
+        :param content: 最终内容，默认使用最后一次 push 的内容
+        """
+        if self._closed:
+            return False
+        self._closed = True
+        try:
+            await self._stop_flusher()
+            if content is None:
+                content, latest_extra = self._latest
+                extra = {**latest_extra, **extra}
+            for attempt in range(retries + 1):
+                # 与上一次更新保持最小间隔，避免触发单消息编辑频率限制
+                delay = self._last_sent + self.min_interval - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if await self._send(content, True, extra):
+                    return True
+                logger.warning(f"Final card update failed for {self.message_id} (attempt {attempt + 1})")
+            return False
+        finally:
+            self._release()
+
+    async def close(self):
+        """
+        放弃流式更新 (如生成过程出错)，不发送最终内容
+        """
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            await self._stop_flusher()
+        finally:
+            self._release()
+
+    def _release(self):
+        if self._on_close:
+            self._on_close(self)
+
+
+class CardStreamRegistry:
+    """
+    按 message_id 管理卡片流，同一张卡片只有一个调度器
+    """
+
+    def __init__(self):
+        self._streams: Dict[str, CardStreamer] = {}
+
+    def open(self, message_id: str, render: CardRender, **kwargs) -> CardStreamer:
+        existing = self._streams.get(message_id)
+        if existing is not None:
+            return existing
+        streamer = CardStreamer(message_id, render, on_close=self._remove, **kwargs)
+        self._streams[message_id] = streamer
+        return streamer
+
+    def get(self, message_id: str) -> Optional[CardStreamer]:
+        return self._streams.get(message_id)
+
+    def _remove(self, streamer: CardStreamer):
+        if self._streams.get(streamer.message_id) is streamer:
+            del self._streams[streamer.message_id]
+
+    def stats(self) -> dict:
+        return {"active_streams": len(self._streams)}
+
+
+card_streams = CardStreamRegistry()
+metrics.register_collector("card_streams", card_streams.stats)
+
+
+@asynccontextmanager
+async def card_stream(message_id: str, render: CardRender, **kwargs):
+    """
+    打开卡片流：正常退出时若未调用 finish() 则自动发送最终内容，异常退出时放弃待发送内容
+    用法:
+        async with card_stream(message_id, render) as stream:
+            async for chunk in ...:
+                stream.push(content)
+            await stream.finish(final_content)
+    """
+    streamer = card_streams.open(message_id, render, **kwargs)
+    try:
+        yield streamer
+    except BaseException:
+        await streamer.close()
+        raise
+    else:
+        await streamer.finish()
@@ -0,0 +1,164 @@
+import re
+import json
+import logging
+from typing import Dict, List, Optional, Union
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.stream_render import StreamRenderBuffer, json_escape
+
+logger = logging.getLogger(__name__)
+
+CARD_TRUNCATIONS = metrics.counter(
+    "card_payload_truncations_total", "Card payloads truncated to fit the size limit", ("template",)
+)
+
+# 超出卡片大小上限时追加的提示
+TRUNCATED_FOOTER = "> ⚠️ 内容过长，卡片中仅展示部分内容"
+REPORT_FOOTER = "> ⚠️ 内容过长，卡片中仅展示部分内容，完整报告已写入多维表格"
+
+# 字段值：普通文本，或流式场景的增量渲染缓冲区 (直接复用其已转义的片段)
+FieldValue = Union[str, StreamRenderBuffer]
+
+_SLOT_PATTERN = re.compile(r"\\u0000(\w+)\\u0000")
+
+
+def slot(name: str) -> str:
+    """
+    模板中的字段占位符，可出现在卡片任意字符串值内 (如 f"**原始提示词**：\\n{slot('prompt')}")
+    """
+    return f"\x00{name}\x00"
+
+
+def _escaped(value: Optional[FieldValue]) -> str:
+    if isinstance(value, StreamRenderBuffer):
+        return value.json_fragment()
+    return json_escape(value or "")
+
+
+def _utf8_size(escaped: str) -> int:
+    return len(escaped.encode("utf-8"))
+
+
+class CardTemplate:
+    """
+    预编译的卡片模板
+    - 静态骨架只 json.dumps 一次，按占位符切分为静态片段
+    - render() 只对动态字段做 JSON 字符串转义 (C 实现)，再与静态片段拼接
+    - 超出字节上限时截断 truncate_slot 字段并追加 overflow_footer 提示
+    """
+
+    def __init__(self,
+                 name: str,
+                 card: dict,
+                 truncate_slot: str = None,
+                 overflow_footer: str = TRUNCATED_FOOTER):
+        self.name = name
+        self.truncate_slot = truncate_slot
+        self.overflow_footer = overflow_footer
+        # 与飞书 SDK 一致使用 ensure_ascii=False，中文按 UTF-8 计 3 字节而不是 \uXXXX 的 6 字节
+        tokens = _SLOT_PATTERN.split(json.dumps(card, ensure_ascii=False))
+        self._static: List[str] = tokens[0::2]
+        self.slots: List[str] = tokens[1::2]
+        self._slot_names = frozenset(self.slots)
+        self._static_length = sum(len(part) for part in self._static)
+        if truncate_slot is not None and truncate_slot not in self.slots:
+            raise ValueError(f"Card template {name} has no slot {truncate_slot}")
+
+    def _join(self, values: Dict[str, str]) -> str:
+        parts = [self._static[0]]
+        for i, name in enumerate(self.slots):
+            parts.append(values[name])
+            parts.append(self._static[i + 1])
+        return "".join(parts)
+
+    def render(self, max_bytes: int = None, **fields: FieldValue) -> str:
+        """
+        渲染为卡片 JSON 字符串
+        :param max_bytes: 字节上限，默认 CARD_MAX_PAYLOAD_BYTES (0 表示不限制)
+        :param fields: 各占位符的值，缺省为空字符串
+        """
+        values = {name: _escaped(fields.get(name)) for name in self._slot_names}
+        if max_bytes is None:
+            max_bytes = settings.CARD_MAX_PAYLOAD_BYTES
+        # UTF-8 每个字符占 1~4 字节：字符数足够小时无需编码计算，字符数已超限时必然超限
+        length = self._static_length + sum(len(values[name]) for name in self.slots)
+        if not max_bytes or length * 4 <= max_bytes:
+            return self._join(values)
+        if length <= max_bytes:
+            payload = self._join(values)
+            if _utf8_size(payload) <= max_bytes:
+                return payload
+        if self.truncate_slot is None:
+            logger.warning(f"Card {self.name} exceeds {max_bytes} bytes and has no truncatable field")
+            return self._join(values)
+        return self._truncate(values, max_bytes)
+
+    def _truncate(self, values: Dict[str, str], max_bytes: int) -> str:
+        escaped = values[self.truncate_slot]
+        footer = json_escape(f"\n\n{self.overflow_footer}")
+        values[self.truncate_slot] = ""
+        # 截断字段可能出现多次，按出现次数计算可用字节
+        occurrences = self.slots.count(self.truncate_slot)
+        allowed = (max_bytes - _utf8_size(self._join(values))) // occurrences - _utf8_size(footer)
+
+        # 直接在已转义的文本上按 UTF-8 字节截断 (丢弃被截断的多字节字符)，再回退到完整的转义序列
+        # 字节数不小于字符数，只需编码前 allowed 个字符
+        allowed = max(allowed, 0)
+        cut = escaped[:allowed].encode("utf-8")[:allowed].decode("utf-8", errors="ignore")
+        cut = _trim_partial_escape(cut)
+        # 优先在段落/换行处截断，避免截断在句子中间
+        boundary = cut.rfind("\\n", int(len(cut) * 0.8))
+        if boundary > 0 and _is_escape_start(cut, boundary):
+            cut = cut[:boundary]
+        values[self.truncate_slot] = f"{cut}{footer}" if cut.strip() else json_escape(self.overflow_footer)
+
+        CARD_TRUNCATIONS.inc(template=self.name)
+        # 流式卡片超限后每次更新都会截断，只记 debug 日志，由指标统计次数
+        logger.debug(f"Card {self.name} truncated from {len(escaped)} to {len(cut)} escaped chars to fit {max_bytes} bytes")
+        return self._join(values)
+
+
+def _is_escape_start(escaped: str, index: int) -> bool:
+    """
+    escaped[index] 处的反斜杠是否为转义序列的开头 (前面连续反斜杠为偶数个)
+    """
+    run = 0
+    while index - run > 0 and escaped[index - run - 1] == "\\":
+        run += 1
+    return run % 2 == 0
+
+
+def _trim_partial_escape(escaped: str) -> str:
+    """
+    去掉末尾不完整的转义序列 (如被截断的 \\u00 或单独的反斜杠)
+    """
+    index = escaped.rfind("\\", max(len(escaped) - 6, 0))
+    while index >= 0 and not _is_escape_start(escaped, index):
+        index -= 1
+    if index < 0 or escaped[index] != "\\":
+        return escaped
+    length = 6 if escaped[index + 1:index + 2] == "u" else 2
+    return escaped if index + length <= len(escaped) else escaped[:index]
+
+
+class CardTemplateRegistry:
+    """
+    按名称管理卡片模板
+    """
+
+    def __init__(self):
+        self._templates: Dict[str, CardTemplate] = {}
+
+    def register(self, name: str, card: dict, **kwargs) -> CardTemplate:
+        template = CardTemplate(name, card, **kwargs)
+        self._templates[name] = template
+        return template
+
+    def get(self, name: str) -> CardTemplate:
+        return self._templates[name]
+
+    def render(self, name: str, max_bytes: int = None, **fields: FieldValue) -> str:
+        return self._templates[name].render(max_bytes=max_bytes, **fields)
+
+
+card_templates = CardTemplateRegistry()
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Optional, Dict, List, Any
 
 class Settings(BaseSettings):
     # LLM 设置
@@ -8,6 +8,47 @@ class Settings(BaseSettings):
     OPENAI_MODEL: str = "gpt-3.5-turbo"
     SILICONFLOW_VL_MODEL: str = "Qwen/Qwen3-VL-32B-Thinking"  # 默认视觉模型
 
+    # Thinking 视觉模型的思考预算：回答开始前思考超出预算时切换到非思考模型 (0 表示不限制)
+    VL_REASONING_MAX_SECONDS: float = 25.0
+    VL_REASONING_MAX_TOKENS: int = 0
+    VL_FALLBACK_MODEL: Optional[str] = "Qwen/Qwen3-VL-32B-Instruct"  # 为空则不切换，只展示思考进度
+    VL_THINKING_BUDGET: int = 0  # 大于 0 时通过 thinking_budget 参数请求上游限制思考长度 (需上游支持)
+    VL_REASONING_PROGRESS_INTERVAL: float = 1.5  # 思考进度回调的最小间隔 (秒)
+
+    # 图片预处理：视觉模型调用前缩放并重新编码
+    IMAGE_MAX_DOWNLOAD_BYTES: int = 20 * 1024 * 1024  # 超过该大小的图片拒绝处理
+    IMAGE_MAX_EDGE: int = 1568  # 最长边像素
+    IMAGE_JPEG_QUALITY: int = 85
+    IMAGE_PREPROCESS_WORKERS: int = 2
+
+    # 图片描述缓存：按预处理后图片内容的哈希缓存视觉模型的描述结果
+    IMAGE_DESC_CACHE_ENABLED: bool = True
+    IMAGE_DESC_CACHE_TTL: int = 7 * 24 * 3600  # 秒
+    IMAGE_DESC_CACHE_MAX_ENTRIES: int = 256  # 进程内 LRU 条目上限
+
+    # 多端点路由：JSON 列表，每项包含 name / base_url / api_key / models (可选，list 或 {逻辑模型: 上游模型})
+    # 未配置时使用上面的 OPENAI_BASE_URL 作为唯一端点
+    LLM_ENDPOINTS: List[Dict[str, Any]] = []
+    LLM_ROUTER_DEFAULT_LATENCY: float = 2.0  # 尚无样本的端点的假定延迟 (秒)
+    LLM_ROUTER_ERROR_PENALTY: float = 4.0  # 错误率对得分的加权系数
+    LLM_ROUTER_EXPLORE_RATE: float = 0.05  # 探索次优端点的概率
+    LLM_ROUTER_EJECT_AFTER: int = 3  # 连续失败多少次后摘除端点
+    LLM_ROUTER_EJECT_SECONDS: float = 30.0
+
+    # 模型档位：意图识别 / 分类类调用走 fast 档位，留空则使用 OPENAI_MODEL
+    LLM_FAST_MODEL: Optional[str] = None
+    LLM_FAST_MAX_TOKENS: int = 0  # fast 档位的输出 token 上限，0 表示不额外限制
+    LLM_LARGE_MODEL: Optional[str] = None
+    LLM_TASK_TIERS: Dict[str, str] = {}  # 覆盖任务档位，如 {"report_diagnosis": "large"}
+
+    # 上下文预算：超出模型上下文窗口的输入会被裁剪
+    LLM_DEFAULT_CONTEXT_LIMIT: int = 32768
+    LLM_CONTEXT_LIMITS: Dict[str, int] = {}  # 按模型覆盖，如 {"deepseek-ai/DeepSeek-V3.2": 128000}
+    LLM_CONTEXT_SAFETY_MARGIN: int = 512  # 估算误差的安全余量
+    LLM_TRUNCATION_STRATEGY: str = "oldest_first"  # oldest_first / middle
+    REPORT_SECTION_TOKEN_CAP: int = 1500  # 总结类 Prompt 超出预算时单篇日报的 token 上限，0 表示不限制
+    REPORT_TRUNCATION_STRATEGY: str = "oldest_first"  # oldest_first / proportional
+
     # 飞书设置
     FEISHU_APP_ID: Optional[str] = None
     FEISHU_APP_SECRET: Optional[str] = None
@@ -27,6 +68,110 @@ class Settings(BaseSettings):
     # Redis 设置
     REDIS_URL: str = "redis://localhost:6379/0"
 
+    # LLM 响应缓存 (仅对低温度的确定性调用生效)
+    LLM_CACHE_ENABLED: bool = False
+    LLM_CACHE_TTL: int = 3600  # 秒
+    LLM_CACHE_MAX_ENTRIES: int = 512  # 进程内 LRU 条目上限
+    LLM_CACHE_MAX_TEMPERATURE: float = 0.3  # 高于该温度的调用不缓存
+    LLM_CACHE_REDIS_ENABLED: bool = True
+
+    # 相同的并发 LLM 请求合并为一次上游调用
+    LLM_SINGLEFLIGHT_ENABLED: bool = True
+
+    # LLM 限流 (按模型：最大并发 / 每分钟请求数 / 每分钟 token 数，0 表示不限制)
+    LLM_LIMITER_ENABLED: bool = True
+    LLM_LIMITER_BACKEND: str = "local"  # local: 进程内; redis: 所有 worker/副本共享额度
+    LLM_MAX_CONCURRENCY: int = 8
+    LLM_RPM_LIMIT: int = 0
+    LLM_TPM_LIMIT: int = 0
+    LLM_MODEL_LIMITS: Dict[str, Dict[str, int]] = {}  # 按模型覆盖，如 {"deepseek-ai/DeepSeek-V3.2": {"max_concurrency": 4, "rpm": 60}}
+    LLM_LIMITER_LEASE_TTL: int = 600  # Redis 并发租约过期时间 (秒)，防止进程崩溃后槽位泄漏
+
+    # 自适应并发 (AIMD)：在固定并发上限之内，根据 429/5xx 与延迟信号动态调整
+    LLM_AIMD_ENABLED: bool = False
+    LLM_AIMD_MIN_CONCURRENCY: int = 1
+    LLM_AIMD_MAX_CONCURRENCY: int = 32  # LLM_MAX_CONCURRENCY 为 0 (不限制) 时使用的上限
+    LLM_AIMD_DECREASE_FACTOR: float = 0.7
+    LLM_AIMD_TTFT_TOLERANCE: float = 2.0  # 首 token 延迟超过基线的倍数视为突增
+    LLM_AIMD_LATENCY_CEILING: float = 120.0  # 总延迟超过该秒数视为突增
+    LLM_AIMD_COOLDOWN: float = 5.0  # 两次下调之间的最小间隔 (秒)
+
+    # 流式对冲请求：首 chunk 超过 TTFT 指定百分位仍未到达时，发起备份请求
+    LLM_HEDGE_ENABLED: bool = False
+    LLM_HEDGE_PERCENTILE: float = 95.0
+    LLM_HEDGE_INITIAL_DELAY: float = 8.0  # TTFT 样本不足时使用的触发延迟 (秒)
+    LLM_HEDGE_MIN_DELAY: float = 1.0
+
+    # 流式卡片更新：按时间合并，只发送最新内容；间隔随 patch 延迟自适应 (秒)
+    CARD_STREAM_MIN_INTERVAL: float = 0.5
+    CARD_STREAM_MAX_INTERVAL: float = 3.0
+    CARD_STREAM_LATENCY_FACTOR: float = 2.0  # 更新间隔 = patch 延迟 EWMA × 该系数
+    # 卡片 JSON 字节上限 (飞书卡片消息约 30KB，预留余量)，超出时截断正文并提示
+    CARD_MAX_PAYLOAD_BYTES: int = 28 * 1024
+    # 流式卡片实体 (CardKit)：只推送正文元素内容，客户端以打字机效果展示；需开通 cardkit:card:write 权限
+    FEISHU_STREAMING_CARD_ENABLED: bool = False
+    CARDKIT_STREAM_MIN_INTERVAL: float = 0.2  # 元素级更新的最小间隔 (秒)
+
+    # 批量调用 (chat_many)：定时任务等批处理场景的并发度与过载重试
+    LLM_BATCH_CONCURRENCY: int = 4
+    LLM_BATCH_RETRIES: int = 2
+    LLM_BATCH_RETRY_BACKOFF: float = 2.0  # 首次重试的等待秒数，之后指数增长
+
+    # 流式调用请求上游在最后一个 chunk 中返回 token 用量 (stream_options.include_usage)
+    LLM_STREAM_INCLUDE_USAGE: bool = True
+
+    # 飞书开放接口出站限流：按接口令牌桶匀速放行 (每秒请求数，0 表示不限制)
+    # 优先级：用户回复 / 最终卡片 > 流式中间更新 > 多维表格等批量请求
+    FEISHU_LIMITER_ENABLED: bool = True
+    FEISHU_LIMITER_BACKEND: str = "local"  # local: 进程内; redis: 所有 worker/副本共享额度
+    FEISHU_APP_QPS: float = 50.0  # 应用级总额度
+    FEISHU_ENDPOINT_QPS: Dict[str, float] = {
+        "im.message.create": 50.0,
+        "im.message.patch": 50.0,
+        "im.message_resource.get": 20.0,
+        "cardkit.card": 50.0,
+        "cardkit.card_element": 50.0,
+        "report.task.query": 5.0,
+        "contact.user.batch": 10.0,
+        "bitable.record.read": 20.0,
+        "bitable.record.write": 10.0,
+    }
+    FEISHU_BULK_RESERVE: float = 0.2  # 批量请求不可使用的额度比例，预留给交互请求
+    # 限流错误码：应用频率限制 / 消息发送频率限制 / 多维表格请求过多 / 多维表格写冲突
+    FEISHU_RATE_LIMIT_CODES: List[int] = [99991400, 230020, 1254290, 1254291]
+    FEISHU_RATE_LIMIT_RETRIES: int = 2
+    FEISHU_RATE_LIMIT_BACKOFF: float = 1.0  # 未返回 x-ogw-ratelimit-reset 时的首次退避秒数，之后指数增长
+
+    # 飞书事件幂等去重 (按 event_id / message_id)，TTL 覆盖飞书的重推窗口
+    EVENT_DEDUP_ENABLED: bool = True
+    EVENT_DEDUP_TTL: int = 43200  # 秒
+    EVENT_DEDUP_MAX_ENTRIES: int = 10000  # 进程内最近事件集合上限
+    EVENT_DEDUP_REDIS_ENABLED: bool = True
+
+    # 事件处理调度：全局并发上限 + 同一用户串行，排队超过上限时回复繁忙
+    DISPATCHER_MAX_WORKERS: int = 16
+    DISPATCHER_MAX_QUEUE: int = 200
+    DISPATCHER_DRAIN_TIMEOUT: float = 30.0  # 关闭时等待进行中任务的秒数
+
+    # 事件队列：local 为进程内处理；redis 为接入进程只入队 Redis Stream，由 worker 进程 (python -m app.worker) 消费
+    EVENT_QUEUE_MODE: str = "local"
+    EVENT_QUEUE_STREAM: str = "feishu:events"
+    EVENT_QUEUE_GROUP: str = "feishu-workers"
+    EVENT_QUEUE_DEAD_LETTER_STREAM: str = "feishu:events:dead"
+    EVENT_QUEUE_MAXLEN: int = 10000  # Stream 近似长度上限
+    EVENT_QUEUE_CLAIM_IDLE: float = 900.0  # 未确认超过该秒数的事件被其他 worker 认领重试 (本进程处理中的事件会定期刷新空闲时间)
+    EVENT_QUEUE_MAX_DELIVERIES: int = 3  # 超过投递次数移入死信 Stream
+
+    # 飞书回调验签 / 解密 / 反序列化使用的线程数，0 表示在事件循环中同步执行
+    FEISHU_DISPATCH_THREADS: int = 4
+
+    # 日报周报模式意图路由：关键词自动机置信度低于该值时调用 LLM 识别总结意图
+    INTENT_ROUTER_LLM_THRESHOLD: float = 0.7
+
+    # 基础模式推测执行：澄清检查与优化生成并发进行，结果先缓存，确认无需澄清后再写入卡片
+    # 需要澄清时已生成的 token 会被丢弃，默认关闭
+    SPECULATIVE_OPTIMIZATION_ENABLED: bool = False
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
@@ -0,0 +1,187 @@
+import re
+import calendar
+import datetime
+from typing import Callable, List, Optional, Tuple
+from app.core.metrics import metrics
+
+DATE_PARSE_TOTAL = metrics.counter("date_intent_parse_total", "Report date intents by parser stage", ("stage",))
+
+Date = datetime.date
+DateRange = Tuple[Date, Date]
+
+_CN_DIGITS = {"零": 0, "一": 1, "二": 2, "两": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+_WEEKDAYS = {"一": 0, "二": 1, "三": 2, "四": 3, "五": 4, "六": 5, "日": 6, "天": 6,
+             "1": 0, "2": 1, "3": 2, "4": 3, "5": 4, "6": 5, "7": 6}
+
+_NUM = r"(\d{1,2}|[一二两三四五六七八九十]{1,3})"
+# 与日期无关但含"日/周/月"字样的常用词，判断剩余文本前先移除
+_NOISE = re.compile(r"日报|周报|月报|日志")
+# 解析后仍残留这些字符时说明有未识别的日期表达，交给 LLM
+_RESIDUAL = re.compile(r"[\d天日号周月年季]|星期|礼拜")
+_CONNECTOR = re.compile(r"^\s*(?:到|至|~|～|-|—|－)\s*$")
+
+
+def _to_int(token: str) -> int:
+    """
+    解析阿拉伯数字或 99 以内的中文数字 (如 "9"、"九"、"十二"、"二十三")
+    """
+    if token.isdigit():
+        return int(token)
+    if "十" not in token:
+        return _CN_DIGITS[token]
+    tens, _, ones = token.partition("十")
+    return (_CN_DIGITS[tens] if tens else 1) * 10 + (_CN_DIGITS[ones] if ones else 0)
+
+
+def _month_range(year: int, month: int) -> DateRange:
+    return Date(year, month, 1), Date(year, month, calendar.monthrange(year, month)[1])
+
+
+def _shift_month(year: int, month: int, delta: int) -> Tuple[int, int]:
+    index = year * 12 + month - 1 + delta
+    return index // 12, index % 12 + 1
+
+
+def _past_date(today: Date, month: int, day: int, year: int = None) -> Date:
+    """
+    未写年份的日期按不晚于今天处理 (查询的都是已提交的汇报)
+    """
+    if year is not None:
+        return Date(year, month, day)
+    date = Date(today.year, month, day)
+    return date if date <= today else Date(today.year - 1, month, day)
+
+
+def _relative_day(m, today: Date) -> DateRange:
+    offset = {"今天": 0, "今日": 0, "昨天": 1, "昨日": 1, "前天": 2, "大前天": 3}[m.group(0)]
+    date = today - datetime.timedelta(days=offset)
+    return date, date
+
+
+def _recent(m, today: Date) -> DateRange:
+    n = _to_int(m.group(1))
+    if n == 0:
+        # "最近0天" 不构成有效区间
+        raise ValueError("empty recent range")
+    unit = m.group(2)
+    if "月" in unit:
+        year, month = _shift_month(today.year, today.month, -n)
+        day = min(today.day, calendar.monthrange(year, month)[1])
+        return Date(year, month, day) + datetime.timedelta(days=1), today
+    days = n * 7 if ("周" in unit or "星期" in unit) else n
+    return today - datetime.timedelta(days=days - 1), today
+
+
+def _week(m, today: Date) -> DateRange:
+    prefix, weekday = m.group(1) or "", m.group(2)
+    weeks_back = 2 if prefix == "上上" else 1 if prefix.startswith("上") else 0
+    monday = today - datetime.timedelta(days=today.weekday() + 7 * weeks_back)
+    if weekday:
+        date = monday + datetime.timedelta(days=_WEEKDAYS[weekday])
+        if not prefix and date > today:
+            # 未写"本/上"的星期几按最近一个已过去的该日处理
+            date -= datetime.timedelta(days=7)
+        return date, date
+    return monday, monday + datetime.timedelta(days=6)
+
+
+def _relative_month(m, today: Date) -> DateRange:
+    prefix = m.group(1)
+    months_back = 2 if prefix == "上上" else 1 if prefix.startswith("上") else 0
+    return _month_range(*_shift_month(today.year, today.month, -months_back))
+
+
+def _full_date(m, today: Date) -> DateRange:
+    date = Date(int(m.group(1)), int(m.group(2)), int(m.group(3)))
+    return date, date
+
+
+def _year_month(m, today: Date) -> DateRange:
+    return _month_range(int(m.group(1)), int(m.group(2)))
+
+
+def _month_day(m, today: Date) -> DateRange:
+    date = _past_date(today, _to_int(m.group(1)), _to_int(m.group(2)))
+    return date, date
+
+
+def _month(m, today: Date) -> DateRange:
+    month = _to_int(m.group(1))
+    year = today.year if month <= today.month else today.year - 1
+    return _month_range(year, month)
+
+
+def _day(m, today: Date) -> DateRange:
+    day = _to_int(m.group(1))
+    date = Date(today.year, today.month, day)
+    if date > today:
+        year, month = _shift_month(today.year, today.month, -1)
+        date = Date(year, month, day)
+    return date, date
+
+
+# 按优先级依次匹配，先匹配的片段被遮盖，避免 "上上周" 再被 "上周" 命中
+_RULES: List[Tuple["re.Pattern", Callable]] = [
+    (re.compile(rf"(?:最近|近|过去)\s*{_NUM}\s*(天|日|周|个?星期|个?礼拜|个?月)"), _recent),
+    (re.compile(r"(\d{4})\s*[年\-/.]\s*(\d{1,2})\s*[月\-/.]\s*(\d{1,2})\s*[日号]?"), _full_date),
+    (re.compile(r"(\d{4})\s*年\s*(\d{1,2})\s*月(?:份)?"), _year_month),
+    (re.compile(rf"{_NUM}\s*月\s*{_NUM}\s*[日号]?"), _month_day),
+    (re.compile(r"(?<![\d.])(\d{1,2})[\-/](\d{1,2})(?![\d.])"), _month_day),
+    (re.compile(rf"{_NUM}\s*月(?:份)?"), _month),
+    (re.compile(r"(上上|上个?|本|这个?|这一)?(?:周|星期|礼拜)([一二三四五六日天1-7])"), _week),
+    (re.compile(r"(上上|上个?|本|这个?|这一)(?:周|星期|礼拜)()"), _week),
+    (re.compile(r"(上上个?|上个?|本|这个?)月"), _relative_month),
+    (re.compile(r"大前天|前天|昨天|昨日|今天|今日"), _relative_day),
+    (re.compile(rf"{_NUM}\s*[日号]"), _day),
+]
+
+
+def parse_date_expression(text: str, now: datetime.datetime = None) -> Optional[Tuple[int, int, str]]:
+    """
+    规则解析中文 / 数字日期表达 (今天、上周三、本月、2月9号、02-09、最近7天、2月1日到5日 ...)
+    :param now: 当前时间，默认 datetime.now()
+    :return: (start_ts, end_ts, date_desc)，与 parse_report_date_intent 一致；
+             存在无法识别的日期表达、或多个日期之间不是 到/至 等区间连接时返回 None (由调用方交给 LLM)
+    """
+    today = (now or datetime.datetime.now()).date()
+    masked = _NOISE.sub(lambda m: " " * len(m.group(0)), text)
+    # (起始位置, 结束位置, 解析函数, 匹配结果, 日期范围)
+    spans: List[Tuple[int, int, Callable, "re.Match", DateRange]] = []
+    try:
+        for pattern, resolve in _RULES:
+            for m in pattern.finditer(masked):
+                spans.append((m.start(), m.end(), resolve, m, resolve(m, today)))
+            masked = pattern.sub(lambda m: " " * len(m.group(0)), masked)
+        if _RESIDUAL.search(masked):
+            return None
+
+        if not spans:
+            # 没有日期表达时默认今天 (与 LLM 提示词的约定一致)
+            start = end = today
+        else:
+            spans.sort(key=lambda span: span[0])
+            start, end = spans[0][4]
+            for prev, (next_start, _, resolve, m, (range_start, range_end)) in zip(spans, spans[1:]):
+                if not _CONNECTOR.match(text[prev[1]:next_start]):
+                    # "周一和周三" 这类并列的日期不是连续区间，交给 LLM
+                    return None
+                if resolve is _day:
+                    # "2月3号到5号" 的终点只写了日，沿用起点的年月
+                    range_start = range_end = range_start.replace(year=start.year, month=start.month)
+                elif resolve is _week and m.group(2) and not m.group(1) and prev[2] is _week and prev[3].group(2):
+                    # "上周三到周五" 的终点只写了星期几，沿用起点所在的周 (早于起点时顺延到下一周)
+                    prev_date = prev[4][0]
+                    range_start = prev_date + datetime.timedelta(days=_WEEKDAYS[m.group(2)] - prev_date.weekday())
+                    if range_start < prev_date:
+                        range_start += datetime.timedelta(days=7)
+                    range_end = range_start
+                start, end = min(start, range_start), max(end, range_end)
+    except (ValueError, KeyError):
+        # 不存在的日期 (如 2月30日)
+        return None
+
+    start_dt = datetime.datetime.combine(start, datetime.time.min)
+    end_dt = datetime.datetime.combine(end, datetime.time(23, 59, 59))
+    start_str, end_str = start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")
+    date_desc = start_str if start == end else f"{start_str} 至 {end_str}"
+    return int(start_dt.timestamp()), int(end_dt.timestamp()), date_desc
@@ -0,0 +1,118 @@
+import time
+import logging
+from collections import OrderedDict
+from typing import Iterable, List
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.redis import state_manager
+
+logger = logging.getLogger(__name__)
+
+EVENT_DEDUP_HITS = metrics.counter("feishu_event_dedup_hits_total", "Redelivered Feishu events dropped as duplicates", ("layer",))
+
+
+def event_keys(event) -> List[str]:
+    """
+    提取事件的幂等键：event_id (飞书重推时不变) 与消息事件的 message_id
+    """
+    keys = []
+    header = getattr(event, "header", None)
+    event_id = getattr(header, "event_id", None)
+    if event_id:
+        keys.append(f"event:{event_id}")
+    message = getattr(getattr(event, "event", None), "message", None)
+    message_id = getattr(message, "message_id", None)
+    if message_id:
+        keys.append(f"message:{message_id}")
+    return keys
+
+
+class EventDeduplicator:
+    """
+    飞书事件去重 (飞书未及时收到响应时会重推同一事件)
+    1. 进程内最近事件集合 (按条目数 + TTL 淘汰)，在派发任务前同步判断
+    2. Redis SET NX，多个 worker / 副本之间只有第一个认领者处理
+    任一幂等键已出现即视为重复；Redis 不可用时仅依赖进程内集合
+    """
+    KEY_PREFIX = "feishu_dedup:"
+
+    def __init__(self, ttl: int = 43200, max_entries: int = 10000, use_redis: bool = True):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.use_redis = use_redis
+        # key -> expire_at
+        self._recent: "OrderedDict[str, float]" = OrderedDict()
+        self._stats = {"claimed": 0, "local_hits": 0, "redis_hits": 0, "redis_errors": 0}
+
+    def _seen_local(self, key: str, now: float) -> bool:
+        expire_at = self._recent.get(key)
+        if expire_at is None:
+            return False
+        if expire_at <= now:
+            del self._recent[key]
+            return False
+        return True
+
+    def claim_local(self, keys: Iterable[str]) -> bool:
+        """
+        在进程内认领事件
+        :return: False 表示该事件近期已处理过 (重复)
+        """
+        keys = list(keys)
+        if not settings.EVENT_DEDUP_ENABLED or not keys:
+            return True
+        now = time.monotonic()
+        if any(self._seen_local(key, now) for key in keys):
+            self._stats["local_hits"] += 1
+            EVENT_DEDUP_HITS.inc(layer="local")
+            return False
+        for key in keys:
+            self._recent[key] = now + self.ttl
+            self._recent.move_to_end(key)
+        while len(self._recent) > self.max_entries:
+            self._recent.popitem(last=False)
+        return True
+
+    async def claim_shared(self, keys: Iterable[str]) -> bool:
+        """
+        在 Redis 中认领事件 (SET NX + TTL)
+        :return: False 表示其他 worker / 副本已认领该事件
+        """
+        keys = list(keys)
+        if not settings.EVENT_DEDUP_ENABLED or not self.use_redis or not keys:
+            self._stats["claimed"] += 1
+            return True
+        try:
+            async with state_manager.redis.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.set(f"{self.KEY_PREFIX}{key}", "1", nx=True, ex=self.ttl)
+                results = await pipe.execute()
+        except Exception as e:
+            self._stats["redis_errors"] += 1
+            logger.warning(f"Redis event dedup unavailable, relying on in-process set: {e}")
+            results = None
+        if results is not None and not all(results):
+            self._stats["redis_hits"] += 1
+            EVENT_DEDUP_HITS.inc(layer="redis")
+            return False
+        self._stats["claimed"] += 1
+        return True
+
+    async def claim(self, event) -> bool:
+        """
+        依次在进程内与 Redis 中认领事件
+        :return: True 表示首次到达，应当处理
+        """
+        keys = event_keys(event)
+        return self.claim_local(keys) and await self.claim_shared(keys)
+
+    def stats(self) -> dict:
+        return {**self._stats, "recent": len(self._recent)}
+
+
+event_dedup = EventDeduplicator(
+    ttl=settings.EVENT_DEDUP_TTL,
+    max_entries=settings.EVENT_DEDUP_MAX_ENTRIES,
+    use_redis=settings.EVENT_DEDUP_REDIS_ENABLED,
+)
+metrics.register_collector("event_dedup", event_dedup.stats)
@@ -0,0 +1,245 @@
+import os
+import time
+import socket
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Set, Tuple
+import lark_oapi
+from redis.exceptions import ResponseError
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.redis import state_manager
+from app.core.task_dispatcher import task_dispatcher
+
+logger = logging.getLogger(__name__)
+
+EVENT_QUEUE_TOTAL = metrics.counter("event_queue_total", "Events moved through the Redis Stream queue", ("op",))
+
+
+class EventQueue:
+    """
+    基于 Redis Stream 的飞书事件队列 (EVENT_QUEUE_MODE=redis)
+    - 接入进程验签、去重后 publish() 已解密的事件，立即返回
+    - worker 进程 (python -m app.worker) 以消费组读取事件，交给 task_dispatcher 按用户串行处理，处理完成后 XACK
+    - worker 崩溃时未确认的事件在空闲 claim_idle 秒后被其他 worker 认领重试，
+      投递次数达到 max_deliveries 的事件移入死信 Stream
+    - 本进程已领取但尚未处理完成的事件定期刷新空闲时间，不会因排队或长任务被重复认领
+    """
+
+    def __init__(self,
+                 stream: str = "feishu:events",
+                 group: str = "feishu-workers",
+                 dead_letter_stream: str = "feishu:events:dead",
+                 maxlen: int = 10000,
+                 claim_idle: float = 900,
+                 max_deliveries: int = 3,
+                 batch_size: int = 16):
+        self.stream = stream
+        self.group = group
+        self.dead_letter_stream = dead_letter_stream
+        self.maxlen = maxlen
+        self.claim_idle_ms = int(claim_idle * 1000)
+        self.max_deliveries = max_deliveries
+        self.batch_size = batch_size
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        # event_type -> (事件类, 处理函数)
+        self._handlers: Dict[str, Tuple[type, Callable[[object], Awaitable]]] = {}
+        # 本进程已领取、尚未确认的事件 (排队、执行中或等待重新提交)
+        self._in_flight: Set[str] = set()
+        # 调度器拒绝、等待重新提交的事件
+        self._deferred: List[Tuple[str, Dict[str, str]]] = []
+        self._stopping = False
+        self._stats = {"published": 0, "publish_errors": 0, "delivered": 0, "acked": 0,
+                       "reclaimed": 0, "dead_lettered": 0, "deferred": 0}
+
+    def register(self, event_type: str, event_cls: type, handler: Callable[[object], Awaitable]):
+        """
+        注册事件处理函数
+        :param event_type: 入队时使用的事件类型名
+        :param event_cls: lark 事件类，用于反序列化
+        """
+        self._handlers[event_type] = (event_cls, handler)
+
+    async def publish(self, event_type: str, key: str, event) -> bool:
+        """
+        事件入队
+        :param key: 串行化 key (用户 open_id)
+        :return: False 表示入队失败，调用方应在本进程内处理
+        """
+        try:
+            await state_manager.redis.xadd(
+                self.stream,
+                {"type": event_type, "key": key, "event": lark_oapi.JSON.marshal(event)},
+                maxlen=self.maxlen,
+                approximate=True
+            )
+        except Exception as e:
+            self._stats["publish_errors"] += 1
+            logger.error(f"Failed to publish {event_type} event to {self.stream}: {e}")
+            return False
+        self._stats["published"] += 1
+        EVENT_QUEUE_TOTAL.inc(op="published")
+        return True
+
+    async def ensure_group(self):
+        try:
+            await state_manager.redis.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+            logger.info(f"Created consumer group {self.group} on {self.stream}")
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def _ack(self, entry_id: str):
+        await state_manager.redis.xack(self.stream, self.group, entry_id)
+        self._stats["acked"] += 1
+        EVENT_QUEUE_TOTAL.inc(op="acked")
+
+    async def _handle(self, entry_id: str, fields: Dict[str, str]):
+        try:
+            event_type = fields.get("type")
+            if event_type not in self._handlers:
+                await self._dead_letter(entry_id, fields, f"unknown event type: {event_type}")
+                return
+            event_cls, handler = self._handlers[event_type]
+            event = lark_oapi.JSON.unmarshal(fields["event"], event_cls)
+            # 处理函数抛出异常时不确认，事件在空闲超时后被重新认领
+            await handler(event)
+            await self._ack(entry_id)
+        finally:
+            self._in_flight.discard(entry_id)
+
+    def _submit(self, entry_id: str, fields: Dict[str, str]) -> bool:
+        """
+        交给调度器处理
+        :return: False 表示调度器拒绝，事件暂存到 _deferred，下一轮重新提交
+        """
+        self._in_flight.add(entry_id)
+        accepted = task_dispatcher.submit(
+            fields.get("key") or entry_id,
+            lambda: self._handle(entry_id, fields),
+            name=f"{fields.get('type')}:{entry_id}"
+        )
+        if not accepted:
+            self._deferred.append((entry_id, fields))
+            self._stats["deferred"] += 1
+            EVENT_QUEUE_TOTAL.inc(op="deferred")
+            return False
+        self._stats["delivered"] += 1
+        EVENT_QUEUE_TOTAL.inc(op="delivered")
+        return True
+
+    def _resubmit_deferred(self) -> bool:
+        """
+        按原顺序重新提交被拒绝的事件
+        :return: 是否已全部提交
+        """
+        deferred, self._deferred = self._deferred, []
+        for index, (entry_id, fields) in enumerate(deferred):
+            if not self._submit(entry_id, fields):
+                # _submit 已把当前事件放回 _deferred，其余事件保持原顺序排在后面
+                self._deferred.extend(deferred[index + 1:])
+                return False
+        return True
+
+    async def _refresh_in_flight(self):
+        """
+        重置本进程未确认事件的空闲时间 (XCLAIM JUSTID 不增加投递次数)，
+        避免排队较久或执行较慢的事件被判定为超时而重复处理
+        """
+        if not self._in_flight:
+            return
+        await state_manager.redis.xclaim(
+            self.stream, self.group, self.consumer, min_idle_time=0,
+            message_ids=list(self._in_flight), justid=True
+        )
+
+    async def _dead_letter(self, entry_id: str, fields: Dict[str, str], reason: str):
+        redis = state_manager.redis
+        if fields:
+            await redis.xadd(self.dead_letter_stream, {**fields, "entry_id": entry_id, "reason": reason},
+                             maxlen=self.maxlen, approximate=True)
+        await redis.xack(self.stream, self.group, entry_id)
+        self._stats["dead_lettered"] += 1
+        EVENT_QUEUE_TOTAL.inc(op="dead_lettered")
+        logger.error(f"Event {entry_id} moved to {self.dead_letter_stream}: {reason}")
+
+    async def _reclaim(self):
+        """
+        认领其他 (已崩溃) consumer 长时间未确认的事件，超过投递次数的移入死信
+        """
+        redis = state_manager.redis
+        await self._refresh_in_flight()
+        pending = await redis.xpending_range(
+            self.stream, self.group, min="-", max="+", count=self.batch_size, idle=self.claim_idle_ms
+        )
+        for item in pending:
+            entry_id = item["message_id"]
+            if entry_id in self._in_flight:
+                continue
+            if item["times_delivered"] >= self.max_deliveries:
+                entries = await redis.xrange(self.stream, min=entry_id, max=entry_id)
+                fields = entries[0][1] if entries else {}
+                await self._dead_letter(entry_id, fields, f"delivered {item['times_delivered']} times")
+                continue
+            claimed = await redis.xclaim(
+                self.stream, self.group, self.consumer, min_idle_time=self.claim_idle_ms, message_ids=[entry_id]
+            )
+            for claimed_id, fields in claimed:
+                if not fields:
+                    # 已被 MAXLEN 裁剪的事件无法重试
+                    await self._ack(claimed_id)
+                    continue
+                self._stats["reclaimed"] += 1
+                EVENT_QUEUE_TOTAL.inc(op="reclaimed")
+                self._submit(claimed_id, fields)
+                if self._deferred:
+                    return
+
+    async def run(self, block_ms: int = 5000):
+        """
+        worker 主循环：读取新事件并定期认领超时未确认的事件，直到 stop()
+        """
+        await self.ensure_group()
+        logger.info(f"Consuming {self.stream} as {self.group}/{self.consumer}")
+        last_reclaim = 0.0
+        while not self._stopping:
+            try:
+                if time.monotonic() - last_reclaim >= self.claim_idle_ms / 1000 / 3:
+                    last_reclaim = time.monotonic()
+                    await self._reclaim()
+                # 只读取空闲 worker 能立即处理的数量，其余事件留在 Stream 中供其他 worker 读取
+                capacity = task_dispatcher.idle_workers if self._resubmit_deferred() else 0
+                if capacity <= 0:
+                    await asyncio.sleep(0.1)
+                    continue
+                response = await state_manager.redis.xreadgroup(
+                    self.group, self.consumer, {self.stream: ">"},
+                    count=min(capacity, self.batch_size), block=block_ms
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error reading {self.stream}: {e}", exc_info=True)
+                await asyncio.sleep(1.0)
+                continue
+            for _, entries in response or []:
+                for entry_id, fields in entries:
+                    self._submit(entry_id, fields)
+        logger.info(f"Stopped consuming {self.stream}")
+
+    def stop(self):
+        self._stopping = True
+
+    def stats(self) -> dict:
+        return dict(self._stats)
+
+
+event_queue = EventQueue(
+    stream=settings.EVENT_QUEUE_STREAM,
+    group=settings.EVENT_QUEUE_GROUP,
+    dead_letter_stream=settings.EVENT_QUEUE_DEAD_LETTER_STREAM,
+    maxlen=settings.EVENT_QUEUE_MAXLEN,
+    claim_idle=settings.EVENT_QUEUE_CLAIM_IDLE,
+    max_deliveries=settings.EVENT_QUEUE_MAX_DELIVERIES,
+)
+metrics.register_collector("event_queue", event_queue.stats)
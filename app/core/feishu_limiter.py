@@ -0,0 +1,259 @@
+import time
+import bisect
+import asyncio
+import itertools
+import logging
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.core.llm_limiter import TokenBucket
+from app.core.metrics import metrics
+from app.core.redis import state_manager
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """
+    出站请求优先级 (数值越小越优先)
+    """
+    HIGH = 0     # 用户回复、最终卡片更新
+    NORMAL = 1   # 流式卡片中间更新、图片下载
+    BULK = 2     # 多维表格读写、汇报查询等批量请求
+
+
+FEISHU_CALLS = metrics.counter("feishu_api_calls_total", "Outbound Feishu API calls", ("endpoint", "priority", "status"))
+FEISHU_WAIT = metrics.histogram(
+    "feishu_limiter_wait_seconds", "Time spent waiting for the Feishu rate limiter", ("endpoint", "priority"),
+    buckets=(0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0)
+)
+FEISHU_RATE_LIMITED = metrics.counter("feishu_rate_limited_total", "Feishu responses rejected by rate limiting", ("endpoint",))
+
+# 原子检查应用级与接口级两个令牌桶，两者都有余量时才同时扣减
+# 返回 0 表示放行，正数表示建议等待的毫秒数
+_SHARED_ACQUIRE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local wait = 0
+local levels = {}
+for i, key in ipairs(KEYS) do
+  local rate = tonumber(ARGV[(i - 1) * 2 + 1])
+  local reserve = tonumber(ARGV[(i - 1) * 2 + 2])
+  if rate > 0 then
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or rate
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(rate, tokens + (now - ts) * rate / 1000)
+    levels[i] = tokens
+    if tokens < 1 + reserve then
+      wait = math.max(wait, math.ceil((1 + reserve - tokens) * 1000 / rate))
+    end
+  end
+end
+if wait > 0 then
+  return wait
+end
+for i, key in ipairs(KEYS) do
+  if levels[i] then
+    redis.call('HSET', key, 'tokens', tostring(levels[i] - 1), 'ts', tostring(now))
+    redis.call('PEXPIRE', key, 60000)
+  end
+end
+return 0
+"""
+
+
+def _qps_bucket(qps: float) -> Optional[TokenBucket]:
+    # 桶容量为一秒的额度，避免空闲后一次性放出整分钟的突发
+    return TokenBucket(qps * 60, burst=max(qps, 1.0)) if qps > 0 else None
+
+
+def _rate_limit_reset(response) -> Optional[float]:
+    """
+    读取飞书返回的 x-ogw-ratelimit-reset 响应头 (距离额度重置的秒数)
+    """
+    raw = getattr(response, "raw", None)
+    headers = getattr(raw, "headers", None) or {}
+    for key, value in headers.items():
+        if key.lower() == "x-ogw-ratelimit-reset":
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                return None
+    return None
+
+
+def is_rate_limited(response) -> bool:
+    if getattr(response, "code", None) in settings.FEISHU_RATE_LIMIT_CODES:
+        return True
+    raw = getattr(response, "raw", None)
+    return getattr(raw, "status_code", None) == 429
+
+
+class FeishuRateLimiter:
+    """
+    飞书开放接口的出站调度器
+    - 应用级 + 接口级令牌桶，所有出站调用共享
+    - 等待者按 (优先级, 到达顺序) 准入；批量请求不能动用预留额度 (FEISHU_BULK_RESERVE)
+    - 某个接口额度不足时只阻塞该接口，其他接口的请求照常放行
+    - 响应命中限流错误码时按 x-ogw-ratelimit-reset 或指数退避暂停该接口，并重试
+    """
+
+    def __init__(self):
+        self._app_bucket = _qps_bucket(settings.FEISHU_APP_QPS)
+        self._buckets: Dict[str, Optional[TokenBucket]] = {}
+        self._blocked_until: Dict[str, float] = {}
+        self._waiters: List[Tuple[int, int, str, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._wakeup_handle: Optional[asyncio.TimerHandle] = None
+        self._shared_script = None
+        self._stats = {"acquired": 0, "rate_limited": 0, "retries": 0, "shared_fallbacks": 0}
+
+    def _bucket(self, endpoint: str) -> Optional[TokenBucket]:
+        if endpoint not in self._buckets:
+            self._buckets[endpoint] = _qps_bucket(settings.FEISHU_ENDPOINT_QPS.get(endpoint, 0))
+        return self._buckets[endpoint]
+
+    @staticmethod
+    def _reserve(bucket: Optional[TokenBucket], priority: int) -> float:
+        if bucket is None or priority < Priority.BULK:
+            return 0.0
+        return bucket.capacity * settings.FEISHU_BULK_RESERVE
+
+    def _wait_for(self, endpoint: str, priority: int) -> float:
+        wait = self._blocked_until.get(endpoint, 0.0) - time.monotonic()
+        for bucket in (self._app_bucket, self._bucket(endpoint)):
+            if bucket is not None:
+                wait = max(wait, bucket.time_until(1 + self._reserve(bucket, priority)))
+        return wait
+
+    def _wake(self):
+        self._wakeup_handle = None
+        blocked = set()
+        next_wait = None
+        index = 0
+        while index < len(self._waiters):
+            priority, _, endpoint, future = self._waiters[index]
+            if future.done():
+                del self._waiters[index]
+                continue
+            if endpoint in blocked:
+                index += 1
+                continue
+            wait = self._wait_for(endpoint, priority)
+            if wait > 0:
+                # 同一接口内保持顺序：队头未放行时，该接口后面的请求也不放行
+                blocked.add(endpoint)
+                next_wait = wait if next_wait is None else min(next_wait, wait)
+                index += 1
+                continue
+            for bucket in (self._app_bucket, self._bucket(endpoint)):
+                if bucket is not None:
+                    bucket.consume(1)
+            del self._waiters[index]
+            future.set_result(None)
+        if next_wait is not None:
+            self._wakeup_handle = asyncio.get_running_loop().call_later(next_wait, self._wake)
+
+    async def acquire(self, endpoint: str, priority: Priority = Priority.NORMAL):
+        """
+        等待调用许可
+        :param endpoint: 接口名，额度见 FEISHU_ENDPOINT_QPS
+        """
+        if not settings.FEISHU_LIMITER_ENABLED:
+            return
+        priority = Priority(priority)
+        started = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        bisect.insort(self._waiters, (int(priority), next(self._seq), endpoint, future))
+        if self._wakeup_handle is not None:
+            self._wakeup_handle.cancel()
+        self._wake()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if not future.done():
+                future.cancel()
+            raise
+        if settings.FEISHU_LIMITER_BACKEND == "redis":
+            await self._acquire_shared(endpoint, priority)
+        self._stats["acquired"] += 1
+        FEISHU_WAIT.observe(time.monotonic() - started, endpoint=endpoint, priority=priority.name.lower())
+
+    async def _acquire_shared(self, endpoint: str, priority: Priority):
+        """
+        多副本共享额度：在 Redis 令牌桶中再获取一次许可，Redis 不可用时仅使用进程内额度
+        """
+        app_qps = settings.FEISHU_APP_QPS
+        endpoint_qps = settings.FEISHU_ENDPOINT_QPS.get(endpoint, 0)
+        reserve = settings.FEISHU_BULK_RESERVE if priority >= Priority.BULK else 0.0
+        try:
+            if self._shared_script is None:
+                self._shared_script = state_manager.redis.register_script(_SHARED_ACQUIRE_SCRIPT)
+            while True:
+                wait = int(await self._shared_script(
+                    keys=["feishu_limiter:app", f"feishu_limiter:{endpoint}"],
+                    args=[app_qps, app_qps * reserve, endpoint_qps, endpoint_qps * reserve]
+                ))
+                if wait <= 0:
+                    return
+                await asyncio.sleep(min(wait / 1000, 1.0))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._stats["shared_fallbacks"] += 1
+            logger.warning(f"Redis Feishu limiter unavailable for {endpoint}, using local budget only: {e}")
+
+    def _back_off(self, endpoint: str, response, attempt: int) -> float:
+        reset = _rate_limit_reset(response)
+        delay = reset if reset is not None else settings.FEISHU_RATE_LIMIT_BACKOFF * (2 ** attempt)
+        delay = min(max(delay, 0.1), 30.0)
+        self._blocked_until[endpoint] = max(self._blocked_until.get(endpoint, 0.0), time.monotonic() + delay)
+        return delay
+
+    async def call(self,
+                   endpoint: str,
+                   fn: Callable[[], Awaitable[Any]],
+                   priority: Priority = Priority.NORMAL,
+                   retries: int = None) -> Any:
+        """
+        经限流调度后执行一次飞书 SDK 调用，命中限流错误码时退避重试
+        :param fn: 无参函数，返回 SDK 异步调用的协程 (如 lambda: client.im.v1.message.acreate(request))
+        :return: 最后一次调用的响应
+        """
+        retries = settings.FEISHU_RATE_LIMIT_RETRIES if retries is None else retries
+        priority = Priority(priority)
+        attempt = 0
+        while True:
+            await self.acquire(endpoint, priority)
+            response = await fn()
+            if not is_rate_limited(response):
+                FEISHU_CALLS.inc(endpoint=endpoint, priority=priority.name.lower(),
+                                 status="ok" if response.success() else "error")
+                return response
+            FEISHU_CALLS.inc(endpoint=endpoint, priority=priority.name.lower(), status="rate_limited")
+            FEISHU_RATE_LIMITED.inc(endpoint=endpoint)
+            self._stats["rate_limited"] += 1
+            delay = self._back_off(endpoint, response, attempt)
+            if attempt >= retries:
+                logger.warning(f"Feishu {endpoint} still rate limited after {attempt + 1} attempts: {response.code} {response.msg}")
+                return response
+            attempt += 1
+            self._stats["retries"] += 1
+            logger.warning(f"Feishu {endpoint} rate limited ({response.code}), retrying in {delay:.1f}s")
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        queued: Dict[str, int] = {}
+        for _, _, endpoint, future in self._waiters:
+            if not future.done():
+                queued[endpoint] = queued.get(endpoint, 0) + 1
+        return {
+            **self._stats,
+            "queued": queued,
+            "blocked": {e: round(t - now, 2) for e, t in self._blocked_until.items() if t > now},
+        }
+
+
+feishu_limiter = FeishuRateLimiter()
+metrics.register_collector("feishu_limiter", feishu_limiter.stats)
@@ -0,0 +1,138 @@
+import io
+import time
+import hashlib
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from PIL import Image, ImageOps
+from app.core.config import settings
+from app.core.llm_cache import LLMResponseCache
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# 图片解码/缩放/编码是 CPU 密集操作，放到独立线程池中执行，避免阻塞事件循环
+_executor = ThreadPoolExecutor(max_workers=settings.IMAGE_PREPROCESS_WORKERS, thread_name_prefix="image-preprocess")
+
+# 防止解压炸弹：超过该像素数的图片直接拒绝 (preprocess_image 返回 None)
+Image.MAX_IMAGE_PIXELS = 80_000_000
+
+# 图片描述缓存 (相同图片被重复发送时直接复用视觉模型的描述)
+image_description_cache = LLMResponseCache(
+    max_entries=settings.IMAGE_DESC_CACHE_MAX_ENTRIES,
+    ttl=settings.IMAGE_DESC_CACHE_TTL,
+    key_prefix="image_desc:",
+)
+metrics.register_collector("image_desc_cache", image_description_cache.stats)
+
+
+class ProcessedImage:
+    """
+    预处理后的图片
+    """
+
+    def __init__(self, data: bytes, mime_type: str, width: int = 0, height: int = 0, original_size: int = 0):
+        self.data = data
+        self.mime_type = mime_type
+        self.width = width
+        self.height = height
+        self.original_size = original_size
+
+    def __repr__(self) -> str:
+        return (f"ProcessedImage({self.mime_type}, {self.width}x{self.height}, "
+                f"{self.original_size} -> {len(self.data)} bytes)")
+
+
+def detect_mime_type(data: bytes) -> Optional[str]:
+    """
+    根据文件头 (magic bytes) 识别图片的真实格式
+    """
+    if data.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data.startswith(b"BM"):
+        return "image/bmp"
+    if data[4:8] == b"ftyp" and data[8:12] in (b"heic", b"heix", b"mif1", b"msf1"):
+        return "image/heic"
+    return None
+
+
+def image_cache_key(data: bytes, model: str, prompt: str) -> str:
+    """
+    图片描述缓存的 key：预处理后图片内容的 sha256 + 模型 + 描述指令
+    同一张图片经相同的预处理得到相同的字节，因此不同用户重复发送也能命中
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    scope = hashlib.sha256(f"{model}\n{prompt}".encode("utf-8")).hexdigest()[:16]
+    return f"{scope}:{digest}"
+
+
+def _preprocess_sync(data: bytes, max_edge: int, quality: int) -> Optional[ProcessedImage]:
+    mime_type = detect_mime_type(data)
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            # Pillow 在 MAX_IMAGE_PIXELS 的 1~2 倍之间只发出警告，这里统一在解码前拒绝
+            if img.width * img.height > Image.MAX_IMAGE_PIXELS:
+                raise Image.DecompressionBombError(f"{img.width}x{img.height} exceeds {Image.MAX_IMAGE_PIXELS} pixels")
+            # 动图只取首帧；按 EXIF 方向摆正 (手机照片常见)
+            img.seek(0)
+            img = ImageOps.exif_transpose(img)
+            width, height = img.size
+            resized = max(width, height) > max_edge
+            if resized:
+                img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+            if img.mode in ("RGBA", "LA", "P"):
+                # 透明背景铺白后转 JPEG
+                img = img.convert("RGBA")
+                background = Image.new("RGB", img.size, (255, 255, 255))
+                background.paste(img, mask=img.split()[-1])
+                img = background
+            elif img.mode != "RGB":
+                img = img.convert("RGB")
+
+            buffer = io.BytesIO()
+            img.save(buffer, format="JPEG", quality=quality, optimize=True)
+            encoded = buffer.getvalue()
+            width, height = img.size
+    except Image.DecompressionBombError as e:
+        logger.warning(f"Image rejected as a decompression bomb: {e}")
+        return None
+    except Exception as e:
+        # 无法解码 (如未安装 HEIC 插件) 时原样发送，交由视觉模型处理
+        logger.warning(f"Image preprocessing skipped ({mime_type or 'unknown format'}): {e}")
+        return ProcessedImage(data, mime_type or "image/jpeg", original_size=len(data))
+
+    if not resized and mime_type == "image/jpeg" and len(encoded) >= len(data):
+        # 已经足够小的 JPEG 保持原样，避免二次压缩损失画质
+        return ProcessedImage(data, mime_type, width, height, len(data))
+    return ProcessedImage(encoded, "image/jpeg", width, height, len(data))
+
+
+async def preprocess_image(data: bytes,
+                           max_edge: int = None,
+                           quality: int = None) -> Optional[ProcessedImage]:
+    """
+    视觉模型调用前的图片预处理：识别格式、按最长边缩放、以目标质量重新编码为 JPEG
+    :param max_edge: 最长边像素，默认 IMAGE_MAX_EDGE
+    :param quality: JPEG 质量，默认 IMAGE_JPEG_QUALITY
+    :return: 像素数超过 MAX_IMAGE_PIXELS 时返回 None
+    """
+    started = time.monotonic()
+    loop = asyncio.get_running_loop()
+    image = await loop.run_in_executor(
+        _executor,
+        _preprocess_sync,
+        data,
+        max_edge or settings.IMAGE_MAX_EDGE,
+        quality or settings.IMAGE_JPEG_QUALITY
+    )
+    if image is not None:
+        logger.info(f"Preprocessed image in {time.monotonic() - started:.3f}s: {image}")
+    return image
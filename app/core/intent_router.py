@@ -0,0 +1,198 @@
+import re
+import logging
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+INTENT_DECISIONS = metrics.counter("report_intent_decisions_total", "Report-mode intent decisions by stage", ("stage", "intent"))
+
+
+class KeywordAutomaton:
+    """
+    多模式关键词自动机 (Aho-Corasick)，一次扫描找出所有关键词的出现位置
+    """
+
+    def __init__(self, keywords: Iterable[Tuple[str, str]]):
+        """
+        :param keywords: (关键词, 标签) 序列，关键词按小写匹配
+        """
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[Tuple[str, str]]] = [[]]
+        for keyword, label in keywords:
+            self._add(keyword.lower(), label)
+        self._build()
+
+    def _add(self, keyword: str, label: str):
+        state = 0
+        for char in keyword:
+            if char not in self._goto[state]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[state][char] = len(self._goto) - 1
+            state = self._goto[state][char]
+        self._output[state].append((keyword, label))
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                queue.append(child)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def find_all(self, text: str) -> Iterator[Tuple[int, str, str]]:
+        """
+        :param text: 已转为小写的文本
+        :return: (起始位置, 关键词, 标签)
+        """
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for keyword, label in self._output[state]:
+                yield index - len(keyword) + 1, keyword, label
+
+
+class IntentResult:
+    """
+    意图路由结果
+    :param intent: sync / daily / weekly / monthly / none
+    :param date_info: 日期槽位 (如 "昨天"、"02-09"、"上周"、"3月")，供 parse_date_range 解析
+    :param confidence: 0~1，低于阈值时由 LLM 兜底识别
+    :param labels: 命中的全部关键词类别 (含 query / report，供查询与汇报分支复用)
+    """
+
+    def __init__(self, intent: str, date_info: str, confidence: float, labels: Set[str], matched: List[str]):
+        self.intent = intent
+        self.date_info = date_info
+        self.confidence = confidence
+        self.labels = labels
+        self.matched = matched
+
+    def has(self, label: str) -> bool:
+        return label in self.labels
+
+    def __repr__(self):
+        return (f"IntentResult(intent={self.intent!r}, date_info={self.date_info!r}, "
+                f"confidence={self.confidence}, matched={self.matched})")
+
+
+# 关键词类别 -> 关键词；同一关键词可属于多个类别
+_KEYWORDS: Dict[str, List[str]] = {
+    "sync": ["同步日报", "立即运行", "手动同步", "运行同步", "sync reports"],
+    # 明确的总结指令
+    "daily": ["日总结", "今日总结", "今天总结", "昨天总结", "前天总结"],
+    "weekly": ["周总结", "本周总结", "上周总结", "一周总结", "周报总结", "week summary", "weeksummary"],
+    "monthly": ["月总结", "本月总结", "上月总结", "month summary", "monthsummary"],
+    # 较弱的总结信号，需要结合日期槽位判断
+    "summary": ["总结", "复盘", "回顾", "汇总", "盘点", "summary"],
+    # 日期槽位
+    "day_slot": ["今天", "今日", "昨天", "昨日", "前天"],
+    "week_slot": ["本周", "这周", "这一周", "上周", "上一周", "last week", "this week"],
+    "month_slot": ["本月", "这个月", "上月", "上个月"],
+    # 查询 / 汇报内容
+    "query": ["查询", "查看", "看看", "找一下", "搜索"],
+    "report": ["完成", "计划", "做了", "待办", "今日", "明日", "思考", "逻辑", "实现"],
+}
+
+# 槽位关键词的规范化取值 (parse_date_range 可识别的写法)
+_SLOT_VALUES = {
+    "今日": "今日", "今天": "今天", "昨天": "昨天", "昨日": "昨天", "前天": "前天",
+    "本周": "本周", "这周": "本周", "这一周": "本周", "this week": "本周",
+    "上周": "上周", "上一周": "上周", "last week": "上周",
+    "本月": "本月", "这个月": "本月", "上月": "上月", "上个月": "上个月",
+}
+
+# 数字日期槽位：MM-DD / M月D日 / N月，紧跟"总结"时视为明确指令
+_NUMERIC_DATE = re.compile(r"(\d{1,2})-(\d{1,2})(总结)?|(\d{1,2})月(?:(\d{1,2})[日号])?(总结)?")
+
+_SLOT_INTENTS = {"day_slot": "daily", "week_slot": "weekly", "month_slot": "monthly"}
+_DEFAULT_DATES = {"daily": "今天", "weekly": "本周", "monthly": "本月"}
+
+# 置信度
+STRONG = 1.0        # 明确的同步 / 总结关键词
+SLOT_ONLY = 0.75    # 弱总结信号 + 单一周期的日期槽位
+AMBIGUOUS = 0.4     # 有总结信号但周期不明确，或同时像汇报内容
+SLOT_NO_SIGNAL = 0.5  # 没有总结信号，但带日期槽位且不像查询 / 汇报内容 (如"上周我干得怎么样")
+NO_SIGNAL = 0.9     # 没有总结信号也没有日期槽位：确定不是总结请求
+
+
+class IntentRouter:
+    """
+    日报周报模式的意图路由：构建一次关键词自动机，单次扫描得到意图、日期槽位与置信度
+    """
+
+    def __init__(self, keywords: Dict[str, List[str]] = None):
+        keywords = keywords or _KEYWORDS
+        self._automaton = KeywordAutomaton(
+            (keyword, label) for label, words in keywords.items() for keyword in words
+        )
+
+    def route(self, text: str) -> IntentResult:
+        normalized = " ".join(text.lower().split())
+        labels: Set[str] = set()
+        matched: List[str] = []
+        # 各周期第一次出现的日期槽位 (位置, 取值)
+        slots: Dict[str, Tuple[int, str]] = {}
+        for start, keyword, label in self._automaton.find_all(normalized):
+            labels.add(label)
+            matched.append(keyword)
+            intent = _SLOT_INTENTS.get(label)
+            if intent and (intent not in slots or start < slots[intent][0]):
+                slots[intent] = (start, _SLOT_VALUES[keyword])
+
+        for m in _NUMERIC_DATE.finditer(normalized):
+            if m.group(1):
+                intent, value, explicit = "daily", f"{m.group(1)}-{m.group(2)}", m.group(3)
+            elif m.group(5):
+                intent, value, explicit = "daily", f"{m.group(4)}月{m.group(5)}日", m.group(6)
+            else:
+                intent, value, explicit = "monthly", f"{m.group(4)}月", m.group(6)
+            if explicit:
+                labels.add(intent)
+            if intent not in slots or m.start() < slots[intent][0]:
+                slots[intent] = (m.start(), value)
+            labels.add(f"{'day' if intent == 'daily' else 'month'}_slot")
+
+        if "sync" in labels:
+            return IntentResult("sync", "", STRONG, labels, matched)
+
+        # 明确的总结指令，优先级：日 > 周 > 月
+        for intent in ("daily", "weekly", "monthly"):
+            if intent in labels:
+                date_info = slots[intent][1] if intent in slots else _DEFAULT_DATES[intent]
+                return IntentResult(intent, date_info, STRONG, labels, matched)
+
+        if "summary" not in labels:
+            # 带日期槽位的复杂表达交给 LLM 判断，查询与汇报内容由各自分支处理
+            if slots and not labels & {"query", "report"}:
+                return IntentResult("none", "", SLOT_NO_SIGNAL, labels, matched)
+            return IntentResult("none", "", NO_SIGNAL, labels, matched)
+
+        # 只有"总结"等弱信号：周期唯一且不像汇报内容时直接采用，否则交给 LLM
+        if len(slots) == 1:
+            intent, (_, date_info) = next(iter(slots.items()))
+            confidence = AMBIGUOUS if "report" in labels else SLOT_ONLY
+            return IntentResult(intent, date_info, confidence, labels, matched)
+        return IntentResult("none", "", AMBIGUOUS, labels, matched)
+
+    @staticmethod
+    def record(stage: str, result_intent: str, text: str, confidence: Optional[float] = None):
+        """
+        记录由哪个阶段做出的决策 (keyword / llm)，用于统计 LLM 兜底比例
+        """
+        INTENT_DECISIONS.inc(stage=stage, intent=result_intent)
+        logger.info(f"Report intent decided by {stage}: intent={result_intent}"
+                    f"{f', confidence={confidence}' if confidence is not None else ''}, input={text[:50]!r}")
+
+
+report_intent_router = IntentRouter()
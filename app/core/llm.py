@@ -1,8 +1,18 @@
 import logging
 import base64
-from typing import Optional, List, Dict, Any
-from openai import AsyncOpenAI
+from typing import Optional, List, Dict, Any, AsyncIterator
 from app.core.config import settings
+from app.core.llm_cache import llm_response_cache, build_request_key
+from app.core.llm_singleflight import llm_singleflight
+from app.core.llm_limiter import llm_limiter, estimate_request_tokens
+from app.core.llm_hedge import hedged_stream, ttft_tracker
+from app.core.llm_batch import BatchResult, ProgressCallback, run_batch
+from app.core.llm_metrics import LLMCallObserver
+from app.core.llm_reasoning import ReasoningBudget, ReasoningProgress, reasoning_budget_stream, split_delta
+from app.core.metrics import metrics
+from app.core.llm_router import llm_router
+from app.core.model_tiers import resolve_model, resolve_max_tokens
+from app.core.tokens import estimate_messages_tokens, fit_messages, input_budget_for, input_token_stats
 
 logger = logging.getLogger(__name__)
 
@@ -20,53 +30,206 @@ class LLMClient:
             return
             
         api_key = settings.OPENAI_API_KEY
-        base_url = settings.OPENAI_BASE_URL
         self.model = settings.OPENAI_MODEL
         self.vl_model = settings.SILICONFLOW_VL_MODEL
         
-        if not api_key:
+        if not api_key and not settings.LLM_ENDPOINTS:
             logger.warning("OPENAI_API_KEY not found in settings")
             
-        self.client = AsyncOpenAI(
-            api_key=api_key,
-            base_url=base_url
-        )
+        # 所有上游调用经由路由器在一个或多个 OpenAI 兼容端点间分发
+        self.router = llm_router
+        self.client = llm_router.endpoints[0].client
         self._initialized = True
 
     async def chat(self, 
                    messages: List[Dict[str, str]], 
                    temperature: float = 0.7,
                    max_tokens: int = 2000,
-                   model: str = None) -> str:
+                   model: str = None,
+                   cache: bool = True,
+                   coalesce: bool = True,
+                   task: str = None) -> str:
         """
         向 LLM 发送聊天补全请求
+        :param cache: 是否允许使用响应缓存 (需开启 LLM_CACHE_ENABLED，且仅对低温度调用生效)，传 False 可强制绕过
+        :param coalesce: 是否与相同的并发请求合并为一次上游调用
+        :param task: 调用点标识 (PromptTemplate 或任务名)，未指定 model 时据此选择模型档位
         """
+        observer = None
         try:
-            target_model = model or self.model
-            logger.info(f"Calling LLM: {target_model}")
-            response = await self.client.chat.completions.create(
-                model=target_model,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens
-            )
-            return response.choices[0].message.content
+            target_model = model or resolve_model(task)
+            max_tokens = resolve_max_tokens(task, max_tokens)
+            messages = self._apply_token_budget(messages, target_model, max_tokens)
+            request_key = build_request_key(target_model, messages, temperature, max_tokens)
+
+            cache_key = None
+            if cache and self._is_cacheable(temperature):
+                cache_key = request_key
+                cached = await llm_response_cache.get(cache_key)
+                if cached is not None:
+                    logger.info(f"LLM cache hit: {target_model}")
+                    return cached
+
+            observer = LLMCallObserver(target_model, task, "chat")
+
+            async def _call() -> str:
+                async with llm_limiter.acquire(target_model, estimate_request_tokens(messages, max_tokens)) as lease:
+                    logger.info(f"Calling LLM: {target_model}")
+                    response = await self.router.complete(
+                        target_model,
+                        messages=messages,
+                        temperature=temperature,
+                        max_tokens=max_tokens
+                    )
+                    if response.usage:
+                        lease.actual_tokens = response.usage.total_tokens
+                        observer.on_usage(response.usage)
+                    return response.choices[0].message.content
+
+            if coalesce and settings.LLM_SINGLEFLIGHT_ENABLED:
+                content = await llm_singleflight.do(request_key, _call)
+            else:
+                content = await _call()
+
+            observer.on_output(content)
+            observer.finish()
+
+            if cache_key and content:
+                await llm_response_cache.set(cache_key, content)
+            return content
         except Exception as e:
+            if observer:
+                observer.finish(e)
             logger.error(f"LLM call failed: {str(e)}")
             raise e
 
+    @staticmethod
+    def _apply_token_budget(messages: List[Dict[str, Any]], model: str, max_tokens: int) -> List[Dict[str, Any]]:
+        """
+        估算输入 token 数，超出模型上下文窗口时按配置的策略裁剪
+        """
+        budget = input_budget_for(model, max_tokens)
+        fitted, truncated = fit_messages(messages, budget, settings.LLM_TRUNCATION_STRATEGY)
+        input_tokens = estimate_messages_tokens(fitted)
+        if truncated:
+            logger.warning(f"Prompt for {model} exceeded input budget ({budget} tokens), truncated to ~{input_tokens} tokens")
+        input_token_stats.record(model, input_tokens, truncated)
+        return fitted
+
+    @staticmethod
+    def _stream_options() -> Dict[str, Any]:
+        """
+        流式请求的附加参数：请求上游在最后一个 chunk 中返回 token 用量
+        """
+        if settings.LLM_STREAM_INCLUDE_USAGE:
+            return {"stream_options": {"include_usage": True}}
+        return {}
+
+    @staticmethod
+    def _record_stream_usage(chunk, lease, observer: Optional[LLMCallObserver]):
+        """
+        记录流式响应中的 usage chunk (回填限流器的实际消耗并上报指标)
+        """
+        usage = getattr(chunk, "usage", None)
+        if not usage:
+            return
+        lease.actual_tokens = usage.total_tokens
+        if observer:
+            observer.on_usage(usage)
+
+    @staticmethod
+    async def _observe_stream(stream, observer: LLMCallObserver):
+        """
+        以调用方视角记录流式指标 (首 token 延迟、chunk 数、总耗时、错误类型)
+        """
+        try:
+            async for chunk in stream:
+                observer.on_chunk(chunk)
+                yield chunk
+        except Exception as e:
+            observer.finish(e)
+            raise
+        finally:
+            observer.finish()
+
+    @staticmethod
+    def _is_cacheable(temperature: float) -> bool:
+        """
+        判断本次调用是否可以走响应缓存
+        """
+        return settings.LLM_CACHE_ENABLED and temperature <= settings.LLM_CACHE_MAX_TEMPERATURE
+
+    @staticmethod
+    def _mark_first_token(lease, model: str):
+        """
+        记录首 token 时间，并作为对冲延迟的统计样本
+        """
+        if lease.first_token_at is None:
+            lease.mark_first_token()
+            ttft_tracker.observe(model, lease.first_token_at - lease.started_at)
+
+    @staticmethod
+    def _hedge_delay(model: str) -> float:
+        """
+        计算对冲触发延迟：样本充足时取 TTFT 的指定百分位，否则使用初始延迟
+        """
+        observed = ttft_tracker.percentile(model, settings.LLM_HEDGE_PERCENTILE)
+        if observed is None:
+            return settings.LLM_HEDGE_INITIAL_DELAY
+        return max(settings.LLM_HEDGE_MIN_DELAY, observed)
+
+    @staticmethod
+    def cache_stats() -> dict:
+        """
+        获取响应缓存的命中统计
+        """
+        return llm_response_cache.stats()
+
+    @staticmethod
+    def metrics_snapshot() -> dict:
+        """
+        获取 LLM 调用指标与各组件统计的 JSON 快照
+        """
+        return metrics.dump()
+
+    @staticmethod
+    def token_stats() -> dict:
+        """
+        获取各模型的输入 token 累计与裁剪次数
+        """
+        return input_token_stats.stats()
+
+    @staticmethod
+    def router_stats() -> dict:
+        """
+        获取多端点路由决策与各端点得分
+        """
+        return llm_router.stats()
+
+    @staticmethod
+    def limiter_stats() -> dict:
+        """
+        获取各模型限流器的排队深度与等待时间
+        """
+        return llm_limiter.stats()
+
     async def chat_with_image(self, 
                             prompt: str, 
                             image_data: bytes, 
                             temperature: float = 0.7,
-                            max_tokens: int = 2000) -> str:
+                            max_tokens: int = 2000,
+                            task: str = None,
+                            mime_type: str = "image/jpeg") -> str:
         """
         发送带图片的请求到视觉模型
+        :param task: 调用点标识，用于指标标签
+        :param mime_type: 图片的真实格式 (见 app.core.image.preprocess_image)
         """
+        observer = LLMCallObserver(self.vl_model, task, "image")
         try:
             # 将图片转换为 Base64
             base64_image = base64.b64encode(image_data).decode('utf-8')
-            image_url = f"data:image/jpeg;base64,{base64_image}"
+            image_url = f"data:{mime_type};base64,{base64_image}"
 
             messages = [
                 {
@@ -78,15 +241,24 @@ class LLMClient:
                 }
             ]
 
-            logger.info(f"Calling VL LLM: {self.vl_model}")
-            response = await self.client.chat.completions.create(
-                model=self.vl_model,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens
-            )
-            return response.choices[0].message.content
+            input_token_stats.record(self.vl_model, estimate_messages_tokens(messages))
+            async with llm_limiter.acquire(self.vl_model, estimate_request_tokens(messages, max_tokens)) as lease:
+                logger.info(f"Calling VL LLM: {self.vl_model}")
+                response = await self.router.complete(
+                    self.vl_model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens
+                )
+                if response.usage:
+                    lease.actual_tokens = response.usage.total_tokens
+                    observer.on_usage(response.usage)
+                content = response.choices[0].message.content
+            observer.on_output(content)
+            observer.finish()
+            return content
         except Exception as e:
+            observer.finish(e)
             logger.error(f"VL LLM call failed: {str(e)}")
             raise e
 
@@ -94,37 +266,98 @@ class LLMClient:
                             prompt: str, 
                             image_data: bytes, 
                             temperature: float = 0.7,
-                            max_tokens: int = 2000):
+                            max_tokens: int = 2000,
+                            hedge: bool = False,
+                            task: str = None,
+                            mime_type: str = "image/jpeg",
+                            on_reasoning: Optional[ReasoningProgress] = None):
         """
         发送带图片的请求到视觉模型 (Stream 模式)
+        只产出回答内容；Thinking 模型的思考过程通过 on_reasoning 回调报告进度，
+        回答开始前思考超出预算 (VL_REASONING_MAX_SECONDS / VL_REASONING_MAX_TOKENS) 时切换到 VL_FALLBACK_MODEL
+        :param hedge: 是否启用对冲请求 (需开启 LLM_HEDGE_ENABLED)，用于交互式场景降低首 token 长尾延迟
+        :param task: 调用点标识，用于指标标签
+        :param mime_type: 图片的真实格式 (见 app.core.image.preprocess_image)
+        :param on_reasoning: 思考进度回调 (已思考 token 数估算, 已思考秒数)
         """
-        try:
-            # 将图片转换为 Base64
-            base64_image = base64.b64encode(image_data).decode('utf-8')
-            image_url = f"data:image/jpeg;base64,{base64_image}"
+        # 将图片转换为 Base64
+        base64_image = base64.b64encode(image_data).decode('utf-8')
+        image_url = f"data:{mime_type};base64,{base64_image}"
 
-            messages = [
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "image_url", "image_url": {"url": image_url}},
-                        {"type": "text", "text": prompt}
-                    ]
-                }
-            ]
+        messages = [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "image_url", "image_url": {"url": image_url}},
+                    {"type": "text", "text": prompt}
+                ]
+            }
+        ]
 
-            logger.info(f"Calling VL LLM (Stream): {self.vl_model}")
-            stream = await self.client.chat.completions.create(
-                model=self.vl_model,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens,
-                stream=True
+        input_token_stats.record(self.vl_model, estimate_messages_tokens(messages))
+        observer = LLMCallObserver(self.vl_model, task, "image_stream")
+        make_stream = lambda: self._image_stream_completion(messages, temperature, max_tokens, observer)
+        if hedge and settings.LLM_HEDGE_ENABLED:
+            events = hedged_stream(make_stream, self._hedge_delay(self.vl_model), label=self.vl_model)
+        else:
+            events = make_stream()
+
+        fallback_model = settings.VL_FALLBACK_MODEL
+        make_fallback = None
+        if fallback_model and fallback_model != self.vl_model:
+            make_fallback = lambda: self._image_stream_completion(
+                messages, temperature, max_tokens, observer, model=fallback_model
             )
-            
-            async for chunk in stream:
-                if chunk.choices and chunk.choices[0].delta.content:
-                    yield chunk.choices[0].delta.content
+        stream = reasoning_budget_stream(
+            events,
+            ReasoningBudget(settings.VL_REASONING_MAX_TOKENS, settings.VL_REASONING_MAX_SECONDS),
+            make_fallback=make_fallback,
+            on_reasoning=on_reasoning,
+            on_reasoning_text=observer.on_reasoning,
+            on_fallback=observer.on_fallback,
+            progress_interval=settings.VL_REASONING_PROGRESS_INTERVAL,
+            label=self.vl_model
+        )
+
+        async for chunk in self._observe_stream(stream, observer):
+            yield chunk
+
+    async def _image_stream_completion(self,
+                                       messages: List[Dict[str, Any]],
+                                       temperature: float,
+                                       max_tokens: int,
+                                       observer: LLMCallObserver = None,
+                                       model: str = None):
+        """
+        发起一次视觉模型上游流式请求，产出 ("reasoning" | "content", 文本) 事件
+        """
+        model = model or self.vl_model
+        options = self._stream_options()
+        if settings.VL_THINKING_BUDGET > 0 and model == self.vl_model:
+            options["extra_body"] = {"thinking_budget": settings.VL_THINKING_BUDGET}
+        try:
+            async with llm_limiter.acquire(model, estimate_request_tokens(messages, max_tokens)) as lease:
+                logger.info(f"Calling VL LLM (Stream): {model}")
+                stream = self.router.stream(
+                    model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    **options
+                )
+                
+                async for chunk in stream:
+                    self._record_stream_usage(chunk, lease, observer)
+                    if not chunk.choices:
+                        continue
+                    reasoning, content = split_delta(chunk.choices[0].delta)
+                    if reasoning or content:
+                        # 思考内容也计入首 token 时间 (反映上游的响应速度)
+                        self._mark_first_token(lease, model)
+                    if reasoning:
+                        yield "reasoning", reasoning
+                    if content:
+                        yield "content", content
                     
         except Exception as e:
             logger.error(f"VL LLM stream call failed: {str(e)}")
@@ -134,30 +367,100 @@ class LLMClient:
                    messages: List[Dict[str, str]], 
                    temperature: float = 0.7,
                    max_tokens: int = 2000,
-                   model: str = None):
+                   model: str = None,
+                   coalesce: bool = True,
+                   hedge: bool = False,
+                   task: str = None):
         """
         向 LLM 发送聊天补全请求 (Stream 模式)
+        :param coalesce: 是否与相同的并发请求共享同一条上游流 (后加入者会先回放已输出的内容)
+        :param hedge: 是否启用对冲请求 (需开启 LLM_HEDGE_ENABLED)，用于交互式场景降低首 token 长尾延迟
+        :param task: 调用点标识 (PromptTemplate 或任务名)，未指定 model 时据此选择模型档位
+        """
+        target_model = model or resolve_model(task)
+        max_tokens = resolve_max_tokens(task, max_tokens)
+        messages = self._apply_token_budget(messages, target_model, max_tokens)
+        observer = LLMCallObserver(target_model, task, "stream")
+        make_stream = lambda: self._stream_completion(messages, temperature, max_tokens, target_model, observer)
+        if hedge and settings.LLM_HEDGE_ENABLED:
+            upstream = make_stream
+            make_stream = lambda: hedged_stream(upstream, self._hedge_delay(target_model), label=target_model)
+
+        if coalesce and settings.LLM_SINGLEFLIGHT_ENABLED:
+            request_key = build_request_key(target_model, messages, temperature, max_tokens)
+            stream = llm_singleflight.stream(request_key, make_stream)
+        else:
+            stream = make_stream()
+
+        async for chunk in self._observe_stream(stream, observer):
+            yield chunk
+
+    async def _stream_completion(self,
+                                 messages: List[Dict[str, str]],
+                                 temperature: float,
+                                 max_tokens: int,
+                                 target_model: str,
+                                 observer: LLMCallObserver = None):
+        """
+        发起一次上游流式请求
         """
         try:
-            target_model = model or self.model
-            logger.info(f"Calling LLM Stream: {target_model}")
-            stream = await self.client.chat.completions.create(
-                model=target_model,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens,
-                stream=True
-            )
-            async for chunk in stream:
-                if chunk.choices and chunk.choices[0].delta.content:
-                    yield chunk.choices[0].delta.content
+            async with llm_limiter.acquire(target_model, estimate_request_tokens(messages, max_tokens)) as lease:
+                logger.info(f"Calling LLM Stream: {target_model}")
+                stream = self.router.stream(
+                    target_model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    **self._stream_options()
+                )
+                async for chunk in stream:
+                    self._record_stream_usage(chunk, lease, observer)
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        self._mark_first_token(lease, target_model)
+                        yield chunk.choices[0].delta.content
         except Exception as e:
             logger.error(f"LLM stream call failed: {str(e)}")
             raise e
 
-    async def chat_simple(self, prompt: str) -> str:
+    async def chat_many_iter(self,
+                             requests: List[Dict[str, Any]],
+                             concurrency: int = None,
+                             retries: int = None,
+                             on_progress: Optional[ProgressCallback] = None) -> AsyncIterator[BatchResult]:
+        """
+        批量发送聊天请求，按完成顺序逐个产出 BatchResult
+        :param requests: 每项为 chat() 的关键字参数，如 {"messages": [...], "temperature": 0.3}
+        :param concurrency: 最大并发数，默认 LLM_BATCH_CONCURRENCY (同时仍受模型限流器约束)
+        :param retries: 过载类错误的重试次数，默认 LLM_BATCH_RETRIES
+        :param on_progress: 进度回调 (已完成数, 总数, 结果)
+        """
+        async for result in run_batch(
+            self.chat,
+            requests,
+            concurrency=concurrency or settings.LLM_BATCH_CONCURRENCY,
+            retries=settings.LLM_BATCH_RETRIES if retries is None else retries,
+            backoff=settings.LLM_BATCH_RETRY_BACKOFF,
+            on_progress=on_progress
+        ):
+            yield result
+
+    async def chat_many(self,
+                        requests: List[Dict[str, Any]],
+                        concurrency: int = None,
+                        retries: int = None,
+                        on_progress: Optional[ProgressCallback] = None) -> List[BatchResult]:
+        """
+        批量发送聊天请求，按输入顺序返回结果；单个请求失败不影响其他请求
+        """
+        results: List[Optional[BatchResult]] = [None] * len(requests)
+        async for result in self.chat_many_iter(requests, concurrency, retries, on_progress):
+            results[result.index] = result
+        return results
+
+    async def chat_simple(self, prompt: str, task: str = None) -> str:
         """
         单轮对话的简单封装
         """
         messages = [{"role": "user", "content": prompt}]
-        return await self.chat(messages)
+        return await self.chat(messages, task=task)
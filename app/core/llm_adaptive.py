@@ -0,0 +1,114 @@
+import time
+import logging
+from typing import Optional
+import openai
+
+logger = logging.getLogger(__name__)
+
+
+def is_overload_error(error: BaseException) -> bool:
+    """
+    判断异常是否代表上游过载 (429 / 5xx / 超时 / 连接失败)
+    """
+    if isinstance(error, (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+class AIMDController:
+    """
+    加性增 / 乘性减 (AIMD) 并发控制器
+    - 每完成一个 "窗口" (当前并发数个) 的健康请求，并发上限 +1
+    - 遇到 429/5xx 或首 token 延迟 / 总延迟突增时，并发上限乘以 decrease_factor
+    - 首 token 延迟基线只使用流式调用的样本，非流式调用的总耗时与输出长度相关，不可比
+    - 两次下调之间有冷却期，避免同一波拥塞被重复惩罚
+    """
+    # 首 token 延迟基线的 EWMA 平滑系数
+    BASELINE_ALPHA = 0.1
+    # 基线建立前至少需要的样本数
+    MIN_SAMPLES = 10
+
+    def __init__(self,
+                 model: str,
+                 max_limit: int,
+                 min_limit: int = 1,
+                 decrease_factor: float = 0.7,
+                 ttft_tolerance: float = 2.0,
+                 latency_ceiling: float = 120.0,
+                 cooldown: float = 5.0):
+        self.model = model
+        self.max_limit = max(max_limit, min_limit)
+        self.min_limit = min_limit
+        self.decrease_factor = decrease_factor
+        self.ttft_tolerance = ttft_tolerance
+        self.latency_ceiling = latency_ceiling
+        self.cooldown = cooldown
+
+        self.limit = self.max_limit
+        self.ttft_baseline: Optional[float] = None
+        self._samples = 0
+        self._successes_in_window = 0
+        self._last_decrease = 0.0
+        self._stats = {"increases": 0, "decreases": 0, "errors": 0, "latency_spikes": 0}
+
+    def on_success(self, ttft: Optional[float], latency: float) -> int:
+        """
+        记录一次成功调用，返回调整后的并发上限
+        :param ttft: 首 token 延迟，非流式调用传 None (只参与总延迟判断，不影响基线)
+        """
+        spike = latency > self.latency_ceiling
+        if ttft is not None and self.ttft_baseline is not None and self._samples >= self.MIN_SAMPLES:
+            spike = spike or ttft > self.ttft_baseline * self.ttft_tolerance
+
+        if spike:
+            self._stats["latency_spikes"] += 1
+            ttft_desc = f"{ttft:.2f}s" if ttft is not None else "n/a"
+            self._decrease(f"latency spike (ttft={ttft_desc}, total={latency:.2f}s)")
+            return self.limit
+
+        if ttft is not None:
+            # 仅用健康样本更新基线，避免拥塞时基线被抬高
+            self._samples += 1
+            if self.ttft_baseline is None:
+                self.ttft_baseline = ttft
+            else:
+                self.ttft_baseline += self.BASELINE_ALPHA * (ttft - self.ttft_baseline)
+
+        self._successes_in_window += 1
+        if self._successes_in_window >= self.limit and self.limit < self.max_limit:
+            self.limit += 1
+            self._successes_in_window = 0
+            self._stats["increases"] += 1
+            logger.debug(f"AIMD increase for {self.model}: limit={self.limit}")
+        return self.limit
+
+    def on_error(self, error: BaseException) -> int:
+        """
+        记录一次失败调用，过载类错误会触发下调，返回调整后的并发上限
+        """
+        if is_overload_error(error):
+            self._stats["errors"] += 1
+            self._decrease(f"{type(error).__name__}")
+        return self.limit
+
+    def _decrease(self, reason: str):
+        self._successes_in_window = 0
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        new_limit = max(self.min_limit, int(self.limit * self.decrease_factor))
+        if new_limit < self.limit:
+            self._stats["decreases"] += 1
+            logger.warning(f"AIMD decrease for {self.model}: {self.limit} -> {new_limit} ({reason})")
+            self.limit = new_limit
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "limit": self.limit,
+            "max_limit": self.max_limit,
+            "ttft_baseline": round(self.ttft_baseline, 4) if self.ttft_baseline is not None else None,
+        }
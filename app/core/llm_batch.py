@@ -0,0 +1,99 @@
+import asyncio
+import inspect
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+from app.core.llm_adaptive import is_overload_error
+
+logger = logging.getLogger(__name__)
+
+
+class BatchResult:
+    """
+    批量调用中单个请求的结果，失败时 error 不为空
+    """
+
+    def __init__(self, index: int, content: Any = None, error: BaseException = None, attempts: int = 0):
+        self.index = index
+        self.content = content
+        self.error = error
+        self.attempts = attempts
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __repr__(self) -> str:
+        status = "ok" if self.ok else f"error={self.error!r}"
+        return f"BatchResult(index={self.index}, {status}, attempts={self.attempts})"
+
+
+# 进度回调：(已完成数, 总数, 本次完成的结果)，可以是同步函数或协程函数
+ProgressCallback = Callable[[int, int, BatchResult], Any]
+
+
+async def _run_one(index: int,
+                   request: Dict[str, Any],
+                   fn: Callable[..., Awaitable[Any]],
+                   semaphore: asyncio.Semaphore,
+                   retries: int,
+                   backoff: float) -> BatchResult:
+    """
+    执行单个请求，仅对过载类错误 (429 / 超时 / 5xx) 做指数退避重试
+    """
+    attempts = 0
+    async with semaphore:
+        while True:
+            attempts += 1
+            try:
+                content = await fn(**request)
+                return BatchResult(index, content=content, attempts=attempts)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if attempts > retries or not is_overload_error(e):
+                    logger.warning(f"Batch item {index} failed after {attempts} attempt(s): {e}")
+                    return BatchResult(index, error=e, attempts=attempts)
+                delay = backoff * (2 ** (attempts - 1))
+                logger.info(f"Batch item {index} hit {type(e).__name__}, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+
+async def run_batch(fn: Callable[..., Awaitable[Any]],
+                    requests: List[Dict[str, Any]],
+                    concurrency: int,
+                    retries: int = 0,
+                    backoff: float = 1.0,
+                    on_progress: Optional[ProgressCallback] = None) -> AsyncIterator[BatchResult]:
+    """
+    以有界并发执行一批请求，按完成顺序产出结果
+    - 单个请求失败不影响其他请求，错误记录在 BatchResult.error 中
+    - 调用方提前退出迭代时，未完成的请求会被取消
+    :param fn: 实际的调用函数，每个 request 作为关键字参数传入
+    """
+    total = len(requests)
+    if total == 0:
+        return
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    tasks = [
+        asyncio.create_task(_run_one(i, request, fn, semaphore, retries, backoff))
+        for i, request in enumerate(requests)
+    ]
+    completed = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            result = await next_done
+            completed += 1
+            if on_progress is not None:
+                try:
+                    ret = on_progress(completed, total, result)
+                    if inspect.isawaitable(ret):
+                        await ret
+                except Exception as e:
+                    logger.warning(f"Batch progress callback failed: {e}")
+            yield result
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,144 @@
+import json
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Optional, List, Dict, Any
+from app.core.config import settings
+from app.core.redis import state_manager
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize_content(content: Any) -> Any:
+    """
+    规范化消息内容：统一换行符、去除首尾及行尾空白
+    多模态内容 (list) 原样保留
+    """
+    if isinstance(content, str):
+        text = content.replace("\r\n", "\n").replace("\r", "\n")
+        return "\n".join(line.rstrip() for line in text.split("\n")).strip()
+    return content
+
+
+def build_request_key(model: str,
+                      messages: List[Dict[str, Any]],
+                      temperature: float,
+                      max_tokens: int) -> str:
+    """
+    根据 (model, 规范化 messages, temperature, max_tokens) 生成请求指纹
+    """
+    normalized = [
+        {"role": m.get("role"), "content": _normalize_content(m.get("content"))}
+        for m in messages
+    ]
+    payload = json.dumps(
+        {
+            "model": model,
+            "messages": normalized,
+            "temperature": round(float(temperature), 4),
+            "max_tokens": max_tokens,
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    LLM 响应精确匹配缓存
+    1. 进程内 LRU (按条目数 + TTL 淘汰)
+    2. Redis 二级缓存 (复用 StateManager 连接，按 TTL 过期)
+    """
+    KEY_PREFIX = "llm_cache:"
+
+    def __init__(self, max_entries: int = 512, ttl: int = 3600, use_redis: bool = True, key_prefix: str = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.use_redis = use_redis
+        self.key_prefix = key_prefix or self.KEY_PREFIX
+        # key -> (expire_at, value)
+        self._entries: "OrderedDict[str, tuple[float, str]]" = OrderedDict()
+        self._stats = {
+            "memory_hits": 0,
+            "redis_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+        }
+
+    def _get_local(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expire_at, value = entry
+        if expire_at <= time.monotonic():
+            del self._entries[key]
+            self._stats["evictions"] += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _set_local(self, key: str, value: str):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    async def get(self, key: str) -> Optional[str]:
+        """
+        依次查询进程内缓存和 Redis，Redis 命中时回填进程内缓存
+        """
+        value = self._get_local(key)
+        if value is not None:
+            self._stats["memory_hits"] += 1
+            return value
+
+        if self.use_redis:
+            value = await state_manager.get_value(f"{self.key_prefix}{key}")
+            if value is not None:
+                self._stats["redis_hits"] += 1
+                self._set_local(key, value)
+                return value
+
+        self._stats["misses"] += 1
+        return None
+
+    async def set(self, key: str, value: str):
+        """
+        写入两级缓存
+        """
+        if not value:
+            return
+        self._set_local(key, value)
+        if self.use_redis:
+            await state_manager.set_value(f"{self.key_prefix}{key}", value, ttl=self.ttl)
+        self._stats["stores"] += 1
+
+    def clear(self):
+        """
+        清空进程内缓存 (Redis 中的条目按 TTL 自然过期)
+        """
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        """
+        返回命中/未命中计数
+        """
+        lookups = self._stats["memory_hits"] + self._stats["redis_hits"] + self._stats["misses"]
+        hits = lookups - self._stats["misses"]
+        return {
+            **self._stats,
+            "size": len(self._entries),
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+llm_response_cache = LLMResponseCache(
+    max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+    ttl=settings.LLM_CACHE_TTL,
+    use_redis=settings.LLM_CACHE_REDIS_ENABLED,
+)
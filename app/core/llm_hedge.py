@@ -0,0 +1,123 @@
+import asyncio
+import logging
+from collections import deque
+from typing import AsyncIterator, Callable, Deque, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyTracker:
+    """
+    按模型记录最近的首 token 延迟 (TTFT) 样本，用于计算对冲触发延迟
+    """
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def observe(self, model: str, seconds: float):
+        samples = self._samples.get(model)
+        if samples is None:
+            samples = deque(maxlen=self.window)
+            self._samples[model] = samples
+        samples.append(seconds)
+
+    def percentile(self, model: str, p: float) -> Optional[float]:
+        """
+        返回指定百分位的 TTFT，样本不足时返回 None
+        """
+        samples = self._samples.get(model)
+        if not samples or len(samples) < 20:
+            return None
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def stats(self) -> dict:
+        return {
+            model: {
+                "samples": len(samples),
+                "p50": self.percentile(model, 50),
+                "p95": self.percentile(model, 95),
+            }
+            for model, samples in self._samples.items()
+        }
+
+
+async def _discard(iterator, pending: Optional[asyncio.Future]):
+    """
+    取消并关闭落败的流，释放其上游连接与限流槽位
+    """
+    if pending is not None and not pending.done():
+        pending.cancel()
+        try:
+            await pending
+        except (asyncio.CancelledError, Exception):
+            pass
+    try:
+        await iterator.aclose()
+    except Exception as e:
+        logger.debug(f"Failed to close hedged stream: {e}")
+
+
+async def hedged_stream(make_stream: Callable[[], AsyncIterator[str]],
+                        delay: float,
+                        label: str = "") -> AsyncIterator[str]:
+    """
+    对冲流式请求
+    主请求在 delay 秒内未产出首个 chunk 时，发起一个相同的备份请求；
+    先产出首个 chunk 的流胜出，另一条被取消
+    """
+    primary = make_stream().__aiter__()
+    primary_next = asyncio.ensure_future(primary.__anext__())
+    streams = {primary_next: primary}
+    winner = None
+    first_step: Optional[asyncio.Future] = None
+
+    try:
+        done, _ = await asyncio.wait({primary_next}, timeout=delay)
+        if not done:
+            logger.info(f"Hedging stream {label}: no first chunk after {delay:.2f}s, firing backup request")
+            backup = make_stream().__aiter__()
+            backup_next = asyncio.ensure_future(backup.__anext__())
+            streams[backup_next] = backup
+
+        pending = set(streams)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for step in done:
+                if step.cancelled() or (step.exception() is not None and pending):
+                    # 一路失败时继续等待另一路
+                    continue
+                winner, first_step = streams[step], step
+                break
+            if winner is not None:
+                break
+
+        if winner is None:
+            # 所有请求都失败，抛出主请求的异常
+            primary_next.result()
+            return
+
+        for step, iterator in streams.items():
+            if iterator is not winner:
+                await _discard(iterator, step)
+        if len(streams) > 1:
+            logger.info(f"Hedged stream {label} won by {'primary' if winner is primary else 'backup'} request")
+
+        try:
+            chunk = first_step.result()
+        except StopAsyncIteration:
+            return
+        yield chunk
+        async for chunk in winner:
+            yield chunk
+    finally:
+        for step, iterator in streams.items():
+            if winner is None or iterator is not winner:
+                await _discard(iterator, step)
+        if winner is not None:
+            await _discard(winner, None)
+
+
+ttft_tracker = LatencyTracker()
@@ -0,0 +1,459 @@
+import time
+import uuid
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.core.redis import state_manager
+from app.core.llm_adaptive import AIMDController
+from app.core.tokens import estimate_messages_tokens
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_request_tokens(messages: List[Dict[str, Any]], max_tokens: int) -> int:
+    """
+    估算一次请求消耗的 token 数 (输入 + 预留输出)
+    """
+    return estimate_messages_tokens(messages) + max_tokens
+
+
+class TokenBucket:
+    """
+    进程内令牌桶 (按每分钟额度匀速回填)
+    :param burst: 桶容量 (允许的突发量)，默认等于每分钟额度
+    """
+
+    def __init__(self, per_minute: float, burst: float = None):
+        self.capacity = float(per_minute if burst is None else burst)
+        self.rate = float(per_minute) / 60.0
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def time_until(self, amount: float) -> float:
+        """
+        距离可以消耗 amount 个令牌还需等待的秒数
+        """
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def refund(self, amount: float):
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class LimiterLease:
+    """
+    一次准入许可，调用结束后可通过 actual_tokens 回填实际消耗
+    """
+
+    def __init__(self, model: str, reserved_tokens: int, ticket: str = None):
+        self.model = model
+        self.reserved_tokens = reserved_tokens
+        self.ticket = ticket or uuid.uuid4().hex
+        self.actual_tokens: Optional[int] = None
+        self.started_at = time.monotonic()
+        self.first_token_at: Optional[float] = None
+
+    def mark_first_token(self):
+        """
+        记录首个 token 到达时间 (流式调用)
+        """
+        if self.first_token_at is None:
+            self.first_token_at = time.monotonic()
+
+
+class _LimiterStats:
+    """
+    排队深度与等待时间统计
+    """
+
+    def __init__(self):
+        self.acquired = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.queue_depth = 0
+        self.in_flight = 0
+
+    def record_wait(self, seconds: float):
+        self.acquired += 1
+        self.total_wait += seconds
+        self.max_wait = max(self.max_wait, seconds)
+
+    def to_dict(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "acquired": self.acquired,
+            "avg_wait": round(self.total_wait / self.acquired, 4) if self.acquired else 0.0,
+            "max_wait": round(self.max_wait, 4),
+        }
+
+
+class LocalModelLimiter:
+    """
+    单进程限流器：最大并发 + 每分钟请求数 + 每分钟 token 数
+    等待者按 FIFO 顺序准入，队头未满足时后来者不会插队
+    """
+
+    def __init__(self, model: str, max_concurrency: int, rpm: int, tpm: int):
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.request_bucket = TokenBucket(rpm) if rpm > 0 else None
+        self.token_bucket = TokenBucket(tpm) if tpm > 0 else None
+        self.stats = _LimiterStats()
+        self._waiters: Deque[Tuple[asyncio.Future, int]] = deque()
+        self._wakeup_handle: Optional[asyncio.TimerHandle] = None
+
+    def _wait_for_budget(self, tokens: int) -> float:
+        wait = 0.0
+        if self.request_bucket:
+            wait = max(wait, self.request_bucket.time_until(1))
+        if self.token_bucket:
+            wait = max(wait, self.token_bucket.time_until(tokens))
+        return wait
+
+    def _wake(self):
+        self._wakeup_handle = None
+        while self._waiters:
+            future, tokens = self._waiters[0]
+            if future.done():
+                self._waiters.popleft()
+                continue
+            if self.max_concurrency > 0 and self.stats.in_flight >= self.max_concurrency:
+                return
+            wait = self._wait_for_budget(tokens)
+            if wait > 0:
+                loop = asyncio.get_running_loop()
+                self._wakeup_handle = loop.call_later(wait, self._wake)
+                return
+            if self.request_bucket:
+                self.request_bucket.consume(1)
+            if self.token_bucket:
+                self.token_bucket.consume(tokens)
+            self.stats.in_flight += 1
+            self._waiters.popleft()
+            future.set_result(None)
+        self.stats.queue_depth = 0
+
+    async def acquire(self, tokens: int) -> LimiterLease:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._waiters.append((future, tokens))
+        self.stats.queue_depth = len(self._waiters)
+        started = time.monotonic()
+        if self._wakeup_handle is None:
+            self._wake()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 已获得许可但调用方被取消，归还并发槽位
+                self.stats.in_flight -= 1
+                self._wake()
+            raise
+        finally:
+            self.stats.queue_depth = sum(1 for f, _ in self._waiters if not f.done())
+        self.stats.record_wait(time.monotonic() - started)
+        return LimiterLease(self.model, tokens)
+
+    def set_max_concurrency(self, limit: int):
+        """
+        动态调整并发上限 (供 AIMD 控制器调用)
+        """
+        if limit == self.max_concurrency:
+            return
+        self.max_concurrency = limit
+        if self._wakeup_handle is None:
+            self._wake()
+
+    async def release(self, lease: LimiterLease):
+        self.stats.in_flight -= 1
+        if self.token_bucket and lease.actual_tokens is not None and lease.actual_tokens < lease.reserved_tokens:
+            self.token_bucket.refund(lease.reserved_tokens - lease.actual_tokens)
+        if self._wakeup_handle is not None:
+            self._wakeup_handle.cancel()
+        self._wake()
+
+
+# 原子准入脚本：清理过期租约与失联排队者，按排队顺序检查并发与令牌桶
+# 返回 0 表示准入成功，-1 表示需继续排队，正数表示建议等待的毫秒数
+_ACQUIRE_SCRIPT = """
+local leases, queue, heartbeats, req_bucket, tok_bucket = KEYS[1], KEYS[2], KEYS[3], KEYS[4], KEYS[5]
+local ticket = ARGV[1]
+local max_inflight = tonumber(ARGV[2])
+local lease_ttl = tonumber(ARGV[3])
+local rpm = tonumber(ARGV[4])
+local tpm = tonumber(ARGV[5])
+local need = tonumber(ARGV[6])
+local stale_ms = tonumber(ARGV[7])
+
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+redis.call('ZREMRANGEBYSCORE', leases, '-inf', now)
+local stale = redis.call('ZRANGEBYSCORE', heartbeats, '-inf', now - stale_ms)
+for _, s in ipairs(stale) do
+  redis.call('ZREM', queue, s)
+  redis.call('ZREM', heartbeats, s)
+end
+
+redis.call('ZADD', heartbeats, now, ticket)
+if not redis.call('ZSCORE', queue, ticket) then
+  redis.call('ZADD', queue, now, ticket)
+end
+if redis.call('ZRANK', queue, ticket) ~= 0 then
+  return -1
+end
+if max_inflight > 0 and redis.call('ZCARD', leases) >= max_inflight then
+  return -1
+end
+
+local function refill(key, per_minute)
+  local state = redis.call('HMGET', key, 'tokens', 'ts')
+  local tokens = tonumber(state[1]) or per_minute
+  local ts = tonumber(state[2]) or now
+  tokens = math.min(per_minute, tokens + (now - ts) * per_minute / 60000)
+  return tokens
+end
+
+local wait = 0
+local req_tokens, tok_tokens
+if rpm > 0 then
+  req_tokens = refill(req_bucket, rpm)
+  if req_tokens < 1 then
+    wait = math.max(wait, math.ceil((1 - req_tokens) * 60000 / rpm))
+  end
+end
+if tpm > 0 then
+  need = math.min(need, tpm)
+  tok_tokens = refill(tok_bucket, tpm)
+  if tok_tokens < need then
+    wait = math.max(wait, math.ceil((need - tok_tokens) * 60000 / tpm))
+  end
+end
+if wait > 0 then
+  return wait
+end
+
+if rpm > 0 then
+  redis.call('HSET', req_bucket, 'tokens', tostring(req_tokens - 1), 'ts', tostring(now))
+  redis.call('PEXPIRE', req_bucket, 120000)
+end
+if tpm > 0 then
+  redis.call('HSET', tok_bucket, 'tokens', tostring(tok_tokens - need), 'ts', tostring(now))
+  redis.call('PEXPIRE', tok_bucket, 120000)
+end
+redis.call('ZADD', leases, now + lease_ttl, ticket)
+redis.call('ZREM', queue, ticket)
+redis.call('ZREM', heartbeats, ticket)
+return 0
+"""
+
+_REFUND_SCRIPT = """
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+if not state[1] then
+  return 0
+end
+local tokens = math.min(tonumber(ARGV[2]), tonumber(state[1]) + tonumber(ARGV[1]))
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens))
+return 1
+"""
+
+
+class RedisModelLimiter:
+    """
+    基于 Redis 的分布式限流器，所有 uvicorn worker / 副本共享同一份额度
+    """
+    KEY_PREFIX = "llm_limiter:"
+    POLL_INTERVAL = 0.05
+    # 排队者超过该时间未心跳视为失联 (毫秒)
+    STALE_WAITER_MS = 5000
+
+    def __init__(self, model: str, max_concurrency: int, rpm: int, tpm: int, lease_ttl: int):
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.rpm = rpm
+        self.tpm = tpm
+        self.lease_ttl_ms = lease_ttl * 1000
+        self.stats = _LimiterStats()
+        base = f"{self.KEY_PREFIX}{model}"
+        self._keys = [f"{base}:leases", f"{base}:queue", f"{base}:heartbeats", f"{base}:rpm", f"{base}:tpm"]
+        self._acquire_script = state_manager.redis.register_script(_ACQUIRE_SCRIPT)
+        self._refund_script = state_manager.redis.register_script(_REFUND_SCRIPT)
+        # Redis 不可用时降级为进程内限流
+        self._fallback = LocalModelLimiter(model, max_concurrency, rpm, tpm)
+
+    async def acquire(self, tokens: int) -> LimiterLease:
+        lease = LimiterLease(self.model, tokens)
+        started = time.monotonic()
+        self.stats.queue_depth += 1
+        try:
+            while True:
+                result = await self._acquire_script(
+                    keys=self._keys,
+                    args=[lease.ticket, self.max_concurrency, self.lease_ttl_ms,
+                          self.rpm, self.tpm, tokens, self.STALE_WAITER_MS]
+                )
+                result = int(result)
+                if result == 0:
+                    break
+                delay = self.POLL_INTERVAL if result < 0 else min(result / 1000, 1.0)
+                await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            await self._abandon(lease)
+            raise
+        except Exception as e:
+            logger.warning(f"Redis limiter unavailable for {self.model}, falling back to local: {e}")
+            await self._abandon(lease)
+            fallback_lease = await self._fallback.acquire(tokens)
+            fallback_lease.ticket = None
+            return fallback_lease
+        finally:
+            self.stats.queue_depth -= 1
+
+        self.stats.in_flight += 1
+        self.stats.record_wait(time.monotonic() - started)
+        lease.started_at = time.monotonic()
+        return lease
+
+    def set_max_concurrency(self, limit: int):
+        """
+        动态调整并发上限 (供 AIMD 控制器调用，各进程独立调整)
+        """
+        self.max_concurrency = limit
+        self._fallback.set_max_concurrency(limit)
+
+    async def _abandon(self, lease: LimiterLease):
+        try:
+            await state_manager.redis.zrem(self._keys[1], lease.ticket)
+            await state_manager.redis.zrem(self._keys[2], lease.ticket)
+        except Exception as e:
+            logger.debug(f"Failed to remove limiter ticket {lease.ticket}: {e}")
+
+    async def release(self, lease: LimiterLease):
+        if lease.ticket is None:
+            await self._fallback.release(lease)
+            return
+        self.stats.in_flight -= 1
+        try:
+            await state_manager.redis.zrem(self._keys[0], lease.ticket)
+            if self.tpm > 0 and lease.actual_tokens is not None and lease.actual_tokens < lease.reserved_tokens:
+                await self._refund_script(
+                    keys=[self._keys[4]],
+                    args=[lease.reserved_tokens - lease.actual_tokens, self.tpm]
+                )
+        except Exception as e:
+            logger.warning(f"Failed to release Redis limiter lease for {self.model}: {e}")
+
+
+class LLMRateLimiter:
+    """
+    按模型划分的 LLM 调用限流器
+    """
+
+    def __init__(self):
+        self._limiters: Dict[str, Any] = {}
+        self._controllers: Dict[str, AIMDController] = {}
+
+    def _limits_for(self, model: str) -> dict:
+        limits = {
+            "max_concurrency": settings.LLM_MAX_CONCURRENCY,
+            "rpm": settings.LLM_RPM_LIMIT,
+            "tpm": settings.LLM_TPM_LIMIT,
+        }
+        limits.update(settings.LLM_MODEL_LIMITS.get(model, {}))
+        return limits
+
+    def get(self, model: str):
+        """
+        获取 (必要时创建) 指定模型的限流器
+        """
+        limiter = self._limiters.get(model)
+        if limiter is None:
+            limits = self._limits_for(model)
+            if settings.LLM_LIMITER_BACKEND == "redis":
+                limiter = RedisModelLimiter(model, lease_ttl=settings.LLM_LIMITER_LEASE_TTL, **limits)
+            else:
+                limiter = LocalModelLimiter(model, **limits)
+            self._limiters[model] = limiter
+            logger.info(f"LLM limiter created for {model} ({settings.LLM_LIMITER_BACKEND}): {limits}")
+
+            if settings.LLM_AIMD_ENABLED:
+                controller = AIMDController(
+                    model,
+                    max_limit=limits["max_concurrency"] or settings.LLM_AIMD_MAX_CONCURRENCY,
+                    min_limit=settings.LLM_AIMD_MIN_CONCURRENCY,
+                    decrease_factor=settings.LLM_AIMD_DECREASE_FACTOR,
+                    ttft_tolerance=settings.LLM_AIMD_TTFT_TOLERANCE,
+                    latency_ceiling=settings.LLM_AIMD_LATENCY_CEILING,
+                    cooldown=settings.LLM_AIMD_COOLDOWN,
+                )
+                self._controllers[model] = controller
+                limiter.set_max_concurrency(controller.limit)
+        return limiter
+
+    @asynccontextmanager
+    async def acquire(self, model: str, tokens: int):
+        """
+        获取一次调用许可，退出上下文时自动释放
+        """
+        if not settings.LLM_LIMITER_ENABLED:
+            yield LimiterLease(model, tokens)
+            return
+        limiter = self.get(model)
+        lease = await limiter.acquire(tokens)
+        try:
+            yield lease
+        except Exception as e:
+            self._observe(model, limiter, lease, error=e)
+            raise
+        else:
+            self._observe(model, limiter, lease)
+        finally:
+            await limiter.release(lease)
+
+    def _observe(self, model: str, limiter, lease: LimiterLease, error: BaseException = None):
+        """
+        将调用结果反馈给 AIMD 控制器并同步并发上限
+        """
+        controller = self._controllers.get(model)
+        if controller is None:
+            return
+        if error is not None:
+            limit = controller.on_error(error)
+        else:
+            finished_at = time.monotonic()
+            # 非流式调用没有首 token 时间，不计入首 token 延迟基线
+            ttft = lease.first_token_at - lease.started_at if lease.first_token_at is not None else None
+            limit = controller.on_success(ttft, finished_at - lease.started_at)
+        limiter.set_max_concurrency(limit)
+
+    def stats(self) -> dict:
+        """
+        返回各模型的排队深度、并发数、等待时间及自适应并发上限
+        """
+        result = {}
+        for model, limiter in self._limiters.items():
+            result[model] = limiter.stats.to_dict()
+            controller = self._controllers.get(model)
+            if controller:
+                result[model]["aimd"] = controller.stats()
+        return result
+
+
+llm_limiter = LLMRateLimiter()
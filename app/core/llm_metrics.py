@@ -0,0 +1,141 @@
+import time
+import logging
+from enum import Enum
+from typing import Optional, Union
+from app.core.metrics import metrics
+from app.core.tokens import estimate_tokens, input_token_stats
+from app.core.llm_cache import llm_response_cache
+from app.core.llm_singleflight import llm_singleflight
+from app.core.llm_limiter import llm_limiter
+from app.core.llm_router import llm_router
+
+logger = logging.getLogger(__name__)
+
+_LABELS = ("model", "task", "kind")
+
+LLM_REQUESTS = metrics.counter("llm_requests_total", "LLM calls by outcome", _LABELS + ("status",))
+LLM_ERRORS = metrics.counter("llm_errors_total", "LLM call failures by error class", _LABELS + ("error",))
+LLM_TTFT = metrics.histogram("llm_ttft_seconds", "Time to first streamed token", _LABELS)
+LLM_LATENCY = metrics.histogram("llm_latency_seconds", "Total LLM call latency", _LABELS)
+LLM_CHUNKS = metrics.counter("llm_output_chunks_total", "Streamed output chunks", _LABELS)
+LLM_TOKENS_PER_SECOND = metrics.histogram(
+    "llm_output_tokens_per_second", "Output decode throughput after the first token", _LABELS,
+    buckets=(5, 10, 20, 30, 50, 75, 100, 150, 200, 300)
+)
+LLM_TOKENS = metrics.counter("llm_tokens_total", "Token usage reported by the upstream", ("model", "task", "type"))
+LLM_REASONING_SECONDS = metrics.histogram("llm_reasoning_seconds", "Time spent thinking before the answer", _LABELS)
+LLM_REASONING_TOKENS = metrics.counter("llm_reasoning_tokens_total", "Estimated reasoning tokens streamed", _LABELS)
+LLM_REASONING_TOKENS_PER_SECOND = metrics.histogram(
+    "llm_reasoning_tokens_per_second", "Reasoning decode throughput", _LABELS,
+    buckets=(5, 10, 20, 30, 50, 75, 100, 150, 200, 300)
+)
+LLM_REASONING_FALLBACKS = metrics.counter(
+    "llm_reasoning_fallbacks_total", "Streams switched to a non-thinking model after exceeding the reasoning budget", _LABELS
+)
+
+metrics.register_collector("llm_cache", llm_response_cache.stats)
+metrics.register_collector("llm_singleflight", llm_singleflight.stats)
+metrics.register_collector("llm_limiter", llm_limiter.stats)
+metrics.register_collector("llm_router", llm_router.stats)
+metrics.register_collector("llm_input_tokens", input_token_stats.stats)
+
+
+def task_label(task: Union[str, Enum, None], default: str = "default") -> str:
+    if task is None:
+        return default
+    return task.value if isinstance(task, Enum) else str(task)
+
+
+class LLMCallObserver:
+    """
+    记录一次 LLM 调用的指标 (按 model / task / kind 打标签)
+    kind: chat / stream / image / image_stream
+    """
+
+    def __init__(self, model: str, task: Union[str, Enum, None], kind: str):
+        self.labels = {"model": model, "task": task_label(task), "kind": kind}
+        self.started_at = time.monotonic()
+        self.first_token_at: Optional[float] = None
+        self.chunks = 0
+        self._output_estimate = 0
+        self.first_reasoning_at: Optional[float] = None
+        self.last_reasoning_at: Optional[float] = None
+        self.reasoning_tokens = 0
+        self._reported_reasoning_tokens: Optional[int] = None
+        self.completion_tokens: Optional[int] = None
+        self._finished = False
+
+    def on_chunk(self, text: str):
+        if self.first_token_at is None:
+            self.first_token_at = time.monotonic()
+            LLM_TTFT.observe(self.first_token_at - self.started_at, **self.labels)
+        self.chunks += 1
+        self._output_estimate += estimate_tokens(text)
+
+    def on_reasoning(self, text: str):
+        """
+        记录思考内容 (reasoning_content)，与回答内容分开统计吞吐
+        """
+        now = time.monotonic()
+        if self.first_reasoning_at is None:
+            self.first_reasoning_at = now
+        self.last_reasoning_at = now
+        self.reasoning_tokens += estimate_tokens(text)
+
+    def on_fallback(self):
+        LLM_REASONING_FALLBACKS.inc(**self.labels)
+
+    def on_usage(self, usage):
+        """
+        记录上游返回的 usage (非流式响应或 stream_options.include_usage 的最后一个 chunk)
+        """
+        if usage is None:
+            return
+        prompt_tokens = getattr(usage, "prompt_tokens", None) or 0
+        completion_tokens = getattr(usage, "completion_tokens", None) or 0
+        model, task = self.labels["model"], self.labels["task"]
+        LLM_TOKENS.inc(prompt_tokens, model=model, task=task, type="prompt")
+        LLM_TOKENS.inc(completion_tokens, model=model, task=task, type="completion")
+        self.completion_tokens = completion_tokens
+        details = getattr(usage, "completion_tokens_details", None)
+        if details is not None and getattr(details, "reasoning_tokens", None):
+            self._reported_reasoning_tokens = details.reasoning_tokens
+
+    def on_output(self, text: Optional[str]):
+        """
+        非流式调用：记录完整输出
+        """
+        if text:
+            self._output_estimate += estimate_tokens(text)
+
+    def finish(self, error: BaseException = None):
+        if self._finished:
+            return
+        self._finished = True
+        now = time.monotonic()
+        LLM_LATENCY.observe(now - self.started_at, **self.labels)
+        if error is not None:
+            LLM_REQUESTS.inc(status="error", **self.labels)
+            LLM_ERRORS.inc(error=type(error).__name__, **self.labels)
+            return
+
+        LLM_REQUESTS.inc(status="ok", **self.labels)
+        if self.chunks:
+            LLM_CHUNKS.inc(self.chunks, **self.labels)
+
+        reasoning_tokens = self._reported_reasoning_tokens or self.reasoning_tokens
+        if self.first_reasoning_at is not None:
+            reasoning_seconds = self.last_reasoning_at - self.first_reasoning_at
+            LLM_REASONING_SECONDS.observe((self.first_token_at or self.last_reasoning_at) - self.started_at, **self.labels)
+            LLM_REASONING_TOKENS.inc(reasoning_tokens, **self.labels)
+            if reasoning_seconds > 0:
+                LLM_REASONING_TOKENS_PER_SECOND.observe(reasoning_tokens / reasoning_seconds, **self.labels)
+
+        # usage 中的 completion_tokens 包含思考 token，回答吞吐需要扣除
+        if self.completion_tokens:
+            output_tokens = max(self.completion_tokens - reasoning_tokens, 0)
+        else:
+            output_tokens = self._output_estimate
+        decode_start = self.first_token_at or self.started_at
+        if output_tokens and now > decode_start:
+            LLM_TOKENS_PER_SECOND.observe(output_tokens / (now - decode_start), **self.labels)
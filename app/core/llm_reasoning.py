@@ -0,0 +1,100 @@
+import time
+import inspect
+import logging
+from typing import Any, AsyncIterator, Callable, Optional, Tuple
+from app.core.tokens import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# 上游流事件：("reasoning", 思考内容) 或 ("content", 回答内容)
+StreamEvent = Tuple[str, str]
+
+# 思考进度回调：(已思考的 token 数估算, 已思考秒数)，可以是同步函数或协程函数
+ReasoningProgress = Callable[[int, float], Any]
+
+
+def split_delta(delta) -> Tuple[Optional[str], Optional[str]]:
+    """
+    拆分流式 delta 中的思考内容与回答内容
+    Thinking 模型 (如 Qwen3-VL-Thinking / DeepSeek-R1) 通过 reasoning_content 字段返回思考过程
+    """
+    reasoning = getattr(delta, "reasoning_content", None)
+    return reasoning or None, delta.content or None
+
+
+class ReasoningBudget:
+    """
+    思考预算：思考 token 数或思考时长超出上限时视为超预算 (0 表示不限制)
+    """
+
+    def __init__(self, max_tokens: int = 0, max_seconds: float = 0):
+        self.max_tokens = max_tokens
+        self.max_seconds = max_seconds
+
+    def exceeded(self, tokens: int, seconds: float) -> bool:
+        if self.max_tokens and tokens > self.max_tokens:
+            return True
+        if self.max_seconds and seconds > self.max_seconds:
+            return True
+        return False
+
+
+async def reasoning_budget_stream(events: AsyncIterator[StreamEvent],
+                                  budget: ReasoningBudget,
+                                  make_fallback: Optional[Callable[[], AsyncIterator[StreamEvent]]] = None,
+                                  on_reasoning: Optional[ReasoningProgress] = None,
+                                  on_reasoning_text: Optional[Callable[[str], None]] = None,
+                                  on_fallback: Optional[Callable[[], None]] = None,
+                                  progress_interval: float = 1.5,
+                                  label: str = "") -> AsyncIterator[str]:
+    """
+    消费思考/回答事件流，只产出回答内容
+    - 思考期间按 progress_interval 节流回调 on_reasoning，用于展示“分析中”进度
+    - 回答开始前思考超出预算时，关闭当前流并改用 make_fallback 创建的 (非思考模型) 流
+    """
+    started = time.monotonic()
+    reasoning_tokens = 0
+    last_progress = 0.0
+    answered = False
+    over_budget = False
+
+    try:
+        async for kind, text in events:
+            if kind == "content":
+                answered = True
+                yield text
+                continue
+
+            reasoning_tokens += estimate_tokens(text)
+            if on_reasoning_text:
+                on_reasoning_text(text)
+            now = time.monotonic()
+            elapsed = now - started
+            if on_reasoning and now - last_progress >= progress_interval:
+                last_progress = now
+                try:
+                    ret = on_reasoning(reasoning_tokens, elapsed)
+                    if inspect.isawaitable(ret):
+                        await ret
+                except Exception as e:
+                    logger.warning(f"Reasoning progress callback failed: {e}")
+            if not answered and make_fallback and budget.exceeded(reasoning_tokens, elapsed):
+                over_budget = True
+                break
+    finally:
+        await events.aclose()
+
+    if not over_budget:
+        return
+
+    logger.warning(f"Reasoning budget exceeded for {label} (~{reasoning_tokens} tokens, "
+                   f"{time.monotonic() - started:.1f}s), falling back to non-thinking model")
+    if on_fallback:
+        on_fallback()
+    fallback = make_fallback()
+    try:
+        async for kind, text in fallback:
+            if kind == "content":
+                yield text
+    finally:
+        await fallback.aclose()
@@ -0,0 +1,226 @@
+import time
+import random
+import logging
+from typing import Any, Dict, List, Optional
+import openai
+from openai import AsyncOpenAI
+from app.core.config import settings
+from app.core.llm_adaptive import is_overload_error
+
+logger = logging.getLogger(__name__)
+
+
+def is_endpoint_error(error: BaseException) -> bool:
+    """
+    判断异常是否应归咎于端点本身 (可切换到其他端点重试)
+    400 之类的请求错误换端点也会失败，不做故障转移
+    """
+    if is_overload_error(error):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in (401, 403, 404)
+    return False
+
+
+# 调用类型：流式调用按首 chunk 延迟路由，非流式调用按总耗时路由
+STREAM = "stream"
+COMPLETE = "complete"
+
+
+class LLMEndpoint:
+    """
+    一个 OpenAI 兼容的上游端点 (不同厂商 / 区域 / 自建 vLLM)
+    """
+
+    def __init__(self, name: str, base_url: Optional[str], api_key: Optional[str], models: Any = None):
+        self.name = name
+        self.base_url = base_url
+        # models: None 表示服务所有模型；list 表示可服务的模型；dict 表示逻辑模型名 -> 上游模型名
+        self.models = models
+        self.client = AsyncOpenAI(api_key=api_key, base_url=base_url)
+
+        # 调用类型 (stream / complete) -> 延迟 EWMA；流式记录首 chunk 延迟，非流式记录总耗时，两者不可比
+        self.latency_ewma: Dict[str, Optional[float]] = {STREAM: None, COMPLETE: None}
+        self.error_ewma = 0.0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.failures = 0
+
+    def serves(self, model: str) -> bool:
+        return self.models is None or model in self.models
+
+    def upstream_model(self, model: str) -> str:
+        if isinstance(self.models, dict):
+            return self.models.get(model) or model
+        return model
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.ejected_until
+
+    def score(self, kind: str = STREAM) -> float:
+        """
+        路由得分 (越小越好)：同类调用的延迟 EWMA 按错误率加权
+        """
+        latency = self.latency_ewma[kind]
+        if latency is None:
+            latency = settings.LLM_ROUTER_DEFAULT_LATENCY
+        return latency * (1 + settings.LLM_ROUTER_ERROR_PENALTY * self.error_ewma)
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "latency_ewma": {kind: round(value, 4) if value is not None else None
+                             for kind, value in self.latency_ewma.items()},
+            "error_rate": round(self.error_ewma, 4),
+            "score": {kind: round(self.score(kind), 4) for kind in self.latency_ewma},
+            "healthy": self.healthy,
+        }
+
+
+class LLMRouter:
+    """
+    多端点路由器
+    - 每个端点分别维护流式 (首 chunk) 与非流式 (总耗时) 的延迟以及错误率的滑动得分，每次调用按同类得分选择最优的健康端点
+    - 连续失败的端点会被暂时摘除，冷却后重新参与路由
+    - 非流式调用失败时切换到下一个端点重试；流式调用在首个响应之前可切换
+    """
+    EWMA_ALPHA = 0.2
+
+    def __init__(self, endpoints: List[LLMEndpoint]):
+        self.endpoints = endpoints
+        self._decisions: Dict[str, int] = {ep.name: 0 for ep in endpoints}
+        self._failovers = 0
+
+    @classmethod
+    def from_settings(cls) -> "LLMRouter":
+        """
+        根据配置构建路由器；未配置 LLM_ENDPOINTS 时退化为单一的 OPENAI_BASE_URL 端点
+        """
+        endpoints = [
+            LLMEndpoint(
+                name=conf.get("name") or conf.get("base_url") or f"endpoint-{i}",
+                base_url=conf.get("base_url"),
+                api_key=conf.get("api_key") or settings.OPENAI_API_KEY,
+                models=conf.get("models"),
+            )
+            for i, conf in enumerate(settings.LLM_ENDPOINTS)
+        ]
+        if not endpoints:
+            endpoints = [LLMEndpoint("default", settings.OPENAI_BASE_URL, settings.OPENAI_API_KEY)]
+        return cls(endpoints)
+
+    def candidates(self, model: str, kind: str = STREAM) -> List[LLMEndpoint]:
+        """
+        按路由优先级返回可服务该模型的端点 (健康端点在前，按同类调用的得分升序)
+        :param kind: stream / complete
+        """
+        serving = [ep for ep in self.endpoints if ep.serves(model)]
+        if not serving:
+            raise ValueError(f"No LLM endpoint configured for model: {model}")
+        ordered = sorted(serving, key=lambda ep: (not ep.healthy, ep.score(kind)))
+        # 小概率探索次优端点，避免其得分长期得不到更新
+        if len(ordered) > 1 and ordered[1].healthy and random.random() < settings.LLM_ROUTER_EXPLORE_RATE:
+            ordered[0], ordered[1] = ordered[1], ordered[0]
+        return ordered
+
+    def record_success(self, endpoint: LLMEndpoint, latency: float, kind: str):
+        endpoint.requests += 1
+        endpoint.consecutive_failures = 0
+        endpoint.error_ewma *= (1 - self.EWMA_ALPHA)
+        current = endpoint.latency_ewma[kind]
+        if current is None:
+            endpoint.latency_ewma[kind] = latency
+        else:
+            endpoint.latency_ewma[kind] = current + self.EWMA_ALPHA * (latency - current)
+
+    def record_failure(self, endpoint: LLMEndpoint, error: BaseException):
+        endpoint.requests += 1
+        endpoint.failures += 1
+        endpoint.consecutive_failures += 1
+        endpoint.error_ewma += self.EWMA_ALPHA * (1 - endpoint.error_ewma)
+        if endpoint.consecutive_failures >= settings.LLM_ROUTER_EJECT_AFTER:
+            endpoint.ejected_until = time.monotonic() + settings.LLM_ROUTER_EJECT_SECONDS
+            logger.warning(f"LLM endpoint {endpoint.name} ejected for {settings.LLM_ROUTER_EJECT_SECONDS}s "
+                           f"after {endpoint.consecutive_failures} failures: {error}")
+
+    async def complete(self, model: str, **kwargs):
+        """
+        非流式调用，失败时按优先级切换端点
+        """
+        last_error = None
+        for attempt, endpoint in enumerate(self.candidates(model, COMPLETE)):
+            if attempt > 0:
+                self._failovers += 1
+                logger.warning(f"Failing over {model} to endpoint {endpoint.name}")
+            self._decisions[endpoint.name] += 1
+            started = time.monotonic()
+            try:
+                response = await endpoint.client.chat.completions.create(
+                    model=endpoint.upstream_model(model), **kwargs
+                )
+            except Exception as e:
+                if not is_endpoint_error(e):
+                    raise
+                self.record_failure(endpoint, e)
+                last_error = e
+                continue
+            self.record_success(endpoint, time.monotonic() - started, COMPLETE)
+            return response
+        raise last_error
+
+    async def stream(self, model: str, **kwargs):
+        """
+        流式调用，逐个产出上游原始 chunk
+        建立连接或首个 chunk 到达之前失败可切换端点；开始输出后不再切换，以免重复内容
+        """
+        last_error = None
+        for attempt, endpoint in enumerate(self.candidates(model, STREAM)):
+            if attempt > 0:
+                self._failovers += 1
+                logger.warning(f"Failing over {model} stream to endpoint {endpoint.name}")
+            self._decisions[endpoint.name] += 1
+            started = time.monotonic()
+            try:
+                upstream = await endpoint.client.chat.completions.create(
+                    model=endpoint.upstream_model(model), stream=True, **kwargs
+                )
+            except Exception as e:
+                if not is_endpoint_error(e):
+                    raise
+                self.record_failure(endpoint, e)
+                last_error = e
+                continue
+
+            first_chunk = True
+            try:
+                async for chunk in upstream:
+                    if first_chunk:
+                        first_chunk = False
+                        self.record_success(endpoint, time.monotonic() - started, STREAM)
+                    yield chunk
+            except Exception as e:
+                if not is_endpoint_error(e):
+                    raise
+                self.record_failure(endpoint, e)
+                if not first_chunk:
+                    raise
+                last_error = e
+                continue
+            return
+        raise last_error
+
+    def stats(self) -> dict:
+        """
+        返回路由决策计数与各端点得分
+        """
+        return {
+            "decisions": dict(self._decisions),
+            "failovers": self._failovers,
+            "endpoints": {ep.name: ep.stats() for ep in self.endpoints},
+        }
+
+
+llm_router = LLMRouter.from_settings()
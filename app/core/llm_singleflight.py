@@ -0,0 +1,124 @@
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _StreamFlight:
+    """
+    一次正在进行的上游流式请求
+    所有订阅者共享同一份 chunk 序列，后加入者先回放已产出的前缀
+    """
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.condition = asyncio.Condition()
+        self.task: Optional[asyncio.Task] = None
+
+
+class SingleFlight:
+    """
+    合并相同 key 的并发请求，只向上游发起一次调用
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Task] = {}
+        self._streams: Dict[str, _StreamFlight] = {}
+        self._stats = {"calls": 0, "shared_calls": 0, "streams": 0, "shared_streams": 0}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        执行非流式调用，相同 key 的并发调用共享同一个结果 (或异常)
+        上游调用运行在独立 Task 中，单个调用方取消不会影响其他等待者
+        """
+        task = self._calls.get(key)
+        if task is not None:
+            self._stats["shared_calls"] += 1
+            logger.debug(f"Singleflight joined in-flight call: {key[:12]}")
+            return await asyncio.shield(task)
+
+        self._stats["calls"] += 1
+        task = asyncio.ensure_future(fn())
+        self._calls[key] = task
+        task.add_done_callback(lambda t: self._finish_call(key, t))
+        return await asyncio.shield(task)
+
+    def _finish_call(self, key: str, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # 所有调用方都已取消时，避免 "exception was never retrieved" 警告
+        if not task.cancelled():
+            task.exception()
+
+    async def stream(self, key: str, fn: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """
+        执行流式调用，相同 key 的并发订阅者共享同一条上游流
+        """
+        flight = self._streams.get(key)
+        if flight is None:
+            self._stats["streams"] += 1
+            flight = _StreamFlight()
+            self._streams[key] = flight
+            flight.task = asyncio.ensure_future(self._pump(key, flight, fn))
+        else:
+            self._stats["shared_streams"] += 1
+            logger.debug(f"Singleflight joined in-flight stream: {key[:12]} (replaying {len(flight.chunks)} chunks)")
+
+        flight.subscribers += 1
+        index = 0
+        try:
+            while True:
+                if index < len(flight.chunks):
+                    chunk = flight.chunks[index]
+                    index += 1
+                    yield chunk
+                    continue
+                if flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                async with flight.condition:
+                    if index >= len(flight.chunks) and not flight.done:
+                        await flight.condition.wait()
+        finally:
+            flight.subscribers -= 1
+            # 最后一个订阅者离开且上游未结束时，取消上游请求以节省 token
+            if flight.subscribers == 0 and not flight.done and flight.task:
+                flight.task.cancel()
+
+    async def _pump(self, key: str, flight: _StreamFlight, fn: Callable[[], AsyncIterator[str]]):
+        """
+        消费上游流并广播给订阅者
+        """
+        try:
+            async for chunk in fn():
+                flight.chunks.append(chunk)
+                async with flight.condition:
+                    flight.condition.notify_all()
+        except asyncio.CancelledError:
+            flight.error = asyncio.CancelledError()
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            if self._streams.get(key) is flight:
+                del self._streams[key]
+            async with flight.condition:
+                flight.condition.notify_all()
+
+    def stats(self) -> dict:
+        """
+        返回合并统计
+        """
+        return {
+            **self._stats,
+            "in_flight_calls": len(self._calls),
+            "in_flight_streams": len(self._streams),
+        }
+
+
+llm_singleflight = SingleFlight()
@@ -0,0 +1,256 @@
+import re
+import math
+import logging
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+LabelValues = Tuple[str, ...]
+
+# 延迟类直方图的默认分桶 (秒)
+DEFAULT_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 8.0, 13.0, 20.0, 30.0, 60.0, 120.0)
+
+_NAME_SANITIZER = re.compile(r'[^a-zA-Z0-9_]')
+
+
+def _escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Dict[str, str] = None) -> str:
+    pairs = [f'{n}="{_escape_label(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.extend(f'{n}="{_escape_label(v)}"' for n, v in extra.items())
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """
+    单调递增计数器
+    """
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, description, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for key, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+    def dump(self) -> list:
+        return [{"labels": dict(zip(self.labelnames, key)), "value": value} for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    """
+    可增可减的瞬时值
+    """
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """
+    累积分桶直方图 (与 Prometheus histogram 语义一致)
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, description, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # key -> [各桶计数 (非累积), sum, count]
+        self._values: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        entry = self._values.get(key)
+        if entry is None:
+            entry = [[0] * len(self.buckets), 0.0, 0]
+            self._values[key] = entry
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                entry[0][i] += 1
+                break
+        entry[1] += value
+        entry[2] += 1
+
+    def quantile(self, q: float, **labels) -> Optional[float]:
+        """
+        按分桶估算分位数 (取所在桶的上界)
+        """
+        entry = self._values.get(self._key(labels))
+        if not entry or not entry[2]:
+            return None
+        target = q * entry[2]
+        seen = 0
+        for bound, count in zip(self.buckets, entry[0]):
+            seen += count
+            if seen >= target:
+                return bound
+        return self.buckets[-1]
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for key, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, c in zip(self.buckets, counts):
+                cumulative += c
+                labels = _format_labels(self.labelnames, key, {"le": _format_value(bound)})
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+    def dump(self) -> list:
+        result = []
+        for key, (counts, total, count) in self._values.items():
+            labels = dict(zip(self.labelnames, key))
+            result.append({
+                "labels": labels,
+                "count": count,
+                "sum": round(total, 6),
+                "avg": round(total / count, 6) if count else None,
+                "p50": self.quantile(0.5, **labels),
+                "p95": self.quantile(0.95, **labels),
+            })
+        return result
+
+
+class MetricsRegistry:
+    """
+    进程内指标注册表
+    - counter / gauge / histogram：由调用点直接记录
+    - collector：抓取时调用的回调，返回各组件 stats() 的快照 (如缓存命中率、限流排队深度)
+    可导出为 Prometheus 文本格式或 JSON
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: Dict[str, Callable[[], dict]] = {}
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = cls(name, *args, **kwargs)
+            self._metrics[name] = metric
+        elif not isinstance(metric, cls):
+            raise ValueError(f"Metric {name} already registered as {metric.kind}")
+        return metric
+
+    def counter(self, name: str, description: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, description, labelnames)
+
+    def gauge(self, name: str, description: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, description, labelnames)
+
+    def histogram(self, name: str, description: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, description, labelnames, buckets=buckets)
+
+    def register_collector(self, name: str, collect: Callable[[], dict]):
+        """
+        注册抓取时调用的统计回调
+        """
+        self._collectors[name] = collect
+
+    def _collect(self) -> Dict[str, dict]:
+        snapshots = {}
+        for name, collect in self._collectors.items():
+            try:
+                snapshots[name] = collect()
+            except Exception as e:
+                logger.warning(f"Metrics collector {name} failed: {e}")
+        return snapshots
+
+    @staticmethod
+    def _flatten(prefix: str, data: Any, path: Tuple[str, ...] = ()) -> List[Tuple[str, str, float]]:
+        """
+        将嵌套的 stats 字典展开为 (指标名, path 标签, 数值)
+        叶子键作为指标名后缀，中间层键 (如模型名、端点名) 作为 path 标签
+        """
+        if isinstance(data, bool):
+            return [(prefix, ".".join(path[:-1]), float(data))]
+        if isinstance(data, (int, float)):
+            return [(prefix, ".".join(path[:-1]), float(data))]
+        if not isinstance(data, dict):
+            return []
+        rows = []
+        for key, value in data.items():
+            if isinstance(value, dict):
+                rows.extend(MetricsRegistry._flatten(prefix, value, path + (str(key),)))
+            else:
+                name = f"{prefix}_{_NAME_SANITIZER.sub('_', str(key))}"
+                rows.extend(MetricsRegistry._flatten(name, value, path + (str(key),)))
+        return rows
+
+    def render_prometheus(self) -> str:
+        """
+        导出 Prometheus 文本格式
+        """
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+
+        # 同名样本需要连续输出
+        grouped: Dict[str, List[Tuple[str, float]]] = {}
+        for collector, snapshot in self._collect().items():
+            for name, path, value in self._flatten(collector, snapshot):
+                grouped.setdefault(name, []).append((path, value))
+        for name, samples in grouped.items():
+            lines.append(f"# TYPE {name} gauge")
+            for path, value in samples:
+                labels = _format_labels(("path",), (path,)) if path else ""
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self) -> dict:
+        """
+        导出 JSON 结构 (便于调试与日志)
+        """
+        return {
+            "metrics": {name: metric.dump() for name, metric in self._metrics.items()},
+            "collectors": self._collect(),
+        }
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,78 @@
+import logging
+from enum import Enum
+from typing import Callable, Dict, List, Optional, Union
+from app.core.config import settings
+from app.core.prompts import PromptTemplate
+
+logger = logging.getLogger(__name__)
+
+
+class ModelTier(str, Enum):
+    # 小而快的模型：意图识别、分类、JSON 判定等关键路径上的短调用
+    FAST = "fast"
+
+    # 大模型：提示词优化、日报/周报/月报生成等长文本任务 (默认)
+    LARGE = "large"
+
+
+# 调用点 (PromptTemplate 或自定义任务名) -> 模型档位
+TASK_TIERS: Dict[str, ModelTier] = {
+    PromptTemplate.CLARIFICATION_CHECK.value: ModelTier.FAST,
+    PromptTemplate.REPORT_INTENT_RECOGNITION.value: ModelTier.FAST,
+    PromptTemplate.SUMMARY_INTENT_RECOGNITION.value: ModelTier.FAST,
+    PromptTemplate.REPORT_DIAGNOSIS.value: ModelTier.FAST,
+    "image_mode_intent": ModelTier.FAST,
+}
+
+# 覆盖钩子：返回模型名则直接使用，返回 None 则继续按档位解析
+ModelOverride = Callable[[str], Optional[str]]
+_overrides: List[ModelOverride] = []
+
+
+def _task_name(task: Union[str, Enum]) -> str:
+    return task.value if isinstance(task, Enum) else str(task)
+
+
+def register_model_override(hook: ModelOverride):
+    """
+    注册模型覆盖钩子 (如灰度、按用户指定模型)
+    """
+    _overrides.append(hook)
+
+
+def tier_for(task: Union[str, Enum, None]) -> ModelTier:
+    """
+    获取任务所属档位，配置 LLM_TASK_TIERS 可覆盖默认映射
+    """
+    if task is None:
+        return ModelTier.LARGE
+    name = _task_name(task)
+    configured = settings.LLM_TASK_TIERS.get(name)
+    if configured:
+        return ModelTier(configured)
+    return TASK_TIERS.get(name, ModelTier.LARGE)
+
+
+def resolve_model(task: Union[str, Enum, None]) -> str:
+    """
+    解析任务应使用的模型：覆盖钩子 > 档位配置 > OPENAI_MODEL
+    """
+    if task is not None:
+        name = _task_name(task)
+        for hook in _overrides:
+            model = hook(name)
+            if model:
+                return model
+
+    if tier_for(task) == ModelTier.FAST:
+        return settings.LLM_FAST_MODEL or settings.OPENAI_MODEL
+    return settings.LLM_LARGE_MODEL or settings.OPENAI_MODEL
+
+
+def resolve_max_tokens(task: Union[str, Enum, None], max_tokens: int) -> int:
+    """
+    按档位限制输出 token 上限
+    """
+    if tier_for(task) == ModelTier.FAST and settings.LLM_FAST_MAX_TOKENS:
+        return min(max_tokens, settings.LLM_FAST_MAX_TOKENS)
+    return max_tokens
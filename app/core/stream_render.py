@@ -0,0 +1,143 @@
+from json.encoder import encode_basestring
+from typing import List, Optional
+
+# 模型常把整段输出包在 ```markdown ... ``` 中，卡片展示时去掉这些代码块标记
+FENCE_MARKDOWN = "```markdown"
+FENCE = "```"
+
+
+def json_escape(text: str) -> str:
+    """
+    转义为 JSON 字符串内容 (不含两侧引号)，与 json.dumps(text, ensure_ascii=False) 的输出逐字一致
+    """
+    return encode_basestring(text)[1:-1]
+
+
+class StreamRenderBuffer:
+    """
+    流式输出的增量渲染缓冲区
+    - append() 只处理新到达的 chunk：去掉 ```markdown / ``` 标记 (跨 chunk 拆开的标记会暂存到下一个 chunk)、
+      去掉首尾空白
+    - 渲染时只对新增片段做 JSON 转义并追加到缓存，不再对全文重复 strip/replace/json.dumps
+    效果等价于 text.strip().replace("```markdown", "").replace("```", "").strip()
+    """
+
+    def __init__(self, strip_fences: bool = True):
+        self.strip_fences = strip_fences
+        self._raw: List[str] = []
+        self._raw_length = 0
+        self._pieces: List[str] = []
+        # 可能是代码块标记前缀的尾部 (如 "``" / "```mark")，等待下一个 chunk 再判断
+        self._carry = ""
+        # 尾部空白暂不输出，后面出现非空白内容时再补上 (相当于实时 rstrip)
+        self._trailing_ws = ""
+        self._started = False
+        # 已拼接/已转义的前缀及其覆盖的片段数，渲染时只处理新增片段
+        self._text_cache = ""
+        self._text_count = 0
+        self._json_cache = ""
+        self._json_count = 0
+        self._raw_cache: Optional[str] = None
+
+    @classmethod
+    def from_text(cls, text: str, strip_fences: bool = True) -> "StreamRenderBuffer":
+        buffer = cls(strip_fences=strip_fences)
+        buffer.append(text)
+        buffer.close()
+        return buffer
+
+    def __len__(self) -> int:
+        return self._raw_length
+
+    def append(self, chunk: str):
+        if not chunk:
+            return
+        self._raw.append(chunk)
+        self._raw_length += len(chunk)
+        self._raw_cache = None
+        if self.strip_fences and (self._carry or "`" in chunk):
+            chunk = self._strip_fences(self._carry + chunk)
+        self._commit(chunk)
+
+    def close(self):
+        """
+        流结束：输出暂存的尾部 (未能构成 ```markdown 的 ``` 仍按标记去掉)
+        """
+        carry, self._carry = self._carry, ""
+        if carry.startswith(FENCE):
+            carry = carry[len(FENCE):]
+        self._commit(carry)
+
+    def _strip_fences(self, text: str) -> str:
+        out = []
+        i = 0
+        n = len(text)
+        while True:
+            j = text.find("`", i)
+            if j < 0:
+                out.append(text[i:])
+                self._carry = ""
+                break
+            out.append(text[i:j])
+            head = text[j:j + len(FENCE_MARKDOWN)]
+            if head == FENCE_MARKDOWN:
+                i = j + len(FENCE_MARKDOWN)
+            elif j + len(head) == n and FENCE_MARKDOWN.startswith(head):
+                self._carry = head
+                break
+            elif head.startswith(FENCE):
+                i = j + len(FENCE)
+            else:
+                out.append("`")
+                i = j + 1
+        return "".join(out)
+
+    def _commit(self, text: str):
+        if not text:
+            return
+        if not self._started:
+            text = text.lstrip()
+            if not text:
+                return
+            self._started = True
+        body = text.rstrip()
+        if not body:
+            self._trailing_ws += text
+            return
+        piece = self._trailing_ws + body
+        self._trailing_ws = text[len(body):]
+        self._pieces.append(piece)
+
+    @property
+    def raw(self) -> str:
+        """
+        未经处理的完整输出
+        """
+        if self._raw_cache is None:
+            self._raw_cache = "".join(self._raw)
+            self._raw = [self._raw_cache] if self._raw_cache else []
+        return self._raw_cache
+
+    @property
+    def text(self) -> str:
+        """
+        展示用文本 (已去除代码块标记与首尾空白)
+        """
+        if self._text_count < len(self._pieces):
+            self._text_cache += "".join(self._pieces[self._text_count:])
+            self._text_count = len(self._pieces)
+        return self._text_cache
+
+    def json_fragment(self) -> str:
+        """
+        展示用文本的 JSON 转义结果，可直接嵌入预序列化的卡片模板 (只转义上次渲染后新增的片段)
+        """
+        if self._json_count < len(self._pieces):
+            self._json_cache += json_escape("".join(self._pieces[self._json_count:]))
+            self._json_count = len(self._pieces)
+        return self._json_cache
+
+def as_render_buffer(content, strip_fences: bool = True) -> StreamRenderBuffer:
+    if isinstance(content, StreamRenderBuffer):
+        return content
+    return StreamRenderBuffer.from_text(content or "", strip_fences=strip_fences)
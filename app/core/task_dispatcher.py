@@ -0,0 +1,152 @@
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DISPATCH_TOTAL = metrics.counter("event_dispatch_total", "Event handler tasks by outcome", ("status",))
+DISPATCH_QUEUE_DEPTH = metrics.gauge("event_dispatch_queue_depth", "Event handler tasks waiting for a worker")
+DISPATCH_WAIT = metrics.histogram(
+    "event_dispatch_wait_seconds", "Time an event handler task waited in the queue",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+)
+
+# (入队时间, 任务名, 协程工厂)
+_Job = Tuple[float, str, Callable[[], Awaitable]]
+
+
+class TaskDispatcher:
+    """
+    事件处理任务的有界调度器
+    - 全局最多 max_workers 个任务并发执行
+    - 同一 key (open_id) 的任务按提交顺序串行执行，不同 key 之间轮转，避免同一用户的连续消息竞争 Redis 状态
+    - 等待中的任务超过 max_queue 时拒绝提交，由调用方回复"繁忙"
+    - drain() 停止接收新任务并等待已提交任务执行完毕
+    """
+
+    def __init__(self, max_workers: int = 16, max_queue: int = 200):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        # key -> 待执行任务；key 在字典中表示它已在就绪队列中或正在执行
+        self._pending: Dict[str, Deque[_Job]] = {}
+        self._ready: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._idle: Optional[asyncio.Event] = None
+        self._queued = 0
+        self._running = 0
+        self._closed = False
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0}
+
+    @property
+    def queued(self) -> int:
+        """
+        等待执行的任务数
+        """
+        return self._queued
+
+    @property
+    def idle_workers(self) -> int:
+        """
+        扣除执行中与等待中的任务后剩余的 worker 数
+        """
+        return max(0, self.max_workers - self._running - self._queued)
+
+    def _ensure_workers(self):
+        if self._workers:
+            return
+        self._ready = asyncio.Queue()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._workers = [
+            asyncio.get_running_loop().create_task(self._worker(), name=f"task-dispatcher-{i}")
+            for i in range(self.max_workers)
+        ]
+
+    def submit(self, key: str, factory: Callable[[], Awaitable], name: str = "") -> bool:
+        """
+        提交任务 (需在事件循环中调用)
+        :param key: 串行化 key，通常为用户 open_id
+        :param factory: 无参函数，返回要执行的协程 (拒绝时不会创建协程)
+        :return: False 表示调度器已关闭或队列已满
+        """
+        if self._closed or self._queued >= self.max_queue:
+            self._stats["rejected"] += 1
+            DISPATCH_TOTAL.inc(status="rejected")
+            logger.warning(f"Task dispatcher rejected {name or key}: {self._queued} queued")
+            return False
+        self._ensure_workers()
+        jobs = self._pending.get(key)
+        if jobs is None:
+            jobs = self._pending[key] = deque()
+            self._ready.put_nowait(key)
+        jobs.append((time.monotonic(), name, factory))
+        self._queued += 1
+        self._stats["submitted"] += 1
+        self._idle.clear()
+        DISPATCH_QUEUE_DEPTH.set(self._queued)
+        return True
+
+    async def _worker(self):
+        while True:
+            key = await self._ready.get()
+            jobs = self._pending[key]
+            enqueued_at, name, factory = jobs.popleft()
+            self._queued -= 1
+            DISPATCH_QUEUE_DEPTH.set(self._queued)
+            DISPATCH_WAIT.observe(time.monotonic() - enqueued_at)
+            self._running += 1
+            try:
+                await factory()
+                self._stats["completed"] += 1
+                DISPATCH_TOTAL.inc(status="ok")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._stats["failed"] += 1
+                DISPATCH_TOTAL.inc(status="error")
+                logger.error(f"Task {name or key} failed: {e}", exc_info=True)
+            finally:
+                self._running -= 1
+                if jobs:
+                    # 重新排到就绪队列末尾，让其他用户的任务先执行
+                    self._ready.put_nowait(key)
+                else:
+                    del self._pending[key]
+                    if not self._pending:
+                        self._idle.set()
+
+    async def drain(self, timeout: float = 30.0):
+        """
+        停止接收新任务，等待已提交的任务完成，超时后取消剩余任务
+        """
+        self._closed = True
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            logger.info("Task dispatcher drained")
+        except asyncio.TimeoutError:
+            logger.warning(f"Task dispatcher drain timed out: {self._running} running, {self._queued} queued tasks dropped")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "queued": self._queued,
+            "running": self._running,
+            "active_keys": len(self._pending),
+        }
+
+
+task_dispatcher = TaskDispatcher(
+    max_workers=settings.DISPATCHER_MAX_WORKERS,
+    max_queue=settings.DISPATCHER_MAX_QUEUE,
+)
+metrics.register_collector("task_dispatcher", task_dispatcher.stats)
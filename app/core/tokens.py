@@ -0,0 +1,195 @@
+import re
+import math
+import logging
+from typing import Any, Dict, List, Tuple
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# CJK 统一表意文字、日文假名、韩文音节及全角标点
+_CJK_PATTERN = re.compile(r'[\u3000-\u303f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]')
+# 非 CJK 部分：拉丁单词 / 数字串 / 单个符号
+_LATIN_PATTERN = re.compile(r'[A-Za-z]+|\d+|[^\sA-Za-z\d]')
+
+# 主流中文 tokenizer (DeepSeek / Qwen) 下每个汉字约 0.6~1 token，取偏保守的估计
+CJK_TOKENS_PER_CHAR = 0.8
+# 英文单词约 4 个字符 1 个 token，数字约 3 位 1 个 token
+LATIN_CHARS_PER_TOKEN = 4
+DIGITS_PER_TOKEN = 3
+# 每条消息的格式开销 (role、分隔符) 与回复引导开销
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_PRIMING_TOKENS = 3
+# 单张图片的估算开销 (预处理后的图片)
+IMAGE_TOKENS = 1000
+
+TRUNCATION_MARKER = "\n...(内容过长，已截断)...\n"
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    离线估算文本 token 数，支持中英文混排
+    """
+    if not text:
+        return 0
+    cjk_count = len(_CJK_PATTERN.findall(text))
+    rest = _CJK_PATTERN.sub(" ", text)
+    latin_tokens = 0
+    for piece in _LATIN_PATTERN.findall(rest):
+        if piece[0].isalpha():
+            latin_tokens += math.ceil(len(piece) / LATIN_CHARS_PER_TOKEN)
+        elif piece[0].isdigit():
+            latin_tokens += math.ceil(len(piece) / DIGITS_PER_TOKEN)
+        else:
+            latin_tokens += 1
+    return math.ceil(cjk_count * CJK_TOKENS_PER_CHAR) + latin_tokens
+
+
+def estimate_messages_tokens(messages: List[Dict[str, Any]]) -> int:
+    """
+    估算一组聊天消息的输入 token 数
+    """
+    total = REPLY_PRIMING_TOKENS
+    for m in messages:
+        total += MESSAGE_OVERHEAD_TOKENS
+        content = m.get("content")
+        if isinstance(content, str):
+            total += estimate_tokens(content)
+        elif isinstance(content, list):
+            for part in content:
+                if not isinstance(part, dict):
+                    continue
+                if part.get("type") == "text":
+                    total += estimate_tokens(part.get("text", ""))
+                elif part.get("type") == "image_url":
+                    total += IMAGE_TOKENS
+    return total
+
+
+def context_limit_for(model: str) -> int:
+    """
+    获取模型的上下文窗口大小
+    """
+    return settings.LLM_CONTEXT_LIMITS.get(model, settings.LLM_DEFAULT_CONTEXT_LIMIT)
+
+
+def input_budget_for(model: str, max_tokens: int) -> int:
+    """
+    计算输入可用的 token 预算 (上下文窗口 - 预留输出 - 安全余量)
+    """
+    return context_limit_for(model) - max_tokens - settings.LLM_CONTEXT_SAFETY_MARGIN
+
+
+def truncate_text(text: str, max_tokens: int, keep: str = "head") -> str:
+    """
+    将文本截断到 max_tokens 以内
+    :param keep: head 保留开头；middle 保留首尾、截去中间 (适合指令在前、格式要求在后的模板)
+    """
+    if max_tokens <= 0:
+        return ""
+    total = estimate_tokens(text)
+    if total <= max_tokens:
+        return text
+
+    marker_tokens = estimate_tokens(TRUNCATION_MARKER)
+    # 按 token 比例估算保留字符数，再逐步收缩直到满足预算
+    ratio = max(max_tokens - marker_tokens, 1) / total
+    keep_chars = max(int(len(text) * ratio), 1)
+    while True:
+        if keep == "middle":
+            head = keep_chars // 2
+            candidate = text[:head] + TRUNCATION_MARKER + text[len(text) - (keep_chars - head):]
+        else:
+            candidate = text[:keep_chars] + TRUNCATION_MARKER
+        if estimate_tokens(candidate) <= max_tokens or keep_chars <= 1:
+            return candidate
+        keep_chars = int(keep_chars * 0.9)
+
+
+def truncate_sections(sections: List[str],
+                      budget: int,
+                      strategy: str = "oldest_first",
+                      section_cap: int = 0) -> Tuple[List[str], int]:
+    """
+    按预算裁剪分段内容 (如按天排列的日报)，总量未超预算时原样返回
+    1. 超预算时先对每段应用单段上限 section_cap，避免个别超长分段挤掉其他分段
+    2. 总量仍超预算时：oldest_first 从最早的段开始丢弃；proportional 按比例压缩每段
+    :return: (保留的分段, 被丢弃的分段数)
+    """
+    costs = [estimate_tokens(s) for s in sections]
+    if sum(costs) <= budget:
+        return sections, 0
+
+    if section_cap > 0:
+        sections = [truncate_text(s, section_cap) for s in sections]
+        costs = [estimate_tokens(s) for s in sections]
+        if sum(costs) <= budget:
+            return sections, 0
+
+    if strategy == "proportional":
+        per_section = max(budget // max(len(sections), 1), 1)
+        return [truncate_text(s, per_section) for s in sections], 0
+
+    # oldest_first：保留最近的内容
+    kept: List[str] = []
+    used = 0
+    for section, cost in zip(reversed(sections), reversed(costs)):
+        if used + cost > budget:
+            break
+        kept.append(section)
+        used += cost
+    kept.reverse()
+    if not kept and sections:
+        # 最新的一段本身就超过预算，截断后保留
+        kept = [truncate_text(sections[-1], budget)]
+    return kept, len(sections) - len(kept)
+
+
+def fit_messages(messages: List[Dict[str, Any]], budget: int, strategy: str = "oldest_first") -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    将消息列表裁剪到输入预算以内
+    1. oldest_first：先丢弃最早的非 system 消息 (始终保留最后一条)
+    2. 仍超预算时，截去最长文本消息的中间部分
+    :return: (裁剪后的消息, 是否发生裁剪)
+    """
+    if estimate_messages_tokens(messages) <= budget:
+        return messages, False
+
+    fitted = list(messages)
+    if strategy == "oldest_first":
+        while estimate_messages_tokens(fitted) > budget:
+            droppable = [i for i, m in enumerate(fitted[:-1]) if m.get("role") != "system"]
+            if not droppable:
+                break
+            del fitted[droppable[0]]
+
+    overflow = estimate_messages_tokens(fitted) - budget
+    if overflow > 0:
+        text_indexes = [i for i, m in enumerate(fitted) if isinstance(m.get("content"), str)]
+        if text_indexes:
+            longest = max(text_indexes, key=lambda i: len(fitted[i]["content"]))
+            content = fitted[longest]["content"]
+            target = max(estimate_tokens(content) - overflow, 1)
+            fitted[longest] = {**fitted[longest], "content": truncate_text(content, target, keep="middle")}
+    return fitted, True
+
+
+class InputTokenStats:
+    """
+    按模型累计输入 token 数与裁剪次数
+    """
+
+    def __init__(self):
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def record(self, model: str, input_tokens: int, truncated: bool = False):
+        entry = self._stats.setdefault(model, {"calls": 0, "input_tokens": 0, "truncated_calls": 0})
+        entry["calls"] += 1
+        entry["input_tokens"] += input_tokens
+        if truncated:
+            entry["truncated_calls"] += 1
+
+    def stats(self) -> dict:
+        return {model: dict(entry) for model, entry in self._stats.items()}
+
+
+input_token_stats = InputTokenStats()
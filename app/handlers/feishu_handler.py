@@ -3,6 +3,7 @@ import logging
 import asyncio
 import datetime
 import lark_oapi
+from typing import Optional
 from lark_oapi.api.im.v1 import P2ImMessageReceiveV1, P2ImChatAccessEventBotP2pChatEnteredV1
 from lark_oapi.api.application.v6.model import P2ApplicationBotMenuV6
 from app.services.prompt_service import PromptService, OptimizeType
@@ -11,16 +12,37 @@ from app.repositories.prompt_repository import PromptRepository
 from app.core.redis import state_manager
 from app.core.prompts import PromptTemplate, PROMPTS
 from app.core.llm import LLMClient
+from app.core.image import preprocess_image
+from app.core.card_streamer import card_stream
+from app.core.stream_render import StreamRenderBuffer
+from app.core.event_dedup import event_dedup, event_keys
+from app.core.task_dispatcher import task_dispatcher
+from app.core.event_queue import event_queue
+from app.core.intent_router import report_intent_router
+from app.core.date_parser import DATE_PARSE_TOTAL, parse_date_expression
+from app.core.config import settings
+from app.core.metrics import metrics
 
 logger = logging.getLogger(__name__)
 prompt_service = PromptService()
 prompt_repository = PromptRepository()
 
+SPECULATIVE_OPTIMIZATIONS = metrics.counter(
+    "speculative_optimization_total", "Basic-mode speculative optimizations by outcome", ("outcome",)
+)
+
 async def parse_report_date_intent(user_input: str) -> tuple[int, int, str]:
     """
-    解析用户输入的日期意图
+    解析用户输入的日期意图：优先使用本地规则解析，无法识别时再调用 LLM
     Returns: (start_timestamp, end_timestamp, date_description)
     """
+    parsed = parse_date_expression(user_input)
+    if parsed:
+        DATE_PARSE_TOTAL.inc(stage="rule")
+        logger.info(f"Date intent parsed by rules: {parsed[2]}")
+        return parsed
+    DATE_PARSE_TOTAL.inc(stage="llm")
+
     try:
         current_date = datetime.datetime.now().strftime("%Y-%m-%d")
         prompt = PROMPTS[PromptTemplate.REPORT_INTENT_RECOGNITION].format(
@@ -35,7 +57,8 @@ async def parse_report_date_intent(user_input: str) -> tuple[int, int, str]:
         response_text = await llm_client.chat(
             messages=[{"role": "user", "content": prompt}],
             temperature=0.1, # Low temperature for deterministic output
-            max_tokens=100
+            max_tokens=100,
+            task=PromptTemplate.REPORT_INTENT_RECOGNITION
         )
         
         logger.info(f"Date intent raw response: {response_text}")
@@ -74,6 +97,80 @@ async def parse_report_date_intent(user_input: str) -> tuple[int, int, str]:
         end_ts = int((today + datetime.timedelta(days=1) - datetime.timedelta(seconds=1)).timestamp())
         return start_ts, end_ts, today.strftime("%Y-%m-%d")
 
+async def _stream_optimization(message_id: str, original_prompt: str, stream) -> str:
+    """
+    将优化结果流式写入卡片 (按时间合并更新，结束时保证发送最终内容)
+    :return: 完整的优化结果
+    """
+    from app.services.feishu_service import feishu_service
+    buffer = StreamRenderBuffer()
+    async with card_stream(
+        message_id,
+        lambda content, finished: feishu_service.update_optimization_stream_card(
+            message_id, original_prompt, content, is_finished=finished
+        ),
+        min_interval=feishu_service.stream_min_interval(message_id)
+    ) as card:
+        async for chunk in stream:
+            buffer.append(chunk)
+            card.push(buffer)
+        buffer.close()
+        await card.finish(buffer)
+    return buffer.raw
+
+async def _speculative_optimization(message_id: str, original_prompt: str, stream, clarification: asyncio.Task) -> Optional[dict]:
+    """
+    推测执行：澄清检查进行期间先生成优化结果并缓存，不写入卡片
+    检查确认无需澄清后把已缓存内容推送到卡片并继续流式输出；需要澄清时取消生成，卡片保持原样
+    :param clarification: analyze_need_for_clarification 的任务
+    :return: 需要澄清时返回分析结果，否则返回 None (优化结果已写入卡片)
+    """
+    from app.services.feishu_service import feishu_service
+    buffer = StreamRenderBuffer()
+    released = asyncio.Event()
+    async with card_stream(
+        message_id,
+        lambda content, finished: feishu_service.update_optimization_stream_card(
+            message_id, original_prompt, content, is_finished=finished
+        ),
+        min_interval=feishu_service.stream_min_interval(message_id)
+    ) as card:
+        async def generate():
+            async for chunk in stream:
+                buffer.append(chunk)
+                if released.is_set():
+                    card.push(buffer)
+
+        generation = asyncio.create_task(generate())
+        try:
+            try:
+                analysis = await clarification
+            except Exception as e:
+                logger.error(f"Error in clarification analysis: {e}", exc_info=True)
+                analysis = {"needs_clarification": False}
+
+            if analysis.get("needs_clarification"):
+                generation.cancel()
+                await asyncio.gather(generation, return_exceptions=True)
+                await card.close()
+                SPECULATIVE_OPTIMIZATIONS.inc(outcome="cancelled")
+                logger.info(f"Speculative optimization cancelled for {message_id}: clarification needed "
+                            f"({len(buffer.raw)} chars discarded)")
+                return analysis
+
+            SPECULATIVE_OPTIMIZATIONS.inc(outcome="released")
+            released.set()
+            if buffer.raw:
+                card.push(buffer)
+            await generation
+        finally:
+            if not generation.done():
+                generation.cancel()
+                await asyncio.gather(generation, return_exceptions=True)
+        buffer.close()
+        await card.finish(buffer)
+    return None
+
 async def _message_handler_impl(event: P2ImMessageReceiveV1):
     """
     处理飞书接收消息事件 (Async Implementation)
@@ -109,24 +206,46 @@ async def _message_handler_impl(event: P2ImMessageReceiveV1):
                 # 2. 下载图片
                 image_data = await feishu_service.get_image_content(message_id, image_key)
                 if not image_data:
-                    await feishu_service.send_text(sender_id, "❌ 图片下载失败，请重试。")
+                    await feishu_service.send_text(sender_id, "❌ 图片下载失败或图片过大，请重试。")
                     return
 
-                # 3. 视觉模型流式分析
-                image_desc = ""
-                last_update_len = 0
-                
-                async for chunk in prompt_service.analyze_image_stream(image_data):
-                    image_desc += chunk
-                    # 每生成20个字符更新一次卡片，减少API调用频率
-                    if len(image_desc) - last_update_len >= 20:
-                        await feishu_service.update_image_analysis_card(analysis_msg_id, image_desc, is_finished=False)
-                        last_update_len = len(image_desc)
-                
-                # 4. 完成更新
-                await feishu_service.update_image_analysis_card(analysis_msg_id, image_desc, is_finished=True)
+                # 3. 预处理 (缩放、重新编码)，减小视觉模型的请求体积
+                image = await preprocess_image(image_data)
+                if image is None:
+                    await feishu_service.send_text(sender_id, "❌ 图片下载失败或图片过大，请重试。")
+                    return
+
+                # 4. 视觉模型流式分析 (相同图片命中描述缓存时直接填充卡片)
+                async with card_stream(
+                    analysis_msg_id,
+                    lambda content, finished, progress=None: feishu_service.update_image_analysis_card(
+                        analysis_msg_id, content, is_finished=finished, progress=progress
+                    ),
+                    min_interval=feishu_service.stream_min_interval(analysis_msg_id)
+                ) as stream:
+                    buffer = StreamRenderBuffer(strip_fences=False)
+                    image_desc = await prompt_service.get_cached_image_description(image.data)
+                    if image_desc is None:
+
+                        def on_reasoning(tokens: int, elapsed: float):
+                            # Thinking 模型输出正文前，展示思考进度
+                            if not buffer:
+                                stream.push(buffer, progress=f"🧠 模型正在深度思考画面细节... (已思考 {int(elapsed)} 秒)")
+                        
+                        async for chunk in prompt_service.analyze_image_stream(
+                            image.data, mime_type=image.mime_type, on_reasoning=on_reasoning, check_cache=False
+                        ):
+                            buffer.append(chunk)
+                            stream.push(buffer)
+                        image_desc = buffer.raw
+                    else:
+                        buffer.append(image_desc)
+                    
+                    # 5. 完成更新
+                    buffer.close()
+                    await stream.finish(buffer)
                 
-                # 5. 保存图片描述到 Redis (关联用户)
+                # 6. 保存图片描述到 Redis (关联用户)
                 # 使用 user_id:image_desc 作为 key，TTL 10分钟
                 await state_manager.set_value(f"{sender_id}:image_desc", image_desc, ttl=600)
                 
@@ -163,10 +282,13 @@ async def _message_handler_impl(event: P2ImMessageReceiveV1):
     elif current_mode == MENU_REPORT_MODE:
         input_text = text.strip()
         
+        # 单次扫描得到意图、日期槽位与置信度 (同步指令 / 总结类型 / 查询与汇报关键词)
+        route = report_intent_router.route(input_text)
+
         # --- 手动触发同步逻辑 ---
         # 如果用户输入包含特定关键词，立即执行同步任务
-        sync_keywords = ["同步日报", "立即运行", "手动同步", "运行同步", "sync reports"]
-        if any(k in input_text for k in sync_keywords):
+        if route.intent == "sync":
+            report_intent_router.record("keyword", route.intent, input_text, route.confidence)
             await feishu_service.send_text(sender_id, "🚀 收到指令，正在立即运行日报同步与分析任务...")
             try:
                 # Local import to avoid circular dependencies
@@ -181,37 +303,12 @@ async def _message_handler_impl(event: P2ImMessageReceiveV1):
             return
         # -----------------------
 
-        # --- 总结意图识别（关键词优先 + LLM兜底） ---
-        intent_type = "none"
-        date_info = ""
-        
-        # 关键词匹配（快速且可靠）
-        import re
-        
-        # 日总结关键词：包含"日总结"、日期格式"XX-XX总结"、"今天/昨天/今日总结"
-        if re.search(r'(日总结|今日总结|今天总结|昨天总结|前天总结|\d{1,2}-\d{1,2}总结)', input_text):
-            intent_type = "daily"
-            # 提取日期信息
-            date_match = re.search(r'(\d{1,2}-\d{1,2}|昨天|今天|今日|前天)', input_text)
-            date_info = date_match.group(1) if date_match else "今天"
-            
-        # 周总结关键词：包含"周总结"、"本周/上周/一周总结"、"week"
-        elif re.search(r'(周总结|本周总结|上周总结|一周总结|周报总结|week\s*summary)', input_text, re.IGNORECASE):
-            intent_type = "weekly"
-            # 提取周期信息
-            if "上周" in input_text or "last week" in input_text.lower():
-                date_info = "上周"
-            else:
-                date_info = "本周"
-                
-        # 月总结关键词：包含"月总结"、"X月总结"、"本月/上月总结"
-        elif re.search(r'(月总结|本月总结|上月总结|\d+月总结|month\s*summary)', input_text, re.IGNORECASE):
-            intent_type = "monthly"
-            # 提取月份信息
-            month_match = re.search(r'(\d+月|上月|本月)', input_text)
-            date_info = month_match.group(1) if month_match else "本月"
-        
-        # 关键词未匹配，尝试LLM识别（处理复杂表达）
+        # --- 总结意图识别（关键词自动机优先，置信度不足时 LLM 兜底） ---
+        intent_type = route.intent
+        date_info = route.date_info
+
+        if route.confidence >= settings.INTENT_ROUTER_LLM_THRESHOLD:
+            report_intent_router.record("keyword", intent_type, input_text, route.confidence)
         else:
             try:
                 from app.services.report_analysis_service import ReportAnalysisService
@@ -219,7 +316,7 @@ async def _message_handler_impl(event: P2ImMessageReceiveV1):
                 intent = await summary_service.recognize_summary_intent(input_text)
                 intent_type = intent.get("type", "none")
                 date_info = intent.get("date_info", "")
-                logger.info(f"LLM intent recognition: type={intent_type}, date_info={date_info}")
+                report_intent_router.record("llm", intent_type, input_text)
             except Exception as e:
                 logger.warning(f"LLM intent recognition failed, falling back to none: {e}")
                 intent_type = "none"
@@ -251,8 +348,8 @@ async def _message_handler_impl(event: P2ImMessageReceiveV1):
                     return
 
                 # 根据类型选择对应的流式方法
-                full_content = ""
-                last_update_len = 0
+                buffer = StreamRenderBuffer()
+                date_label = f"{date_range_desc} ({type_label})"
                 
                 if intent_type == "daily":
                     stream = service.daily_summary_stream(start_ts, end_ts, save_to_bitable=True)
@@ -261,20 +358,21 @@ async def _message_handler_impl(event: P2ImMessageReceiveV1):
                 else:  # monthly
                     stream = service.monthly_summary_stream(start_ts, end_ts, save_to_bitable=True)
                 
-                async for chunk in stream:
-                    full_content += chunk
-                    if len(full_content) - last_update_len >= 30:
-                        await feishu_service.update_weekly_summary_card(
-                            message_id, full_content, f"{date_range_desc} ({type_label})", is_finished=False
-                        )
-                        last_update_len = len(full_content)
-                
-                # 最终更新：仅展示摘要
-                summary, score = service._extract_summary_and_score(full_content)
-                summary_display = f"**🏆 {type_label}评分: {score}/100**\n\n{summary}\n\n> 💡 完整分析报告已写入云文档"
-                await feishu_service.update_weekly_summary_card(
-                    message_id, summary_display, f"{date_range_desc} ({type_label})", is_finished=True
-                )
+                async with card_stream(
+                    message_id,
+                    lambda content, finished: feishu_service.update_weekly_summary_card(
+                        message_id, content, date_label, is_finished=finished
+                    ),
+                    min_interval=feishu_service.stream_min_interval(message_id)
+                ) as card:
+                    async for chunk in stream:
+                        buffer.append(chunk)
+                        card.push(buffer)
+                    
+                    # 最终更新：仅展示摘要
+                    summary, score = service._extract_summary_and_score(buffer.raw)
+                    summary_display = f"**🏆 {type_label}评分: {score}/100**\n\n{summary}\n\n> 💡 完整分析报告已写入云文档"
+                    await card.finish(summary_display)
                 
             except Exception as e:
                 logger.error(f"Summary generation failed: {e}", exc_info=True)
@@ -285,14 +383,12 @@ async def _message_handler_impl(event: P2ImMessageReceiveV1):
 
         # 1. 尝试识别日期意图
         # 如果用户明确包含 "查询"、"查看"、"看看" 等关键词，则认为是查询模式
-        query_keywords = ["查询", "查看", "看看", "找一下", "搜索"]
-        is_query_intent = any(k in input_text for k in query_keywords)
+        is_query_intent = route.has("query")
         
         # 即使不是明确的查询词，如果是非常短的日期描述（如"昨天"、"今天的"），也可能是查询
         # 但如果包含"完成"、"计划"、"做了"等词，更可能是汇报内容
         # 关键词列表优化：避免 "进度" 这种模棱两可的词导致误判
-        report_keywords = ["完成", "计划", "做了", "待办", "今日", "明日", "思考", "逻辑", "实现"]
-        is_report_content = any(k in input_text for k in report_keywords)
+        is_report_content = route.has("report")
         
         # 补充逻辑：如果包含查询词，但文本长度超过一定限制（例如 15 字），且包含数字序号（1. 2.），大概率是汇报内容（例如 "1. 查看了文档"）
         if is_query_intent and len(input_text) > 15 and any(char.isdigit() for char in input_text):
@@ -400,17 +496,12 @@ async def _message_handler_impl(event: P2ImMessageReceiveV1):
                 return
 
             try:
-                full_content = ""
-                # 使用 REPORT 模式
-                async for chunk in prompt_service.optimize_stream(
-                    prompt=input_text,
-                    optimize_type=OptimizeType.REPORT
-                ):
-                    full_content += chunk
-                    if len(full_content) % 10 == 0:
-                        await feishu_service.update_optimization_stream_card(message_id, input_text, full_content, is_finished=False)
-                
-                await feishu_service.update_optimization_stream_card(message_id, input_text, full_content, is_finished=True)
+                await _stream_optimization(
+                    message_id,
+                    input_text,
+                    # 使用 REPORT 模式
+                    prompt_service.optimize_stream(prompt=input_text, optimize_type=OptimizeType.REPORT)
+                )
                 return
 
             except Exception as e:
@@ -479,16 +570,11 @@ async def _message_handler_impl(event: P2ImMessageReceiveV1):
 【优化目标】：
 请将上述文字描述转化为符合“欧美写实·产品场景化”生成逻辑 (Golden Prompt Formula) 的摄影级提示词。"""
 
-                    full_content = ""
-                    async for chunk in prompt_service.optimize_stream(
-                        prompt=constructed_prompt,
-                        optimize_type=OptimizeType.IMAGE
-                    ):
-                        full_content += chunk
-                        if len(full_content) % 10 == 0:
-                            await feishu_service.update_optimization_stream_card(message_id, f"[图片模式-纯文字] {target_input}", full_content, is_finished=False)
-                    
-                    await feishu_service.update_optimization_stream_card(message_id, f"[图片模式-纯文字] {target_input}", full_content, is_finished=True)
+                    await _stream_optimization(
+                        message_id,
+                        f"[图片模式-纯文字] {target_input}",
+                        prompt_service.optimize_stream(prompt=constructed_prompt, optimize_type=OptimizeType.IMAGE)
+                    )
                     return
 
                 except Exception as e:
@@ -511,18 +597,14 @@ async def _message_handler_impl(event: P2ImMessageReceiveV1):
                 await feishu_service.send_text(sender_id, "❌ 发送卡片失败，请重试。")
                 return
 
-            full_content = ""
-            async for chunk in prompt_service.optimize_with_image_stream(
-                user_instruction=input_content,
-                image_description=image_desc
-            ):
-                full_content += chunk
-                # 每积累一定长度更新一次卡片，避免过于频繁
-                if len(full_content) % 10 == 0:
-                    await feishu_service.update_optimization_stream_card(message_id, f"[基于图片] {input_content}", full_content, is_finished=False)
-            
-            # 最终更新
-            await feishu_service.update_optimization_stream_card(message_id, f"[基于图片] {input_content}", full_content, is_finished=True)
+            await _stream_optimization(
+                message_id,
+                f"[基于图片] {input_content}",
+                prompt_service.optimize_with_image_stream(
+                    user_instruction=input_content,
+                    image_description=image_desc
+                )
+            )
             return
 
         except Exception as e:
@@ -558,20 +640,16 @@ async def _message_handler_impl(event: P2ImMessageReceiveV1):
             return
 
         try:
-            full_content = ""
             # 使用优化后的提示词（带上下文）
-            async for chunk in prompt_service.optimize_stream(
-                prompt=last_prompt, 
-                optimize_type=OptimizeType.USER_BASIC,
-                context=input_content # 用户的回答作为上下文
-            ):
-                full_content += chunk
-                # 每积累一定长度更新一次卡片，避免过于频繁
-                if len(full_content) % 10 == 0: 
-                    await feishu_service.update_optimization_stream_card(message_id, last_prompt, full_content, is_finished=False)
-            
-            # 最终更新
-            await feishu_service.update_optimization_stream_card(message_id, last_prompt, full_content, is_finished=True)
+            await _stream_optimization(
+                message_id,
+                last_prompt,
+                prompt_service.optimize_stream(
+                    prompt=last_prompt, 
+                    optimize_type=OptimizeType.USER_BASIC,
+                    context=input_content # 用户的回答作为上下文
+                )
+            )
             
         except Exception as e:
             logger.error(f"Error in stream optimization: {e}", exc_info=True)
@@ -584,6 +662,10 @@ async def _message_handler_impl(event: P2ImMessageReceiveV1):
         optimize_type = OptimizeType.SYSTEM
         input_content = input_content.split(":", 1)[1].strip()
     
+    if settings.SPECULATIVE_OPTIMIZATION_ENABLED:
+        await _speculative_basic_optimization(sender_id, input_content, optimize_type)
+        return
+
     # 分析澄清需求
     analysis = await prompt_service.analyze_need_for_clarification(input_content)
     
@@ -609,28 +691,122 @@ async def _message_handler_impl(event: P2ImMessageReceiveV1):
         return
 
     try:
-        full_content = ""
-        async for chunk in prompt_service.optimize_stream(input_content, optimize_type):
-            full_content += chunk
-            if len(full_content) % 10 == 0:
-                await feishu_service.update_optimization_stream_card(message_id, input_content, full_content, is_finished=False)
-        
-        await feishu_service.update_optimization_stream_card(message_id, input_content, full_content, is_finished=True)
+        await _stream_optimization(message_id, input_content, prompt_service.optimize_stream(input_content, optimize_type))
         
     except Exception as e:
         logger.error(f"Error in stream optimization: {e}", exc_info=True)
         await feishu_service.send_text(sender_id, "❌ 优化过程出错，请重试。")
 
-def message_handler(event: P2ImMessageReceiveV1):
+async def _speculative_basic_optimization(sender_id: str, input_content: str, optimize_type: OptimizeType):
     """
-    处理飞书接收消息事件 (Sync Wrapper)
+    基础模式新请求：立即发送开始卡片，澄清检查与优化生成并发执行
+    需要澄清时将开始卡片改为澄清问题卡片，并保存上下文供下一轮使用
+    """
+    from app.services.feishu_service import feishu_service
+    clarification = asyncio.create_task(prompt_service.analyze_need_for_clarification(input_content))
+    stream = prompt_service.optimize_stream(input_content, optimize_type)
+    try:
+        message_id = await feishu_service.send_optimization_stream_start_card(
+            receive_id=sender_id,
+            original_prompt=input_content,
+            optimize_type="基础模式"
+        )
+
+        if not message_id:
+            await feishu_service.send_text(sender_id, "❌ 发送卡片失败，请重试。")
+            return
+
+        try:
+            analysis = await _speculative_optimization(message_id, input_content, stream, clarification)
+        except Exception as e:
+            logger.error(f"Error in stream optimization: {e}", exc_info=True)
+            await feishu_service.send_text(sender_id, "❌ 优化过程出错，请重试。")
+            return
+    finally:
+        if not clarification.done():
+            clarification.cancel()
+
+    if analysis is None:
+        return
+
+    questions = analysis.get("questions", [])
+    reason = analysis.get("reason", "")
+    await state_manager.set_value(f"{sender_id}:clarification_context", input_content, ttl=600)
+    if not await feishu_service.update_to_clarification_card(message_id, questions, reason):
+        await feishu_service.send_clarification_questions(sender_id, questions, reason)
+
+async def _reply_busy(open_id: str):
+    """
+    调度队列已满时直接回复繁忙提示
+    """
+    from app.services.feishu_service import feishu_service
+    await feishu_service.send_text(open_id, "⏳ 当前请求较多，请稍后再试。")
+
+async def _run_claimed(event, impl):
+    """
+    在 Redis 中认领事件后再处理，飞书重推的事件在任何状态查询与 LLM 调用之前丢弃
+    """
+    if not await event_dedup.claim_shared(event_keys(event)):
+        logger.info("Dropping duplicate event already claimed by another worker")
+        return
+    await impl(event)
+
+async def _enqueue(event_type: str, open_id: str, event, impl):
+    """
+    队列模式：认领后写入 Redis Stream，由 worker 进程处理；入队失败时在本进程处理
+    """
+    if not await event_dedup.claim_shared(event_keys(event)):
+        logger.info("Dropping duplicate event already claimed by another worker")
+        return
+    if await event_queue.publish(event_type, open_id, event):
+        return
+    if not task_dispatcher.submit(open_id, lambda: impl(event), name=event_type):
+        await _reply_busy(open_id)
+
+# event_dispatcher.do 在线程池中执行时，handler 需要切回服务所在的事件循环
+_main_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def bind_event_loop(loop: asyncio.AbstractEventLoop):
+    """
+    记录服务主事件循环，供线程池中执行的事件处理切回
+    """
+    global _main_loop
+    _main_loop = loop
+
+def _dispatch(event_type: str, open_id: str, event, impl):
+    """
+    在主事件循环中执行去重与派发 (调度器与去重集合均非线程安全)
     """
     try:
-        loop = asyncio.get_running_loop()
-        loop.create_task(_message_handler_impl(event))
+        asyncio.get_running_loop()
     except RuntimeError:
-        logger.warning("No running loop found, creating new loop for message_handler")
-        asyncio.run(_message_handler_impl(event))
+        if _main_loop is not None and _main_loop.is_running():
+            _main_loop.call_soon_threadsafe(_dispatch_on_loop, event_type, open_id, event, impl)
+        else:
+            logger.warning(f"No running loop found, creating new loop for {event_type} event")
+            if event_dedup.claim_local(event_keys(event)):
+                asyncio.run(_run_claimed(event, impl))
+        return
+    _dispatch_on_loop(event_type, open_id, event, impl)
+
+def _dispatch_on_loop(event_type: str, open_id: str, event, impl):
+    """
+    去重后按 EVENT_QUEUE_MODE 入队或交给进程内调度器
+    """
+    if not event_dedup.claim_local(event_keys(event)):
+        logger.info("Dropping duplicate event before dispatch")
+        return
+    loop = asyncio.get_running_loop()
+    if settings.EVENT_QUEUE_MODE == "redis":
+        loop.create_task(_enqueue(event_type, open_id, event, impl))
+    elif not task_dispatcher.submit(open_id, lambda: _run_claimed(event, impl), name=event_type):
+        loop.create_task(_reply_busy(open_id))
+
+def message_handler(event: P2ImMessageReceiveV1):
+    """
+    处理飞书接收消息事件 (Sync Wrapper)
+    """
+    _dispatch("message", event.event.sender.sender_id.open_id, event, _message_handler_impl)
 
 # 菜单事件 Key 定义
 MENU_BASIC_MODE = "MENU_BASIC_MODE"
@@ -679,12 +855,11 @@ def menu_handler(event: P2ApplicationBotMenuV6):
     """
     处理飞书菜单点击事件 (Sync Wrapper)
     """
-    try:
-        loop = asyncio.get_running_loop()
-        loop.create_task(_menu_handler_impl(event))
-    except RuntimeError:
-        logger.warning("No running loop found, creating new loop for menu_handler")
-        asyncio.run(_menu_handler_impl(event))
+    _dispatch("menu", event.event.operator.operator_id.open_id, event, _menu_handler_impl)
+
+# 队列模式下 worker 进程按事件类型反序列化并调用对应的处理函数
+event_queue.register("message", P2ImMessageReceiveV1, _message_handler_impl)
+event_queue.register("menu", P2ApplicationBotMenuV6, _menu_handler_impl)
 
 def p2p_chat_entered_handler(event: P2ImChatAccessEventBotP2pChatEnteredV1):
     """
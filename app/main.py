@@ -1,7 +1,9 @@
 from fastapi import FastAPI, Request, Response
-from app.controllers import feishu_controller
+from app.controllers import feishu_controller, metrics_controller
 from app.core.database import engine, Base
 from app.core.logger import setup_logging
+from app.core.config import settings
+from app.core.task_dispatcher import task_dispatcher
 from app.services.report_analysis_service import ReportAnalysisService
 from contextlib import asynccontextmanager
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
@@ -74,12 +76,15 @@ async def lifespan(app: FastAPI):
     
     yield
     
+    # 停止接收新事件，等待进行中的消息处理完成
+    await task_dispatcher.drain(settings.DISPATCHER_DRAIN_TIMEOUT)
     scheduler.shutdown()
     logger.info("Shutting down application...")
 
 app = FastAPI(title="Prompt Optimizer Bot", version="1.0.0", lifespan=lifespan)
 
 app.include_router(feishu_controller.router)
+app.include_router(metrics_controller.router)
 
 @app.get("/")
 async def root():
@@ -94,5 +99,4 @@ async def root_post(request: Request) -> Response:
     return await feishu_controller.process_feishu_event(request)
 
 if __name__ == "__main__":
-    from app.core.config import settings
     uvicorn.run("app.main:app", host=settings.HOST, port=settings.PORT, reload=True)
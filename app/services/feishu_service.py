@@ -1,15 +1,86 @@
 import json
 import logging
 import io
+from typing import Union
 import lark_oapi
 from lark_oapi.api.im.v1 import CreateMessageRequest, CreateMessageRequestBody, GetMessageResourceRequest
 from lark_oapi.api.report.v1 import QueryTaskRequest, QueryTaskRequestBody
 from lark_oapi.api.contact.v3 import BatchUserRequest
 from lark_oapi.api.bitable.v1 import CreateAppTableRecordRequest, AppTableRecord, ListAppTableRecordRequest, UpdateAppTableRecordRequest, DeleteAppTableRecordRequest
 from app.core.feishu import client
+from app.core.config import settings
+from app.core.feishu_limiter import Priority, feishu_limiter
+from app.core.stream_render import StreamRenderBuffer, as_render_buffer
+from app.core.card_templates import REPORT_FOOTER, card_templates, slot
+from app.services.streaming_card import streaming_cards
 
 logger = logging.getLogger(__name__)
 
+
+def _card(template: str, title: str, *texts: str, note: str = None) -> dict:
+    """
+    卡片骨架：若干 lark_md 文本块 + 可选底部备注
+    """
+    elements = [{"tag": "div", "text": {"content": text, "tag": "lark_md"}} for text in texts]
+    if note is not None:
+        elements.append({"tag": "note", "elements": [{"tag": "plain_text", "content": note}]})
+    return {
+        "config": {"wide_screen_mode": True},
+        "header": {"template": template, "title": {"content": title, "tag": "plain_text"}},
+        "elements": elements
+    }
+
+
+# 卡片模板：静态骨架在导入时编译一次，发送/更新时只填充动态字段
+_MODE_NOTE = "💡 提示：您可以随时点击菜单切换其他模式"
+card_templates.register("basic_mode", _card(
+    "blue", "✨ 已切换至基础模式",
+    "您现在处于**基础模式**。\n请直接发送您的提示词草稿，我将为您优化。",
+    note=_MODE_NOTE
+))
+card_templates.register("image_mode", _card(
+    "wathet", "🖼️ 已切换至图片模式",
+    "您现在处于**图片模式**。\n请发送图片或详细的画面描述。",
+    note=_MODE_NOTE
+))
+card_templates.register("search_mode", _card(
+    "orange", "🔍 已切换至关键词检索模式",
+    "您现在处于**关键词检索模式**。\n🚧 **该功能暂未实现，敬请期待！**",
+    note=_MODE_NOTE
+))
+card_templates.register("report_mode", _card(
+    "green", "📊 已切换至日报周报模式",
+    "您现在处于**日报周报总结模式**。\n\n您可以：\n1. **发送工作内容**（如\"今天完成了...明天计划...\"），我将为您生成专业日报。\n2. **查询历史汇报**（如\"查询昨天的日报\"），我将为您查找团队记录。\n3. **生成总结报告**，支持以下关键词：\n   - 📅 **日总结**：\"日总结\"、\"今日总结\"、\"昨天总结\"、\"02-09总结\"\n   - 📊 **周总结**：\"周总结\"、\"本周总结\"、\"上周总结\"、\"一周总结\"\n   - 📈 **月总结**：\"月总结\"、\"本月总结\"、\"上月总结\"、\"1月总结\"\n\n💡 提示：也支持复杂表达，如\"帮我看看这周的工作情况\"",
+    note="💡 提示：输入内容越详细，生成的日报越专业"
+))
+card_templates.register("optimization_result", _card(
+    "green", "✅ 提示词优化完成",
+    f"**原始提示词**\n{slot('prompt')}",
+    f"**优化结果**\n{slot('content')}",
+    note=f"模式: {slot('mode')}"
+), truncate_slot="content")
+card_templates.register("optimization_stream", _card(
+    slot("template"), slot("title"),
+    f"**原始提示词**：\n{slot('prompt')}\n\n**优化结果**：\n{slot('content')}"
+), truncate_slot="content")
+card_templates.register("clarification", _card(
+    "orange", "🤔 需要您补充一点细节",
+    f"为了提供更精准的提示词，我需要了解更多信息：\n\n**{slot('reason')}**\n\n请直接回复以下问题的答案：\n{slot('questions')}",
+    note="💡 直接回复答案即可，我会结合您的回答进行最终优化"
+))
+card_templates.register("image_analysis_start", _card(
+    "blue", "🖼️ 正在分析画面...", "正在观察画面细节，生成画面摘要.."
+))
+card_templates.register("image_analysis", _card(
+    slot("template"), slot("title"),
+    f"**【画面摘要】：**\n{slot('content')}{slot('tail')}"
+), truncate_slot="content")
+card_templates.register("weekly_summary", _card(
+    slot("template"), slot("title"),
+    f"**📅 分析周期**: {slot('period')}\n\n{slot('content')}"
+), truncate_slot="content", overflow_footer=REPORT_FOOTER)
+
+
 class FeishuService:
     @staticmethod
     async def get_image_content(message_id: str, image_key: str) -> bytes:
@@ -20,13 +91,19 @@ class FeishuService:
                 .file_key(image_key) \
                 .type("image") \
                 .build()
-            response = await client.im.v1.message_resource.aget(request)
+            response = await feishu_limiter.call("im.message_resource.get", lambda: client.im.v1.message_resource.aget(request))
             if not response.success():
                 logger.error(f"Failed to get image content: {response.msg} - {response.error}")
                 return None
             if hasattr(response, 'file') and response.file:
-                return response.file.read()
-            return response.data
+                data = response.file.read()
+            else:
+                data = response.data
+            # SDK 会将资源完整读入内存，这里至少拦截超大图片，避免后续解码/编码与上传的开销
+            if data and len(data) > settings.IMAGE_MAX_DOWNLOAD_BYTES:
+                logger.warning(f"Image {image_key} too large: {len(data)} bytes (limit {settings.IMAGE_MAX_DOWNLOAD_BYTES})")
+                return None
+            return data
         except Exception as e:
             logger.error(f"Error getting image content: {e}", exc_info=True)
             return None
@@ -44,7 +121,7 @@ class FeishuService:
             request = QueryTaskRequest.builder() \
                 .request_body(request_body) \
                 .build()
-            response = await client.report.v1.task.aquery(request)
+            response = await feishu_limiter.call("report.task.query", lambda: client.report.v1.task.aquery(request), Priority.BULK)
             if not response.success():
                 logger.error(f"Failed to query report tasks: {response.msg} - {response.error}")
                 return None
@@ -60,7 +137,7 @@ class FeishuService:
             request = BatchUserRequest.builder() \
                 .user_ids(user_ids) \
                 .build()
-            response = await client.contact.v3.user.abatch(request)
+            response = await feishu_limiter.call("contact.user.batch", lambda: client.contact.v3.user.abatch(request), Priority.BULK)
             if not response.success():
                 logger.error(f"Failed to batch get users: {response.msg} - {response.error}")
                 return None
@@ -78,7 +155,7 @@ class FeishuService:
                 .table_id(table_id) \
                 .request_body(AppTableRecord.builder().fields(fields).build()) \
                 .build()
-            response = await client.bitable.v1.app_table_record.acreate(request)
+            response = await feishu_limiter.call("bitable.record.write", lambda: client.bitable.v1.app_table_record.acreate(request), Priority.BULK)
             if not response.success():
                 code = getattr(response, 'code', 'unknown')
                 msg = getattr(response, 'msg', 'unknown')
@@ -100,7 +177,7 @@ class FeishuService:
                 .record_id(record_id) \
                 .request_body(AppTableRecord.builder().fields(fields).build()) \
                 .build()
-            response = await client.bitable.v1.app_table_record.aupdate(request)
+            response = await feishu_limiter.call("bitable.record.write", lambda: client.bitable.v1.app_table_record.aupdate(request), Priority.BULK)
             if not response.success():
                 code = getattr(response, 'code', 'unknown')
                 msg = getattr(response, 'msg', 'unknown')
@@ -121,7 +198,7 @@ class FeishuService:
                 .table_id(table_id) \
                 .record_id(record_id) \
                 .build()
-            response = await client.bitable.v1.app_table_record.adelete(request)
+            response = await feishu_limiter.call("bitable.record.write", lambda: client.bitable.v1.app_table_record.adelete(request), Priority.BULK)
             if not response.success():
                 code = getattr(response, 'code', 'unknown')
                 msg = getattr(response, 'msg', 'unknown')
@@ -143,7 +220,7 @@ class FeishuService:
             if page_token:
                 builder.page_token(page_token)
             request = builder.build()
-            response = await client.bitable.v1.app_table_record.alist(request)
+            response = await feishu_limiter.call("bitable.record.read", lambda: client.bitable.v1.app_table_record.alist(request), Priority.BULK)
             if not response.success():
                 logger.error(f"Failed to search bitable records: {response.msg} - {response.error}")
                 return None
@@ -153,19 +230,24 @@ class FeishuService:
             return None
 
     @staticmethod
-    async def send_card(receive_id: str, card_content: dict, receive_id_type: str = "open_id"):
-        """发送飞书卡片消息"""
+    async def send_card(receive_id: str, card_content: Union[dict, str], receive_id_type: str = "open_id"):
+        """
+        发送飞书卡片消息
+        :param card_content: 卡片 dict，或已渲染的卡片 JSON 字符串 (见 card_templates)
+        """
+        if not isinstance(card_content, str):
+            card_content = json.dumps(card_content, ensure_ascii=False)
         try:
             request_body = CreateMessageRequestBody.builder() \
                 .receive_id(receive_id) \
                 .msg_type("interactive") \
-                .content(json.dumps(card_content)) \
+                .content(card_content) \
                 .build()
             request = CreateMessageRequest.builder() \
                 .receive_id_type(receive_id_type) \
                 .request_body(request_body) \
                 .build()
-            response = await client.im.v1.message.acreate(request)
+            response = await feishu_limiter.call("im.message.create", lambda: client.im.v1.message.acreate(request), Priority.HIGH)
             if not response.success():
                 logger.error(f"Failed to send card to {receive_id}: {response.msg} - {response.error}")
                 return False
@@ -176,17 +258,22 @@ class FeishuService:
             return False
 
     @staticmethod
-    async def update_card(message_id: str, card_content: dict):
-        """更新飞书卡片消息 (用于流式输出效果)"""
+    async def update_card(message_id: str, card_content: Union[dict, str], priority: Priority = Priority.NORMAL):
+        """
+        更新飞书卡片消息 (用于流式输出效果)
+        :param card_content: 卡片 dict，或已渲染的卡片 JSON 字符串 (见 card_templates)
+        :param priority: 出站限流优先级，最终内容使用 Priority.HIGH
+        """
+        if not isinstance(card_content, str):
+            card_content = json.dumps(card_content, ensure_ascii=False)
         try:
-            response = await client.im.v1.message.apatch(
-                lark_oapi.api.im.v1.PatchMessageRequest.builder()
-                .message_id(message_id)
+            request = lark_oapi.api.im.v1.PatchMessageRequest.builder() \
+                .message_id(message_id) \
                 .request_body(lark_oapi.api.im.v1.PatchMessageRequestBody.builder()
-                    .content(json.dumps(card_content))
-                    .build())
+                    .content(card_content)
+                    .build()) \
                 .build()
-            )
+            response = await feishu_limiter.call("im.message.patch", lambda: client.im.v1.message.apatch(request), priority)
             if not response.success():
                 logger.error(f"Failed to update card {message_id}: {response.msg} - {response.error}")
                 return False
@@ -195,186 +282,131 @@ class FeishuService:
             logger.error(f"Error updating card {message_id}: {e}", exc_info=True)
             return False
 
+    @staticmethod
+    async def send_streaming_card(receive_id: str, template: str, title: str, content: str, receive_id_type: str = "open_id"):
+        """
+        发送流式卡片实体 (FEISHU_STREAMING_CARD_ENABLED 开启时)，后续更新只推送正文元素
+        :return: message_id，未开启或失败时返回 None
+        """
+        if not settings.FEISHU_STREAMING_CARD_ENABLED:
+            return None
+        return await streaming_cards.send(receive_id, template, title, content, receive_id_type)
+
+    @staticmethod
+    async def _update_streaming_card(message_id: str, content: str, is_finished: bool, template: str, title: str):
+        """
+        更新流式卡片实体：进行中只更新正文元素，完成时关闭流式模式并整卡更新
+        """
+        if is_finished:
+            return await streaming_cards.finish(message_id, content, template, title)
+        return await streaming_cards.update(message_id, content)
+
+    @staticmethod
+    def stream_min_interval(message_id: str):
+        """
+        流式卡片实体的元素级更新可以更频繁，普通卡片返回 None 使用默认间隔
+        """
+        return settings.CARDKIT_STREAM_MIN_INTERVAL if streaming_cards.get(message_id) else None
+
     @staticmethod
     async def send_basic_mode_card(receive_id: str, receive_id_type: str = "open_id"):
         """发送基础模式切换成功卡片"""
-        card_content = {
-            "config": {"wide_screen_mode": True},
-            "header": {
-                "template": "blue",
-                "title": {"content": "✨ 已切换至基础模式", "tag": "plain_text"}
-            },
-            "elements": [
-                {
-                    "tag": "div",
-                    "text": {"content": "您现在处于**基础模式**。\n请直接发送您的提示词草稿，我将为您优化。", "tag": "lark_md"}
-                },
-                {
-                    "tag": "note",
-                    "elements": [{"tag": "plain_text", "content": "💡 提示：您可以随时点击菜单切换其他模式"}]
-                }
-            ]
-        }
-        return await FeishuService.send_card(receive_id, card_content, receive_id_type)
+        return await FeishuService.send_card(receive_id, card_templates.render("basic_mode"), receive_id_type)
 
     @staticmethod
     async def send_image_mode_card(receive_id: str, receive_id_type: str = "open_id"):
         """发送图片模式切换成功卡片"""
-        card_content = {
-            "config": {"wide_screen_mode": True},
-            "header": {
-                "template": "wathet",
-                "title": {"content": "🖼️ 已切换至图片模式", "tag": "plain_text"}
-            },
-            "elements": [
-                {
-                    "tag": "div",
-                    "text": {"content": "您现在处于**图片模式**。\n请发送图片或详细的画面描述。", "tag": "lark_md"}
-                },
-                {
-                    "tag": "note",
-                    "elements": [{"tag": "plain_text", "content": "💡 提示：您可以随时点击菜单切换其他模式"}]
-                }
-            ]
-        }
-        return await FeishuService.send_card(receive_id, card_content, receive_id_type)
+        return await FeishuService.send_card(receive_id, card_templates.render("image_mode"), receive_id_type)
 
     @staticmethod
     async def send_search_mode_card(receive_id: str, receive_id_type: str = "open_id"):
         """发送关键词检索模式切换成功卡片"""
-        card_content = {
-            "config": {"wide_screen_mode": True},
-            "header": {
-                "template": "orange",
-                "title": {"content": "🔍 已切换至关键词检索模式", "tag": "plain_text"}
-            },
-            "elements": [
-                {
-                    "tag": "div",
-                    "text": {"content": "您现在处于**关键词检索模式**。\n🚧 **该功能暂未实现，敬请期待！**", "tag": "lark_md"}
-                },
-                {
-                    "tag": "note",
-                    "elements": [{"tag": "plain_text", "content": "💡 提示：您可以随时点击菜单切换其他模式"}]
-                }
-            ]
-        }
-        return await FeishuService.send_card(receive_id, card_content, receive_id_type)
+        return await FeishuService.send_card(receive_id, card_templates.render("search_mode"), receive_id_type)
 
     @staticmethod
     async def send_report_mode_card(receive_id: str, receive_id_type: str = "open_id"):
         """发送日报周报总结模式切换成功卡片"""
-        card_content = {
-            "config": {"wide_screen_mode": True},
-            "header": {
-                "template": "green",
-                "title": {"content": "📊 已切换至日报周报模式", "tag": "plain_text"}
-            },
-            "elements": [
-                {
-                    "tag": "div",
-                    "text": {
-                        "content": "您现在处于**日报周报总结模式**。\n\n您可以：\n1. **发送工作内容**（如\"今天完成了...明天计划...\"），我将为您生成专业日报。\n2. **查询历史汇报**（如\"查询昨天的日报\"），我将为您查找团队记录。\n3. **生成总结报告**，支持以下关键词：\n   - 📅 **日总结**：\"日总结\"、\"今日总结\"、\"昨天总结\"、\"02-09总结\"\n   - 📊 **周总结**：\"周总结\"、\"本周总结\"、\"上周总结\"、\"一周总结\"\n   - 📈 **月总结**：\"月总结\"、\"本月总结\"、\"上月总结\"、\"1月总结\"\n\n💡 提示：也支持复杂表达，如\"帮我看看这周的工作情况\"",
-                        "tag": "lark_md"
-                    }
-                },
-                {
-                    "tag": "note",
-                    "elements": [{"tag": "plain_text", "content": "💡 提示：输入内容越详细，生成的日报越专业"}]
-                }
-            ]
-        }
-        return await FeishuService.send_card(receive_id, card_content, receive_id_type)
+        return await FeishuService.send_card(receive_id, card_templates.render("report_mode"), receive_id_type)
 
     @staticmethod
     async def send_optimization_result_card(receive_id: str, original_prompt: str, optimized_result: str, optimize_type: str):
         """发送优化结果卡片(非流式)"""
         display_original = original_prompt[:100] + "..." if len(original_prompt) > 100 else original_prompt
-        display_content = optimized_result.strip().replace("```markdown", "").replace("```", "").strip()
-        card_content = {
-            "config": {"wide_screen_mode": True},
-            "header": {
-                "template": "green",
-                "title": {"content": "✅ 提示词优化完成", "tag": "plain_text"}
-            },
-            "elements": [
-                {"tag": "div", "text": {"content": f"**原始提示词**\n{display_original}", "tag": "lark_md"}},
-                {"tag": "div", "text": {"content": f"**优化结果**\n{display_content}", "tag": "lark_md"}},
-                {"tag": "note", "elements": [{"tag": "plain_text", "content": f"模式: {optimize_type}"}]}
-            ]
-        }
+        card_content = card_templates.render(
+            "optimization_result",
+            prompt=display_original,
+            content=StreamRenderBuffer.from_text(optimized_result),
+            mode=optimize_type
+        )
         return await FeishuService.send_card(receive_id, card_content)
 
     @staticmethod
     async def send_optimization_stream_start_card(receive_id: str, original_prompt: str, optimize_type: str = "基础模式"):
         """发送流式生成开始卡片"""
-        card_content = {
-            "config": {"wide_screen_mode": True},
-            "header": {
-                "template": "blue",
-                "title": {"content": "🚀 正在生成优化结果...", "tag": "plain_text"}
-            },
-            "elements": [
-                {
-                    "tag": "div",
-                    "text": {"content": f"**原始提示词**：\n{original_prompt}\n\n**优化结果**：\n(思考中...)", "tag": "lark_md"}
-                }
-            ]
-        }
+        message_id = await FeishuService.send_streaming_card(
+            receive_id, "blue", "🚀 正在生成优化结果...", f"**原始提示词**：\n{original_prompt}\n\n**优化结果**：\n(思考中...)"
+        )
+        if message_id:
+            return message_id
+        card_content = card_templates.render(
+            "optimization_stream",
+            template="blue", title="🚀 正在生成优化结果...", prompt=original_prompt, content="(思考中...)"
+        )
         try:
             request_body = CreateMessageRequestBody.builder() \
                 .receive_id(receive_id) \
                 .msg_type("interactive") \
-                .content(json.dumps(card_content)) \
+                .content(card_content) \
                 .build()
             request = CreateMessageRequest.builder().receive_id_type("open_id").request_body(request_body).build()
-            response = await client.im.v1.message.acreate(request)
+            response = await feishu_limiter.call("im.message.create", lambda: client.im.v1.message.acreate(request), Priority.HIGH)
             return response.data.message_id if response.success() else None
         except Exception as e:
             logger.error(f"Error sending stream start card: {e}")
             return None
 
     @staticmethod
-    async def update_optimization_stream_card(message_id: str, original_prompt: str, current_content: str, is_finished: bool = False):
-        """更新流式卡片内容"""
-        title = "✅ 提示词优化完成" if is_finished else "🚀 正在生成优化结果..."
+    async def update_optimization_stream_card(message_id: str, original_prompt: str, current_content: Union[str, StreamRenderBuffer], is_finished: bool = False):
+        """
+        更新流式卡片内容
+        :param current_content: 当前内容，流式场景传入 StreamRenderBuffer 以增量渲染
+        """
         template = "green" if is_finished else "blue"
-        display_content = current_content.strip().replace("```markdown", "").replace("```", "").strip()
-        card_content = {
-            "config": {"wide_screen_mode": True},
-            "header": {"template": template, "title": {"content": title, "tag": "plain_text"}},
-            "elements": [
-                {
-                    "tag": "div",
-                    "text": {"content": f"**原始提示词**：\n{original_prompt}\n\n**优化结果**：\n{display_content}", "tag": "lark_md"}
-                }
-            ]
-        }
-        return await FeishuService.update_card(message_id, card_content)
+        title = "✅ 提示词优化完成" if is_finished else "🚀 正在生成优化结果..."
+        buffer = as_render_buffer(current_content)
+        if streaming_cards.get(message_id):
+            return await FeishuService._update_streaming_card(
+                message_id, f"**原始提示词**：\n{original_prompt}\n\n**优化结果**：\n{buffer.text}", is_finished, template, title
+            )
+        card_content = card_templates.render(
+            "optimization_stream", template=template, title=title, prompt=original_prompt, content=buffer
+        )
+        return await FeishuService.update_card(
+            message_id, card_content, Priority.HIGH if is_finished else Priority.NORMAL
+        )
 
     @staticmethod
     async def send_clarification_questions(receive_id: str, questions: list, reason: str):
         """发送澄清问题卡片"""
         q_text = "\n".join([f"{i+1}. {q}" for i, q in enumerate(questions)])
-        card_content = {
-            "config": {"wide_screen_mode": True},
-            "header": {
-                "template": "orange",
-                "title": {"content": "🤔 需要您补充一点细节", "tag": "plain_text"}
-            },
-            "elements": [
-                {
-                    "tag": "div",
-                    "text": {"content": f"为了提供更精准的提示词，我需要了解更多信息：\n\n**{reason}**\n\n请直接回复以下问题的答案：\n{q_text}", "tag": "lark_md"}
-                },
-                {
-                    "tag": "note",
-                    "elements": [{"tag": "plain_text", "content": "💡 直接回复答案即可，我会结合您的回答进行最终优化"}]
-                }
-            ]
-        }
+        card_content = card_templates.render("clarification", reason=reason, questions=q_text)
         return await FeishuService.send_card(receive_id, card_content)
 
+    @staticmethod
+    async def update_to_clarification_card(message_id: str, questions: list, reason: str):
+        """
+        将已发送的流式生成卡片改为澄清问题卡片 (推测执行判定需要澄清时)
+        """
+        q_text = "\n".join([f"{i+1}. {q}" for i, q in enumerate(questions)])
+        if streaming_cards.get(message_id):
+            return await FeishuService._update_streaming_card(
+                message_id,
+                f"为了提供更精准的提示词，我需要了解更多信息：\n\n**{reason}**\n\n请直接回复以下问题的答案：\n{q_text}",
+                True, "orange", "🤔 需要您补充一点细节"
+            )
+        card_content = card_templates.render("clarification", reason=reason, questions=q_text)
+        return await FeishuService.update_card(message_id, card_content, Priority.HIGH)
+
     @staticmethod
     async def send_text(receive_id: str, text: str, receive_id_type: str = "open_id"):
         """发送飞书文本消息"""
@@ -385,7 +417,7 @@ class FeishuService:
                 .content(json.dumps({"text": text})) \
                 .build()
             request = CreateMessageRequest.builder().receive_id_type(receive_id_type).request_body(request_body).build()
-            response = await client.im.v1.message.acreate(request)
+            response = await feishu_limiter.call("im.message.create", lambda: client.im.v1.message.acreate(request), Priority.HIGH)
             return response.success()
         except Exception as e:
             logger.error(f"Error sending text to {receive_id}: {e}", exc_info=True)
@@ -394,81 +426,95 @@ class FeishuService:
     @staticmethod
     async def send_image_analysis_stream_start_card(receive_id: str):
         """发送图片分析流式开始卡片"""
-        card_content = {
-            "config": {"wide_screen_mode": True},
-            "header": {"template": "blue", "title": {"content": "🖼️ 正在分析画面...", "tag": "plain_text"}},
-            "elements": [{"tag": "div", "text": {"content": "正在观察画面细节，生成画面摘要..", "tag": "lark_md"}}]
-        }
+        message_id = await FeishuService.send_streaming_card(
+            receive_id, "blue", "🖼️ 正在分析画面...", "正在观察画面细节，生成画面摘要.."
+        )
+        if message_id:
+            return message_id
+        card_content = card_templates.render("image_analysis_start")
         try:
             request_body = CreateMessageRequestBody.builder() \
                 .receive_id(receive_id) \
                 .msg_type("interactive") \
-                .content(json.dumps(card_content)) \
+                .content(card_content) \
                 .build()
             request = CreateMessageRequest.builder().receive_id_type("open_id").request_body(request_body).build()
-            response = await client.im.v1.message.acreate(request)
+            response = await feishu_limiter.call("im.message.create", lambda: client.im.v1.message.acreate(request), Priority.HIGH)
             return response.data.message_id if response.success() else None
         except Exception as e:
             logger.error(f"Error sending image analysis card: {e}")
             return None
 
     @staticmethod
-    async def update_image_analysis_card(message_id: str, content: str, is_finished: bool = False):
-        """更新图片分析卡片"""
-        title = "✅ 图片分析完成" if is_finished else "🖼️ 正在分析画面..."
-        template = "green" if is_finished else "blue"
-        display_content = content.strip()
+    async def update_image_analysis_card(message_id: str, content: Union[str, StreamRenderBuffer], is_finished: bool = False, progress: str = None):
+        """
+        更新图片分析卡片
+        :param content: 当前内容，流式场景传入 StreamRenderBuffer 以增量渲染
+        :param progress: 分析进度提示 (如模型思考中)，仅在未完成时展示
+        """
+        buffer = as_render_buffer(content, strip_fences=False)
         if is_finished:
-            display_content += "\n\n**请发送您的提示词指令，我将结合画面信息为您优化！**"
-        card_content = {
-            "config": {"wide_screen_mode": True},
-            "header": {"template": template, "title": {"content": title, "tag": "plain_text"}},
-            "elements": [{"tag": "div", "text": {"content": f"**【画面摘要】：**\n{display_content}", "tag": "lark_md"}}]
-        }
-        return await FeishuService.update_card(message_id, card_content)
+            tail = "\n\n**请发送您的提示词指令，我将结合画面信息为您优化！**"
+        elif progress:
+            tail = f"\n\n{progress}" if buffer.text else progress
+        else:
+            tail = ""
+        template = "green" if is_finished else "blue"
+        title = "✅ 图片分析完成" if is_finished else "🖼️ 正在分析画面..."
+        if streaming_cards.get(message_id):
+            return await FeishuService._update_streaming_card(
+                message_id, f"**【画面摘要】：**\n{buffer.text}{tail}", is_finished, template, title
+            )
+        card_content = card_templates.render("image_analysis", template=template, title=title, content=buffer, tail=tail)
+        return await FeishuService.update_card(
+            message_id, card_content, Priority.HIGH if is_finished else Priority.NORMAL
+        )
 
     @staticmethod
     async def send_weekly_summary_stream_start_card(receive_id: str, date_range_desc: str):
         """发送周总结流式开始卡片"""
-        card_content = {
-            "config": {"wide_screen_mode": True},
-            "header": {"template": "purple", "title": {"content": "📊 正在生成周度递归进步总结...", "tag": "plain_text"}},
-            "elements": [
-                {
-                    "tag": "div",
-                    "text": {"content": f"**📅 分析周期**: {date_range_desc}\n\n正在拉取日报数据并进行递归分析，请稍候..", "tag": "lark_md"}
-                }
-            ]
-        }
+        message_id = await FeishuService.send_streaming_card(
+            receive_id, "purple", "📊 正在生成周度递归进步总结...",
+            f"**📅 分析周期**: {date_range_desc}\n\n正在拉取日报数据并进行递归分析，请稍候.."
+        )
+        if message_id:
+            return message_id
+        card_content = card_templates.render(
+            "weekly_summary",
+            template="purple", title="📊 正在生成周度递归进步总结...", period=date_range_desc,
+            content="正在拉取日报数据并进行递归分析，请稍候.."
+        )
         try:
             request_body = CreateMessageRequestBody.builder() \
                 .receive_id(receive_id) \
                 .msg_type("interactive") \
-                .content(json.dumps(card_content)) \
+                .content(card_content) \
                 .build()
             request = CreateMessageRequest.builder().receive_id_type("open_id").request_body(request_body).build()
-            response = await client.im.v1.message.acreate(request)
+            response = await feishu_limiter.call("im.message.create", lambda: client.im.v1.message.acreate(request), Priority.HIGH)
             return response.data.message_id if response.success() else None
         except Exception as e:
             logger.error(f"Error sending weekly summary start card: {e}")
             return None
 
     @staticmethod
-    async def update_weekly_summary_card(message_id: str, content: str, date_range_desc: str, is_finished: bool = False):
-        """更新周总结流式卡片内容"""
-        title = "✅ 周度递归进步总结完成" if is_finished else "📊 正在生成周度递归进步总结..."
+    async def update_weekly_summary_card(message_id: str, content: Union[str, StreamRenderBuffer], date_range_desc: str, is_finished: bool = False):
+        """
+        更新周总结流式卡片内容
+        :param content: 当前内容，流式场景传入 StreamRenderBuffer 以增量渲染
+        """
         template = "green" if is_finished else "purple"
-        display_content = content.strip().replace("```markdown", "").replace("```", "").strip()
-        card_content = {
-            "config": {"wide_screen_mode": True},
-            "header": {"template": template, "title": {"content": title, "tag": "plain_text"}},
-            "elements": [
-                {
-                    "tag": "div",
-                    "text": {"content": f"**📅 分析周期**: {date_range_desc}\n\n{display_content}", "tag": "lark_md"}
-                }
-            ]
-        }
-        return await FeishuService.update_card(message_id, card_content)
+        title = "✅ 周度递归进步总结完成" if is_finished else "📊 正在生成周度递归进步总结..."
+        buffer = as_render_buffer(content)
+        if streaming_cards.get(message_id):
+            return await FeishuService._update_streaming_card(
+                message_id, f"**📅 分析周期**: {date_range_desc}\n\n{buffer.text}", is_finished, template, title
+            )
+        card_content = card_templates.render(
+            "weekly_summary", template=template, title=title, period=date_range_desc, content=buffer
+        )
+        return await FeishuService.update_card(
+            message_id, card_content, Priority.HIGH if is_finished else Priority.NORMAL
+        )
 
 feishu_service = FeishuService()
\ No newline at end of file
@@ -1,11 +1,16 @@
 import logging
+from typing import Optional
 from app.core.llm import LLMClient
+from app.core.config import settings
+from app.core.image import image_description_cache, image_cache_key
 from app.core.prompts import PROMPTS, PromptTemplate
 from app.schemas.prompt import OptimizeType
 import json
 
 logger = logging.getLogger(__name__)
 
+IMAGE_ANALYSIS_PROMPT = "请详细描述这张图片的内容，包括画面主体、环境背景、色彩光影、构图方式以及画面传达的氛围或情绪。请用通俗易懂的语言描述。"
+
 class PromptService:
     def __init__(self):
         self.llm_client = LLMClient()
@@ -28,7 +33,9 @@ class PromptService:
         ]
         
         try:
-            response = await self.llm_client.chat(messages, temperature=0.5)
+            response = await self.llm_client.chat(
+                messages, temperature=0.5, task=PromptTemplate.CLARIFICATION_CHECK
+            )
             response = response.strip()
             
             if "NO_QUESTIONS" in response:
@@ -98,7 +105,8 @@ class PromptService:
         ]
 
         try:
-            optimized_content = await self.llm_client.chat(messages)
+            task = PromptTemplate.OPTIMIZE_WITH_CONTEXT if context else optimize_type
+            optimized_content = await self.llm_client.chat(messages, task=task)
             return optimized_content
         except Exception as e:
             logger.error(f"Failed to optimize prompt: {e}")
@@ -143,28 +151,69 @@ class PromptService:
             {"role": "user", "content": system_prompt}
         ]
         
-        async for chunk in self.llm_client.chat_stream(messages):
+        # 指标按优化类型打标签
+        task = PromptTemplate.OPTIMIZE_WITH_CONTEXT if context else optimize_type
+        async for chunk in self.llm_client.chat_stream(messages, hedge=True, task=task):
             yield chunk
 
-    async def analyze_image(self, image_data: bytes) -> str:
+    def _image_cache_key(self, image_data: bytes) -> str:
+        return image_cache_key(image_data, self.llm_client.vl_model, IMAGE_ANALYSIS_PROMPT)
+
+    async def get_cached_image_description(self, image_data: bytes) -> Optional[str]:
+        """
+        查询图片描述缓存 (按预处理后图片内容的哈希)
+        """
+        if not settings.IMAGE_DESC_CACHE_ENABLED:
+            return None
+        description = await image_description_cache.get(self._image_cache_key(image_data))
+        if description is not None:
+            logger.info("Image description cache hit")
+        return description
+
+    async def analyze_image(self, image_data: bytes, mime_type: str = "image/jpeg") -> str:
         """
         使用视觉模型分析图片内容
         """
-        prompt = "请详细描述这张图片的内容，包括画面主体、环境背景、色彩光影、构图方式以及画面传达的氛围或情绪。请用通俗易懂的语言描述。"
+        cached = await self.get_cached_image_description(image_data)
+        if cached is not None:
+            return cached
         try:
-            return await self.llm_client.chat_with_image(prompt, image_data)
+            description = await self.llm_client.chat_with_image(
+                IMAGE_ANALYSIS_PROMPT, image_data, task="image_analysis", mime_type=mime_type
+            )
         except Exception as e:
             logger.error(f"Failed to analyze image: {e}")
             raise e
+        if settings.IMAGE_DESC_CACHE_ENABLED and description:
+            await image_description_cache.set(self._image_cache_key(image_data), description)
+        return description
 
-    async def analyze_image_stream(self, image_data: bytes):
+    async def analyze_image_stream(self, image_data: bytes, mime_type: str = "image/jpeg", on_reasoning=None,
+                                   check_cache: bool = True):
         """
         使用视觉模型分析图片内容 (流式)
+        缓存命中时一次性产出完整描述；完整生成结束后写入缓存 (中途失败的部分结果不缓存)
+        :param on_reasoning: Thinking 模型的思考进度回调 (已思考 token 数, 已思考秒数)
+        :param check_cache: 调用方已通过 get_cached_image_description 查询过缓存时传 False，避免重复查询
         """
-        prompt = "请详细描述这张图片的内容，包括画面主体、环境背景、色彩光影、构图方式以及画面传达的氛围或情绪。请用通俗易懂的语言描述。"
-        async for chunk in self.llm_client.chat_with_image_stream(prompt, image_data):
+        if check_cache:
+            cached = await self.get_cached_image_description(image_data)
+            if cached is not None:
+                yield cached
+                return
+
+        chunks = []
+        async for chunk in self.llm_client.chat_with_image_stream(
+            IMAGE_ANALYSIS_PROMPT, image_data, hedge=True, task="image_analysis", mime_type=mime_type,
+            on_reasoning=on_reasoning
+        ):
+            chunks.append(chunk)
             yield chunk
 
+        description = "".join(chunks)
+        if settings.IMAGE_DESC_CACHE_ENABLED and description:
+            await image_description_cache.set(self._image_cache_key(image_data), description)
+
     async def optimize_with_image(self, user_instruction: str, image_description: str) -> str:
         """
         结合图片语义理解和用户指令进行提示词优化
@@ -213,7 +262,7 @@ Analyze the intent:
 Return ONLY the code (GEN_IMAGE, FORCE_TEXT, or OTHER)."""
 
         try:
-            response = await self.llm_client.chat_simple(prompt)
+            response = await self.llm_client.chat_simple(prompt, task="image_mode_intent")
             intent = response.strip().upper()
             if "GEN_IMAGE" in intent: return "GEN_IMAGE"
             if "FORCE_TEXT" in intent: return "FORCE_TEXT"
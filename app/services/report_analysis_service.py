@@ -6,6 +6,8 @@ from app.services.feishu_service import FeishuService
 from app.core.llm import LLMClient
 from app.core.prompts import PROMPTS, PromptTemplate
 from app.core.config import settings
+from app.core.model_tiers import resolve_model
+from app.core.tokens import estimate_tokens, input_budget_for, truncate_sections
 
 logger = logging.getLogger(__name__)
 
@@ -150,30 +152,44 @@ class ReportAnalysisService:
         final_tasks = list(filtered_tasks_map.values())
         print(f"🧹 过滤重复汇报后，剩余 {len(final_tasks)} 条待处理任务 (策略: 每天每人保留最新)。")
 
+        # 1. 提取基础信息并解析汇报内容
+        prepared = []
         for task in final_tasks:
+            user_id = getattr(task, 'from_user_id', '')
+            submitter_name = getattr(task, 'from_user_name', '') or user_map.get(user_id, "未知用户")
+            rule_name = getattr(task, 'rule_name', '未知汇报')
+            commit_time = getattr(task, 'commit_time', now)
+            
+            # 计算 Date Key
+            dt = datetime.fromtimestamp(int(commit_time))
+            date_str = dt.strftime('%Y-%m-%d')
+            
+            # 2. Transform (转换) - 解析汇报内容
+            content_text = self._parse_form_data(task)
+            if not content_text:
+                print(f"⚠️ 跳过空汇报: {submitter_name}")
+                continue
+
+            # 3. Transform (转换) - 确定报告类型
+            report_type = "周报" if "周" in rule_name else "日报"
+            prepared.append((user_id, submitter_name, commit_time, date_str, content_text, report_type))
+
+        # 4. Transform (转换) - AI 诊断 (批量并发)
+        print(f"🤖 正在 AI 诊断 {len(prepared)} 条汇报...")
+
+        def _on_diagnosed(done: int, total: int, result):
+            _, name, _, date, _, rtype = prepared[result.index]
+            status = "完成" if result.ok else "失败"
+            print(f"🤖 [{done}/{total}] {name} 的{rtype} ({date}) 诊断{status}")
+
+        diagnoses = await self.llm_client.chat_many(
+            [self._diagnosis_request(item[5], item[4]) for item in prepared],
+            on_progress=_on_diagnosed
+        )
+
+        for (user_id, submitter_name, commit_time, date_str, content_text, report_type), diagnosis in zip(prepared, diagnoses):
             try:
-                # 1. 提取基础信息
-                user_id = getattr(task, 'from_user_id', '')
-                submitter_name = getattr(task, 'from_user_name', '') or user_map.get(user_id, "未知用户")
-                rule_name = getattr(task, 'rule_name', '未知汇报')
-                commit_time = getattr(task, 'commit_time', now)
-                
-                # 计算 Date Key
-                dt = datetime.fromtimestamp(int(commit_time))
-                date_str = dt.strftime('%Y-%m-%d')
-                
-                # 2. Transform (转换) - 解析汇报内容
-                content_text = self._parse_form_data(task)
-                if not content_text:
-                    print(f"⚠️ 跳过空汇报: {submitter_name}")
-                    continue
-
-                # 3. Transform (转换) - 确定报告类型
-                report_type = "周报" if "周" in rule_name else "日报"
-                
-                # 4. Transform (转换) - AI 诊断
-                print(f"🤖 正在 AI 诊断 {submitter_name} 的{report_type} ({date_str})...")
-                ai_result = await self._call_ai_diagnosis(report_type, content_text)
+                ai_result = self._diagnosis_from_result(diagnosis)
                 
                 # 5. Delete Old Records (删除旧记录)
                 records_to_delete = []
@@ -266,35 +282,47 @@ class ReportAnalysisService:
         
         return "\n".join(full_text)
 
-    async def _call_ai_diagnosis(self, report_type: str, content: str) -> dict:
+    def _diagnosis_request(self, report_type: str, content: str) -> dict:
         """
-        调用 LLM 进行诊断
+        构造诊断请求 (chat 的关键字参数)，供 chat_many 批量诊断使用
         """
         prompt = PROMPTS[PromptTemplate.REPORT_DIAGNOSIS].format(
             report_type=report_type,
             content=content
         )
-        
-        try:
-            # 使用 JSON 模式 (如果 LLMClient 支持，否则解析文本)
-            # 这里假设 LLMClient 返回的是字符串，我们尝试解析 JSON
-            messages = [{"role": "user", "content": prompt}]
-            response = await self.llm_client.chat(messages)
-            
-            # 清理 Markdown 代码块 (```json ... ```)
-            if response.startswith("```"):
-                lines = response.split("\n")
-                if lines[0].strip().startswith("```"):
-                    lines = lines[1:]
-                if lines[-1].strip().startswith("```"):
-                    lines = lines[:-1]
-                response = "\n".join(lines)
-                
-            return json.loads(response)
-            
-        except Exception as e:
-            logger.error(f"AI diagnosis failed: {e}")
-            return {"advice": "AI 诊断失败，请检查日志。", "score": 0}
+        return {
+            "messages": [{"role": "user", "content": prompt}],
+            "task": PromptTemplate.REPORT_DIAGNOSIS
+        }
+
+    @staticmethod
+    def _parse_diagnosis(response: str) -> dict:
+        """
+        解析 LLM 返回的诊断 JSON
+        """
+        # 清理 Markdown 代码块 (```json ... ```)
+        if response.startswith("```"):
+            lines = response.split("\n")
+            if lines[0].strip().startswith("```"):
+                lines = lines[1:]
+            if lines[-1].strip().startswith("```"):
+                lines = lines[:-1]
+            response = "\n".join(lines)
+
+        return json.loads(response)
+
+    def _diagnosis_from_result(self, result) -> dict:
+        """
+        从批量调用的结果中取出诊断，失败时返回兜底诊断
+        """
+        error = result.error
+        if result.ok:
+            try:
+                return self._parse_diagnosis(result.content)
+            except Exception as e:
+                error = e
+        logger.error(f"AI diagnosis failed: {error}")
+        return {"advice": "AI 诊断失败，请检查日志。", "score": 0}
 
     async def _prepare_weekly_data(self, start_time: int, end_time: int) -> dict:
         """
@@ -353,16 +381,32 @@ class ReportAnalysisService:
 
         return user_reports
 
-    def _format_weekly_reports(self, reports: list[tuple[str, str]]) -> str:
+    def _fit_report_sections(self, sections: list[str], template: PromptTemplate, max_tokens: int) -> list[str]:
+        """
+        按模型上下文预算裁剪日报分段，避免长周期 / 长日报的 Prompt 超出上下文窗口
+        :param template: 使用的 Prompt 模板 (扣除模板自身的 token 开销)
+        :param max_tokens: 为输出预留的 token 数
+        """
+        budget = input_budget_for(resolve_model(None), max_tokens) - estimate_tokens(PROMPTS[template])
+        kept, dropped = truncate_sections(
+            sections, budget,
+            strategy=settings.REPORT_TRUNCATION_STRATEGY,
+            section_cap=settings.REPORT_SECTION_TOKEN_CAP
+        )
+        if dropped:
+            logger.warning(f"Report prompt over budget ({budget} tokens), dropped {dropped} oldest sections")
+        return kept
+
+    def _format_weekly_reports(self, reports: list[tuple[str, str]], max_tokens: int = 4000) -> str:
         """
         将一周的日报列表格式化为 LLM 输入文本
         """
-        parts = []
-        for i, (date_str, content) in enumerate(reports, 1):
-            parts.append(f"--- 第{i}天: {date_str} ---")
-            parts.append(content)
-            parts.append("")
-        return "\n".join(parts)
+        sections = [
+            f"--- 第{i}天: {date_str} ---\n{content}\n"
+            for i, (date_str, content) in enumerate(reports, 1)
+        ]
+        sections = self._fit_report_sections(sections, PromptTemplate.WEEKLY_RECURSIVE_SUMMARY, max_tokens)
+        return "\n".join(sections)
 
     @staticmethod
     def _extract_summary_and_score(full_content: str) -> tuple:
@@ -513,35 +557,34 @@ class ReportAnalysisService:
             logger.info("No report data found for weekly summary.")
             return 0
 
-        processed_count = 0
+        jobs = []
         for user_name, user_data in user_reports.items():
-            user_id = user_data['user_id']
             reports = user_data['reports']
             date_range = f"{reports[0][0]} 至 {reports[-1][0]}" if len(reports) > 1 else reports[0][0]
-            daily_reports_text = self._format_weekly_reports(reports)
-            
+            # 判断是周总结还是日总结
+            report_type = "日总结" if len(reports) == 1 else "周总结"
             prompt = PROMPTS[PromptTemplate.WEEKLY_RECURSIVE_SUMMARY].format(
                 user_name=user_name,
                 date_range=date_range,
-                daily_reports=daily_reports_text
+                daily_reports=self._format_weekly_reports(reports)
             )
-            
-            messages = [{"role": "user", "content": prompt}]
-            
+            jobs.append((user_name, user_data['user_id'], date_range, report_type, prompt))
+
+        results = await self.llm_client.chat_many([
+            {"messages": [{"role": "user", "content": prompt}], "temperature": 0.7, "max_tokens": 4000}
+            for *_, prompt in jobs
+        ])
+
+        processed_count = 0
+        for (user_name, user_id, date_range, report_type, _), result in zip(jobs, results):
+            if not result.ok:
+                logger.error(f"Weekly summary failed for {user_name}: {result.error}")
+                continue
             try:
-                response = await self.llm_client.chat(
-                    messages=messages,
-                    temperature=0.7,
-                    max_tokens=4000
-                )
-                
-                if response:
-                    summary, score = self._extract_summary_and_score(response)
-                    # 判断是周总结还是日总结
-                    is_single_day = len(reports) == 1
-                    report_type = "日总结" if is_single_day else "周总结"
+                if result.content:
+                    summary, score = self._extract_summary_and_score(result.content)
                     success = await self._save_summary_to_bitable(
-                        user_name, user_id, date_range, response, summary, score, report_type
+                        user_name, user_id, date_range, result.content, summary, score, report_type
                     )
                     if success:
                         processed_count += 1
@@ -571,7 +614,8 @@ class ReportAnalysisService:
             response = await self.llm_client.chat(
                 messages=messages,
                 temperature=0.1,
-                max_tokens=200
+                max_tokens=200,
+                task=PromptTemplate.SUMMARY_INTENT_RECOGNITION
             )
             
             if response:
@@ -704,7 +748,9 @@ class ReportAnalysisService:
             reports = user_data['reports']
             
             # 日总结只取当天的数据
-            daily_content = "\n".join([content for _, content in reports])
+            daily_content = "\n".join(self._fit_report_sections(
+                [content for _, content in reports], PromptTemplate.DAILY_SUMMARY, 3000
+            ))
             
             prompt = PROMPTS[PromptTemplate.DAILY_SUMMARY].format(
                 user_name=user_name,
@@ -742,33 +788,32 @@ class ReportAnalysisService:
         :param user_reports: {user_name: {'user_id': str, 'reports': [(date_str, content), ...]}}
         :return: {user_name: {'user_id': str, 'summaries': [(date_str, summary_text), ...]}}
         """
-        compressed = {}
-        
-        for user_name, user_data in user_reports.items():
-            user_id = user_data['user_id']
-            summaries = []
-            
-            for date_str, content in user_data['reports']:
-                # 尝试用简短 prompt 压缩
-                try:
-                    compress_prompt = f"请用不超过100个中文字符概括以下工作日报的核心内容,只输出概括文字,不要任何前缀:\n\n{content}"
-                    messages = [{"role": "user", "content": compress_prompt}]
-                    summary = await self.llm_client.chat(
-                        messages=messages,
-                        temperature=0.3,
-                        max_tokens=200
-                    )
-                    if summary:
-                        # 确保不超过100字
-                        summary = summary.strip()[:100]
-                    else:
-                        summary = content[:100] + "..." if len(content) > 100 else content
-                except Exception:
-                    summary = content[:100] + "..." if len(content) > 100 else content
-                
-                summaries.append((date_str, summary))
-            
-            compressed[user_name] = {'user_id': user_id, 'summaries': summaries}
+        # 所有用户、所有天的压缩请求并发执行
+        items = [
+            (user_name, date_str, content)
+            for user_name, user_data in user_reports.items()
+            for date_str, content in user_data['reports']
+        ]
+        results = await self.llm_client.chat_many([
+            {
+                "messages": [{"role": "user", "content": f"请用不超过100个中文字符概括以下工作日报的核心内容,只输出概括文字,不要任何前缀:\n\n{content}"}],
+                "temperature": 0.3,
+                "max_tokens": 200
+            }
+            for _, _, content in items
+        ])
+
+        compressed = {
+            user_name: {'user_id': user_data['user_id'], 'summaries': []}
+            for user_name, user_data in user_reports.items()
+        }
+        for (user_name, date_str, content), result in zip(items, results):
+            if result.ok and result.content:
+                # 确保不超过100字
+                summary = result.content.strip()[:100]
+            else:
+                summary = content[:100] + "..." if len(content) > 100 else content
+            compressed[user_name]['summaries'].append((date_str, summary))
         
         return compressed
 
@@ -839,28 +884,34 @@ class ReportAnalysisService:
             return 0
 
         date_str = datetime.fromtimestamp(start_time).strftime('%Y-%m-%d')
-        processed_count = 0
-        
+        jobs = []
         for user_name, user_data in user_reports.items():
-            user_id = user_data['user_id']
             reports = user_data['reports']
-            daily_content = "\n".join([content for _, content in reports])
-            
+            daily_content = "\n".join(self._fit_report_sections(
+                [content for _, content in reports], PromptTemplate.DAILY_SUMMARY, 3000
+            ))
             prompt = PROMPTS[PromptTemplate.DAILY_SUMMARY].format(
                 user_name=user_name,
                 date_str=date_str,
                 daily_content=daily_content
             )
-            messages = [{"role": "user", "content": prompt}]
-            
+            jobs.append((user_name, user_data['user_id'], prompt))
+
+        results = await self.llm_client.chat_many([
+            {"messages": [{"role": "user", "content": prompt}], "temperature": 0.7, "max_tokens": 3000}
+            for *_, prompt in jobs
+        ])
+
+        processed_count = 0
+        for (user_name, user_id, _), result in zip(jobs, results):
+            if not result.ok:
+                logger.error(f"Daily summary failed for {user_name}: {result.error}")
+                continue
             try:
-                response = await self.llm_client.chat(
-                    messages=messages, temperature=0.7, max_tokens=3000
-                )
-                if response:
-                    summary, score = self._extract_summary_and_score(response)
+                if result.content:
+                    summary, score = self._extract_summary_and_score(result.content)
                     success = await self._save_summary_to_bitable(
-                        user_name, user_id, date_str, response, summary, score, "日总结"
+                        user_name, user_id, date_str, result.content, summary, score, "日总结"
                     )
                     if success:
                         processed_count += 1
@@ -878,30 +929,33 @@ class ReportAnalysisService:
 
         compressed_data = await self._compress_daily_for_monthly(user_reports)
         month_range = f"{datetime.fromtimestamp(start_time).strftime('%Y-%m-%d')} 至 {datetime.fromtimestamp(end_time).strftime('%Y-%m-%d')}"
-        processed_count = 0
-        
+        jobs = []
         for user_name, user_data in compressed_data.items():
-            user_id = user_data['user_id']
-            summaries = user_data['summaries']
             daily_summaries_text = "\n".join([
-                f"- {date_str}: {summary}" for date_str, summary in summaries
+                f"- {date_str}: {summary}" for date_str, summary in user_data['summaries']
             ])
-            
             prompt = PROMPTS[PromptTemplate.MONTHLY_SUMMARY].format(
                 user_name=user_name,
                 month_range=month_range,
                 daily_summaries=daily_summaries_text
             )
-            messages = [{"role": "user", "content": prompt}]
-            
+            jobs.append((user_name, user_data['user_id'], prompt))
+
+        results = await self.llm_client.chat_many([
+            {"messages": [{"role": "user", "content": prompt}], "temperature": 0.7, "max_tokens": 4000}
+            for *_, prompt in jobs
+        ])
+
+        processed_count = 0
+        for (user_name, user_id, _), result in zip(jobs, results):
+            if not result.ok:
+                logger.error(f"Monthly summary failed for {user_name}: {result.error}")
+                continue
             try:
-                response = await self.llm_client.chat(
-                    messages=messages, temperature=0.7, max_tokens=4000
-                )
-                if response:
-                    summary, score = self._extract_summary_and_score(response)
+                if result.content:
+                    summary, score = self._extract_summary_and_score(result.content)
                     success = await self._save_summary_to_bitable(
-                        user_name, user_id, month_range, response, summary, score, "月总结"
+                        user_name, user_id, month_range, result.content, summary, score, "月总结"
                     )
                     if success:
                         processed_count += 1
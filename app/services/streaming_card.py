@@ -0,0 +1,269 @@
+import json
+import time
+import uuid
+import logging
+from typing import Dict, Optional
+from lark_oapi.api.cardkit.v1 import (
+    ContentCardElementRequest, ContentCardElementRequestBody,
+    CreateCardRequest, CreateCardRequestBody,
+    SettingsCardRequest, SettingsCardRequestBody,
+    UpdateCardRequest, UpdateCardRequestBody, Card
+)
+from lark_oapi.api.im.v1 import CreateMessageRequest, CreateMessageRequestBody
+from app.core.config import settings
+from app.core.feishu_limiter import Priority, feishu_limiter
+from app.core.metrics import metrics
+from app.core.card_templates import card_templates, slot, TRUNCATED_FOOTER
+
+logger = logging.getLogger(__name__)
+
+CARDKIT_CALLS = metrics.counter("cardkit_calls_total", "CardKit streaming card API calls", ("op", "status"))
+CARDKIT_BYTES = metrics.counter("cardkit_payload_bytes_total", "Bytes sent to CardKit streaming card APIs", ("op",))
+
+# 流式卡片中承载正文的元素 ID
+CONTENT_ELEMENT_ID = "content"
+
+# 卡片 JSON 2.0：正文为可寻址的 markdown 元素，开启 streaming_mode 后按打字机效果展示增量
+card_templates.register("streaming_card", {
+    "schema": "2.0",
+    "config": {
+        "streaming_mode": True,
+        "summary": {"content": slot("summary")},
+        "streaming_config": {
+            "print_frequency_ms": {"default": 50},
+            "print_step": {"default": 2},
+            "print_strategy": "fast"
+        }
+    },
+    "header": {"template": slot("template"), "title": {"content": slot("title"), "tag": "plain_text"}},
+    "body": {"elements": [{"tag": "markdown", "element_id": CONTENT_ELEMENT_ID, "content": slot("content")}]}
+}, truncate_slot="content", overflow_footer=TRUNCATED_FOOTER)
+card_templates.register("streaming_card_final", {
+    "schema": "2.0",
+    "config": {"streaming_mode": False, "summary": {"content": slot("title")}},
+    "header": {"template": slot("template"), "title": {"content": slot("title"), "tag": "plain_text"}},
+    "body": {"elements": [{"tag": "markdown", "element_id": CONTENT_ELEMENT_ID, "content": slot("content")}]}
+}, truncate_slot="content", overflow_footer=TRUNCATED_FOOTER)
+
+
+class CardKitApi:
+    """
+    飞书卡片实体 (CardKit) 接口的薄封装，测试中可替换为本地桩
+    所有方法失败时返回 None / False 并记录日志
+    """
+
+    def __init__(self, lark_client=None):
+        self._client = lark_client
+
+    @property
+    def client(self):
+        if self._client is None:
+            from app.core.feishu import client
+            self._client = client
+        return self._client
+
+    @staticmethod
+    def _record(op: str, response, payload: str) -> bool:
+        ok = response.success()
+        CARDKIT_CALLS.inc(op=op, status="ok" if ok else "error")
+        CARDKIT_BYTES.inc(len(payload.encode("utf-8")), op=op)
+        if not ok:
+            logger.error(f"CardKit {op} failed: {response.code} {response.msg}")
+        return ok
+
+    async def create_card(self, card_json: str) -> Optional[str]:
+        """
+        创建卡片实体
+        :return: card_id
+        """
+        request = CreateCardRequest.builder() \
+            .request_body(CreateCardRequestBody.builder().type("card_json").data(card_json).build()) \
+            .build()
+        response = await feishu_limiter.call("cardkit.card", lambda: self.client.cardkit.v1.card.acreate(request), Priority.HIGH)
+        return response.data.card_id if self._record("create", response, card_json) else None
+
+    async def send_card(self, receive_id: str, card_id: str, receive_id_type: str = "open_id") -> Optional[str]:
+        """
+        以卡片实体 ID 发送消息
+        :return: message_id
+        """
+        content = json.dumps({"type": "card", "data": {"card_id": card_id}})
+        request = CreateMessageRequest.builder() \
+            .receive_id_type(receive_id_type) \
+            .request_body(CreateMessageRequestBody.builder()
+                          .receive_id(receive_id)
+                          .msg_type("interactive")
+                          .content(content)
+                          .build()) \
+            .build()
+        response = await feishu_limiter.call("im.message.create", lambda: self.client.im.v1.message.acreate(request), Priority.HIGH)
+        return response.data.message_id if self._record("send", response, content) else None
+
+    async def update_element_content(self, card_id: str, element_id: str, content: str, sequence: int) -> bool:
+        """
+        流式更新文本元素的全量内容，新内容以旧内容为前缀时客户端以打字机效果展示增量
+        """
+        request = ContentCardElementRequest.builder() \
+            .card_id(card_id) \
+            .element_id(element_id) \
+            .request_body(ContentCardElementRequestBody.builder()
+                          .uuid(str(uuid.uuid4()))
+                          .content(content)
+                          .sequence(sequence)
+                          .build()) \
+            .build()
+        response = await feishu_limiter.call(
+            "cardkit.card_element", lambda: self.client.cardkit.v1.card_element.acontent(request), Priority.NORMAL
+        )
+        return self._record("content", response, content)
+
+    async def update_settings(self, card_id: str, card_settings: str, sequence: int) -> bool:
+        request = SettingsCardRequest.builder() \
+            .card_id(card_id) \
+            .request_body(SettingsCardRequestBody.builder()
+                          .settings(card_settings)
+                          .uuid(str(uuid.uuid4()))
+                          .sequence(sequence)
+                          .build()) \
+            .build()
+        response = await feishu_limiter.call("cardkit.card", lambda: self.client.cardkit.v1.card.asettings(request), Priority.HIGH)
+        return self._record("settings", response, card_settings)
+
+    async def update_card(self, card_id: str, card_json: str, sequence: int) -> bool:
+        request = UpdateCardRequest.builder() \
+            .card_id(card_id) \
+            .request_body(UpdateCardRequestBody.builder()
+                          .card(Card.builder().type("card_json").data(card_json).build())
+                          .uuid(str(uuid.uuid4()))
+                          .sequence(sequence)
+                          .build()) \
+            .build()
+        response = await feishu_limiter.call("cardkit.card", lambda: self.client.cardkit.v1.card.aupdate(request), Priority.HIGH)
+        return self._record("update", response, card_json)
+
+
+class StreamingCard:
+    """
+    一张流式卡片实体
+    - update() 只发送正文元素的内容，而不是整张卡片
+    - 同一张卡片的所有操作携带严格递增的 sequence，飞书按 sequence 丢弃乱序请求
+    - finish() 关闭 streaming_mode 后用最终内容 (含完成态标题) 整卡更新一次
+    """
+
+    def __init__(self, api: CardKitApi, card_id: str, message_id: str = None):
+        self.api = api
+        self.card_id = card_id
+        self.message_id = message_id
+        self.created_at = time.monotonic()
+        self.sequence = 0
+        self.finished = False
+        self._last_content: Optional[str] = None
+
+    def _next_sequence(self) -> int:
+        self.sequence += 1
+        return self.sequence
+
+    async def update(self, content: str) -> bool:
+        if self.finished:
+            return False
+        if content == self._last_content:
+            return True
+        if len(content.encode("utf-8")) > settings.CARD_MAX_PAYLOAD_BYTES:
+            # 超出上限的中间内容不再推送，由 finish() 截断后整卡更新
+            logger.debug(f"Streaming card {self.card_id} content exceeds size limit, waiting for final update")
+            return True
+        ok = await self.api.update_element_content(self.card_id, CONTENT_ELEMENT_ID, content, self._next_sequence())
+        if ok:
+            self._last_content = content
+        return ok
+
+    async def finish(self, content: str, template: str, title: str) -> bool:
+        """
+        结束流式：关闭 streaming_mode，并以完成态的标题与最终内容更新整卡
+        """
+        if not self.finished:
+            settled = await self.api.update_settings(
+                self.card_id, json.dumps({"config": {"streaming_mode": False}}), self._next_sequence()
+            )
+            if not settled:
+                return False
+            self.finished = True
+        card_json = card_templates.render("streaming_card_final", template=template, title=title, content=content)
+        return await self.api.update_card(self.card_id, card_json, self._next_sequence())
+
+
+class StreamingCardRegistry:
+    """
+    按 message_id 记录流式卡片实体，FeishuService 据此选择元素级流式更新或整卡 patch
+    """
+
+    # 飞书在流式模式开启 10 分钟后自动关闭，超过该时间的记录不再使用
+    MAX_AGE = 600
+
+    def __init__(self, api: CardKitApi = None):
+        self.api = api or CardKitApi()
+        self._cards: Dict[str, StreamingCard] = {}
+
+    async def send(self, receive_id: str, template: str, title: str, content: str,
+                   receive_id_type: str = "open_id") -> Optional[str]:
+        """
+        创建流式卡片实体并发送
+        :return: message_id，失败时返回 None (调用方回退为普通卡片)
+        """
+        self._prune()
+        try:
+            card_json = card_templates.render("streaming_card", template=template, title=title,
+                                              content=content, summary=title)
+            card_id = await self.api.create_card(card_json)
+            if not card_id:
+                return None
+            message_id = await self.api.send_card(receive_id, card_id, receive_id_type)
+            if not message_id:
+                return None
+        except Exception as e:
+            logger.error(f"Error sending streaming card: {e}", exc_info=True)
+            return None
+        self._cards[message_id] = StreamingCard(self.api, card_id, message_id)
+        return message_id
+
+    def get(self, message_id: str) -> Optional[StreamingCard]:
+        card = self._cards.get(message_id)
+        if card is not None and time.monotonic() - card.created_at > self.MAX_AGE:
+            del self._cards[message_id]
+            return None
+        return card
+
+    async def update(self, message_id: str, content: str) -> bool:
+        card = self.get(message_id)
+        if card is None:
+            return False
+        try:
+            return await card.update(content)
+        except Exception as e:
+            logger.error(f"Error updating streaming card {message_id}: {e}", exc_info=True)
+            return False
+
+    async def finish(self, message_id: str, content: str, template: str, title: str) -> bool:
+        card = self.get(message_id)
+        if card is None:
+            return False
+        try:
+            ok = await card.finish(content, template, title)
+        except Exception as e:
+            logger.error(f"Error finishing streaming card {message_id}: {e}", exc_info=True)
+            return False
+        if ok:
+            self._cards.pop(message_id, None)
+        return ok
+
+    def _prune(self):
+        now = time.monotonic()
+        for message_id in [m for m, c in self._cards.items() if now - c.created_at > self.MAX_AGE]:
+            del self._cards[message_id]
+
+    def stats(self) -> dict:
+        return {"active_cards": len(self._cards)}
+
+
+streaming_cards = StreamingCardRegistry()
+metrics.register_collector("streaming_cards", streaming_cards.stats)
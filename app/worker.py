@@ -0,0 +1,34 @@
+"""
+飞书事件 worker：从 Redis Stream 消费接入进程入队的事件并处理 (EVENT_QUEUE_MODE=redis)
+用法: python -m app.worker
+"""
+import signal
+import asyncio
+import logging
+from app.core.logger import setup_logging
+
+setup_logging()
+
+from app.core.config import settings
+from app.core.event_queue import event_queue
+from app.core.task_dispatcher import task_dispatcher
+import app.core.feishu  # noqa: F401  初始化飞书客户端并注册事件处理函数
+
+logger = logging.getLogger(__name__)
+
+
+async def main():
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, event_queue.stop)
+
+    logger.info("Starting Feishu event worker...")
+    await event_queue.run()
+
+    # 停止读取后等待已领取的事件处理完成，未完成的事件由其他 worker 重新认领
+    await task_dispatcher.drain(settings.DISPATCHER_DRAIN_TIMEOUT)
+    logger.info("Feishu event worker stopped")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+"""
+卡片渲染微基准：逐次构建嵌套 dict + json.dumps (旧方式) 对比预编译模板 card_templates
+用法: python bench_card_templates.py
+"""
+import json
+import timeit
+from app.core.card_templates import card_templates
+from app.core.stream_render import StreamRenderBuffer
+import app.services.feishu_service  # noqa: F401  注册卡片模板
+
+PERIOD = "2026-10-01 ~ 2026-10-07 (周总结)"
+LINE = "- **本周进展**：完成了提示词优化模块的重构，`chat_many` 并发度提升，修复 3 个缺陷\n"
+
+
+def build_dict_card(content: str, is_finished: bool) -> str:
+    """旧实现：每次更新都重建完整 dict 并序列化"""
+    title = "✅ 周度递归进步总结完成" if is_finished else "📊 正在生成周度递归进步总结..."
+    template = "green" if is_finished else "purple"
+    display_content = content.strip().replace("```markdown", "").replace("```", "").strip()
+    card_content = {
+        "config": {"wide_screen_mode": True},
+        "header": {"template": template, "title": {"content": title, "tag": "plain_text"}},
+        "elements": [
+            {
+                "tag": "div",
+                "text": {"content": f"**📅 分析周期**: {PERIOD}\n\n{display_content}", "tag": "lark_md"}
+            }
+        ]
+    }
+    return json.dumps(card_content)
+
+
+def build_template_card(content, is_finished: bool) -> str:
+    return card_templates.render(
+        "weekly_summary",
+        template="green" if is_finished else "purple",
+        title="✅ 周度递归进步总结完成" if is_finished else "📊 正在生成周度递归进步总结...",
+        period=PERIOD,
+        content=content
+    )
+
+
+def bench_single(lines: int, number: int = 2000):
+    content = "```markdown\n" + LINE * lines + "```"
+    buffer = StreamRenderBuffer.from_text(content)
+    old = timeit.timeit(lambda: build_dict_card(content, False), number=number)
+    new = timeit.timeit(lambda: build_template_card(content, False), number=number)
+    cached = timeit.timeit(lambda: build_template_card(buffer, False), number=number)
+    print(f"{len(content):>7} chars | dict+json.dumps {old / number * 1e6:9.1f}us"
+          f" | template(str) {new / number * 1e6:9.1f}us"
+          f" | template(buffer) {cached / number * 1e6:9.1f}us"
+          f" | payload {len(build_dict_card(content, False)):>7} -> {len(build_template_card(buffer, False).encode()):>7} bytes")
+
+
+def bench_stream(lines: int, chunk_size: int = 8, render_every: int = 20):
+    """模拟一次流式总结：逐 chunk 追加，每 render_every 个 chunk 渲染一次卡片"""
+    text = "```markdown\n" + LINE * lines + "```"
+    chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+
+    def old():
+        full_content = ""
+        for i, chunk in enumerate(chunks):
+            full_content += chunk
+            if i % render_every == 0:
+                build_dict_card(full_content, False)
+        build_dict_card(full_content, True)
+
+    def new():
+        buffer = StreamRenderBuffer()
+        for i, chunk in enumerate(chunks):
+            buffer.append(chunk)
+            if i % render_every == 0:
+                build_template_card(buffer, False)
+        buffer.close()
+        build_template_card(buffer, True)
+
+    t_old = min(timeit.repeat(old, number=1, repeat=3))
+    t_new = min(timeit.repeat(new, number=1, repeat=3))
+    print(f"stream {len(text):>7} chars / {len(chunks)} chunks | old {t_old * 1e3:8.1f}ms | new {t_new * 1e3:8.1f}ms"
+          f" | x{t_old / t_new:.1f}")
+
+
+if __name__ == "__main__":
+    print("📊 单次渲染")
+    for n in (5, 50, 300):
+        bench_single(n)
+    print("\n📊 流式渲染 (整段输出)")
+    for n in (50, 300, 1000):
+        bench_stream(n)
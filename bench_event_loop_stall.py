@@ -0,0 +1,141 @@
+"""
+飞书回调事件循环阻塞基准：event_dispatcher.do 在事件循环中同步执行 (旧方式) 对比放到线程池执行
+模拟若干路流式输出 (每 5ms 推进一次)，同时并发到达加密回调，统计流式 tick 的延迟与每个回调造成的阻塞时间
+用法: python bench_event_loop_stall.py
+"""
+import os
+import json
+import time
+import base64
+import hashlib
+import asyncio
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+import lark_oapi
+from Crypto.Cipher import AES
+from lark_oapi.api.im.v1 import P2ImMessageReceiveV1
+
+ENCRYPT_KEY = "bench_encrypt_key"
+VERIFICATION_TOKEN = "bench_verification_token"
+TICK = 0.005
+STREAMS = 20
+CALLBACKS = 200
+CALLBACK_INTERVAL = 0.002
+
+
+def build_request(index: int) -> lark_oapi.RawRequest:
+    """构造一条带签名的加密 im.message.receive_v1 回调"""
+    text = "请帮我优化这段提示词：" + "你是一名资深的产品经理，需要根据用户反馈整理需求文档。" * 20
+    payload = json.dumps({
+        "schema": "2.0",
+        "header": {"event_id": f"evt_{index}", "event_type": "im.message.receive_v1", "token": VERIFICATION_TOKEN,
+                   "create_time": str(int(time.time() * 1000)), "app_id": "cli_bench", "tenant_key": "bench"},
+        "event": {
+            "sender": {"sender_id": {"open_id": f"ou_{index % 10}", "union_id": "on_bench", "user_id": "u_bench"},
+                       "sender_type": "user", "tenant_key": "bench"},
+            "message": {"message_id": f"om_{index}", "chat_id": "oc_bench", "chat_type": "p2p", "message_type": "text",
+                        "create_time": str(int(time.time() * 1000)), "content": json.dumps({"text": text}, ensure_ascii=False)}
+        }
+    }, ensure_ascii=False).encode("utf-8")
+    pad = AES.block_size - len(payload) % AES.block_size
+    iv = os.urandom(AES.block_size)
+    cipher = AES.new(hashlib.sha256(ENCRYPT_KEY.encode()).digest(), AES.MODE_CBC, iv)
+    encrypted = base64.b64encode(iv + cipher.encrypt(payload + bytes([pad]) * pad)).decode()
+    body = json.dumps({"encrypt": encrypted}).encode("utf-8")
+
+    timestamp, nonce = str(int(time.time())), f"nonce{index}"
+    signature = hashlib.sha256((timestamp + nonce + ENCRYPT_KEY).encode() + body).hexdigest()
+    req = lark_oapi.RawRequest()
+    req.uri = "/feishu/callback"
+    req.body = body
+    req.headers = {"X-Lark-Request-Timestamp": timestamp, "X-Lark-Request-Nonce": nonce, "X-Lark-Signature": signature}
+    return req
+
+
+async def run(mode: str, requests: list) -> dict:
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=4) if mode == "thread" else None
+    received = []
+
+    def handler(event: P2ImMessageReceiveV1):
+        # 与 feishu_handler 一致：在线程中执行时切回事件循环派发
+        try:
+            asyncio.get_running_loop().call_soon(received.append, event.header.event_id)
+        except RuntimeError:
+            loop.call_soon_threadsafe(received.append, event.header.event_id)
+
+    dispatcher = lark_oapi.EventDispatcherHandler.builder(ENCRYPT_KEY, VERIFICATION_TOKEN, lark_oapi.LogLevel.ERROR) \
+        .register_p2_im_message_receive_v1(handler) \
+        .build()
+
+    lags = []
+    stalls = []
+    done = False
+
+    async def stream():
+        expected = time.perf_counter() + TICK
+        while not done:
+            await asyncio.sleep(TICK)
+            now = time.perf_counter()
+            lags.append(max(0.0, now - expected))
+            expected = now + TICK
+
+    async def callback(req):
+        # 只统计回调在事件循环线程上同步执行的时间 (线程池模式下为提交任务与取回结果)
+        t0 = time.perf_counter()
+        if executor is not None:
+            future = loop.run_in_executor(executor, dispatcher.do, req)
+            stalls.append(time.perf_counter() - t0)
+            resp = await future
+        else:
+            resp = dispatcher.do(req)
+            stalls.append(time.perf_counter() - t0)
+        assert resp.status_code == 200, resp.content
+
+    streams = [asyncio.create_task(stream()) for _ in range(STREAMS)]
+    await asyncio.sleep(0.05)
+    baseline = len(lags)
+    started = time.perf_counter()
+    callbacks = []
+    for req in requests:
+        callbacks.append(asyncio.create_task(callback(req)))
+        await asyncio.sleep(CALLBACK_INTERVAL)
+    await asyncio.gather(*callbacks)
+    elapsed = time.perf_counter() - started
+    done = True
+    await asyncio.gather(*streams)
+    if executor is not None:
+        executor.shutdown()
+    await asyncio.sleep(0)
+
+    samples = sorted(lags[baseline:])
+    return {
+        "received": len(received),
+        "p50": statistics.median(samples),
+        "p99": samples[int(len(samples) * 0.99)],
+        "max": samples[-1],
+        "stall_mean": statistics.mean(stalls),
+        "stall_max": max(stalls),
+        "elapsed": elapsed,
+    }
+
+
+def measure_do_cost(requests: list) -> float:
+    dispatcher = lark_oapi.EventDispatcherHandler.builder(ENCRYPT_KEY, VERIFICATION_TOKEN, lark_oapi.LogLevel.ERROR) \
+        .register_p2_im_message_receive_v1(lambda event: None) \
+        .build()
+    started = time.perf_counter()
+    for req in requests:
+        dispatcher.do(req)
+    return (time.perf_counter() - started) / len(requests)
+
+
+if __name__ == "__main__":
+    requests = [build_request(i) for i in range(CALLBACKS)]
+    print(f"event_dispatcher.do 单次耗时: {measure_do_cost(requests) * 1e3:.3f}ms "
+          f"(body {len(requests[0].body)} bytes)")
+    print(f"📊 {STREAMS} 路流式输出 (tick {TICK * 1e3:.0f}ms) + {CALLBACKS} 个回调 (间隔 {CALLBACK_INTERVAL * 1e3:.0f}ms)")
+    for mode in ("inline", "thread"):
+        r = asyncio.run(run(mode, requests))
+        print(f"{mode:>6} | tick 延迟 p50 {r['p50'] * 1e3:6.2f}ms  p99 {r['p99'] * 1e3:6.2f}ms  max {r['max'] * 1e3:6.2f}ms"
+              f" | 每回调阻塞事件循环 mean {r['stall_mean'] * 1e3:6.3f}ms  max {r['stall_max'] * 1e3:6.3f}ms | 处理 {r['received']} 个, {r['elapsed']:.2f}s")
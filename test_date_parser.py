@@ -0,0 +1,106 @@
+import time
+import datetime
+import unittest
+
+from app.core.date_parser import parse_date_expression
+
+# 2026-02-11 为周三
+NOW = datetime.datetime(2026, 2, 11, 15, 30)
+
+# (用户输入, 起始日期, 结束日期)
+CORPUS = [
+    ("查询今天的日报", "2026-02-11", "2026-02-11"),
+    ("查询昨天的日报", "2026-02-10", "2026-02-10"),
+    ("看看昨日汇报", "2026-02-10", "2026-02-10"),
+    ("前天的", "2026-02-09", "2026-02-09"),
+    ("查看大前天的日报", "2026-02-08", "2026-02-08"),
+    ("查询日报", "2026-02-11", "2026-02-11"),
+    ("本周", "2026-02-09", "2026-02-15"),
+    ("查看这周的汇报", "2026-02-09", "2026-02-15"),
+    ("上周", "2026-02-02", "2026-02-08"),
+    ("查询上个星期的日报", "2026-02-02", "2026-02-08"),
+    ("上上周的汇报", "2026-01-26", "2026-02-01"),
+    ("上周三", "2026-02-04", "2026-02-04"),
+    ("查询上星期五的日报", "2026-02-06", "2026-02-06"),
+    ("上周日", "2026-02-08", "2026-02-08"),
+    ("周一的日报", "2026-02-09", "2026-02-09"),
+    ("查询周五的日报", "2026-02-06", "2026-02-06"),
+    ("周三", "2026-02-11", "2026-02-11"),
+    ("本周二", "2026-02-10", "2026-02-10"),
+    ("本月", "2026-02-01", "2026-02-28"),
+    ("查询这个月的汇报", "2026-02-01", "2026-02-28"),
+    ("上个月", "2026-01-01", "2026-01-31"),
+    ("上月的日报", "2026-01-01", "2026-01-31"),
+    ("1月", "2026-01-01", "2026-01-31"),
+    ("查询12月份的汇报", "2025-12-01", "2025-12-31"),
+    ("2月9号", "2026-02-09", "2026-02-09"),
+    ("查询2月9日的日报", "2026-02-09", "2026-02-09"),
+    ("二月九号", "2026-02-09", "2026-02-09"),
+    ("十二月三十一日的日报", "2025-12-31", "2025-12-31"),
+    ("02-09", "2026-02-09", "2026-02-09"),
+    ("查一下 2/3 的日报", "2026-02-03", "2026-02-03"),
+    ("2025-12-25", "2025-12-25", "2025-12-25"),
+    ("2026年1月20日", "2026-01-20", "2026-01-20"),
+    ("2025年11月", "2025-11-01", "2025-11-30"),
+    ("9号的日报", "2026-02-09", "2026-02-09"),
+    ("最近7天", "2026-02-05", "2026-02-11"),
+    ("最近三天的汇报", "2026-02-09", "2026-02-11"),
+    ("近两周", "2026-01-29", "2026-02-11"),
+    ("过去一个月", "2026-01-12", "2026-02-11"),
+    ("2月1日到2月5日", "2026-02-01", "2026-02-05"),
+    ("2月1日至5日的日报", "2026-02-01", "2026-02-05"),
+    ("02-01~02-06", "2026-02-01", "2026-02-06"),
+    ("上周一到上周三", "2026-02-02", "2026-02-04"),
+    ("上周三到周五", "2026-02-04", "2026-02-06"),
+    ("上周五到周一", "2026-02-06", "2026-02-09"),
+]
+
+# 规则无法确定、应交给 LLM 的表达
+FALLBACK = [
+    "周末的日报",
+    "上个季度的汇报",
+    "这几天的日报",
+    "春节前一天",
+    "2月30日",
+    "最近0天",
+    # 并列而非区间的多个日期
+    "昨天和今天的日报",
+    "周一和周三",
+    "上周一、上周三的日报",
+]
+
+
+class TestDateParser(unittest.TestCase):
+    def test_corpus(self):
+        for text, start, end in CORPUS:
+            with self.subTest(text=text):
+                parsed = parse_date_expression(text, now=NOW)
+                self.assertIsNotNone(parsed)
+                start_ts, end_ts, desc = parsed
+                self.assertEqual(datetime.datetime.fromtimestamp(start_ts),
+                                 datetime.datetime.strptime(start, "%Y-%m-%d"))
+                self.assertEqual(datetime.datetime.fromtimestamp(end_ts),
+                                 datetime.datetime.strptime(end, "%Y-%m-%d") + datetime.timedelta(hours=23, minutes=59, seconds=59))
+                self.assertEqual(desc, start if start == end else f"{start} 至 {end}")
+
+    def test_unparseable_falls_back(self):
+        for text in FALLBACK:
+            with self.subTest(text=text):
+                self.assertIsNone(parse_date_expression(text, now=NOW))
+
+    def test_coverage_and_latency(self):
+        texts = [text for text, _, _ in CORPUS] + FALLBACK
+        rounds = 200
+        started = time.perf_counter()
+        for _ in range(rounds):
+            results = [parse_date_expression(text, now=NOW) for text in texts]
+        per_call = (time.perf_counter() - started) / (rounds * len(texts))
+        coverage = sum(r is not None for r in results) / len(texts)
+        print(f"\n📊 日期解析覆盖率 {coverage:.0%} ({len(texts)} 条), 平均耗时 {per_call * 1e6:.1f}us")
+        self.assertGreaterEqual(coverage, len(CORPUS) / len(texts))
+        # 远低于一次 LLM 往返
+        self.assertLess(per_call, 0.001)
+
+
+if __name__ == "__main__":
+    unittest.main()
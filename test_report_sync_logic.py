@@ -6,6 +6,7 @@ import time
 from app.services.report_analysis_service import ReportAnalysisService
 from app.services.feishu_service import FeishuService
 from app.core.config import settings
+from app.core.llm_batch import BatchResult
 import logging
 
 # Configure logging
@@ -42,7 +43,12 @@ class TestRealBitableSync(unittest.TestCase):
         # Mock LLM Client to save cost/time, we focus on Bitable Sync
         self.service.llm_client = MagicMock()
         # 修改诊断建议以展示变化
-        self.service.llm_client.chat = AsyncMock(return_value='{"advice": "✅ 诊断建议已更新 - 我们可以看到内容发生了变化！(Updated by Trae)", "score": 99}')
+        diagnosis = '{"advice": "✅ 诊断建议已更新 - 我们可以看到内容发生了变化！(Updated by Trae)", "score": 99}'
+        self.service.llm_client.chat = AsyncMock(return_value=diagnosis)
+        # 同步任务通过 chat_many 批量诊断：每个请求返回一条成功结果
+        self.service.llm_client.chat_many = AsyncMock(
+            side_effect=lambda requests, **kwargs: [BatchResult(i, content=diagnosis) for i in range(len(requests))]
+        )
         
         # Test User Names
         # Use Real Bot ID for testing User Field logic
@@ -0,0 +1,138 @@
+import os
+import json
+import unittest
+from unittest.mock import patch
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from app.core.config import settings
+from app.services.feishu_service import FeishuService
+from app.services.streaming_card import CONTENT_ELEMENT_ID, StreamingCardRegistry
+
+
+class StubCardKitApi:
+    """本地桩：记录 CardKit 调用，不访问飞书"""
+
+    def __init__(self, fail_ops=()):
+        self.calls = []
+        self.fail_ops = set(fail_ops)
+
+    async def create_card(self, card_json):
+        self.calls.append(("create", json.loads(card_json)))
+        return None if "create" in self.fail_ops else "card_1"
+
+    async def send_card(self, receive_id, card_id, receive_id_type="open_id"):
+        self.calls.append(("send", receive_id, card_id))
+        return None if "send" in self.fail_ops else "om_1"
+
+    async def update_element_content(self, card_id, element_id, content, sequence):
+        self.calls.append(("content", card_id, element_id, content, sequence))
+        return "content" not in self.fail_ops
+
+    async def update_settings(self, card_id, card_settings, sequence):
+        self.calls.append(("settings", card_id, json.loads(card_settings), sequence))
+        return "settings" not in self.fail_ops
+
+    async def update_card(self, card_id, card_json, sequence):
+        self.calls.append(("update", card_id, json.loads(card_json), sequence))
+        return "update" not in self.fail_ops
+
+    def sequences(self):
+        return [call[-1] for call in self.calls if call[0] in ("content", "settings", "update")]
+
+
+class TestStreamingCard(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.api = StubCardKitApi()
+        self.registry = StreamingCardRegistry(api=self.api)
+
+    async def test_send_creates_streaming_card_entity(self):
+        message_id = await self.registry.send("ou_1", "blue", "生成中", "正文")
+        self.assertEqual(message_id, "om_1")
+        _, card = self.api.calls[0]
+        self.assertEqual(card["schema"], "2.0")
+        self.assertTrue(card["config"]["streaming_mode"])
+        element = card["body"]["elements"][0]
+        self.assertEqual(element["element_id"], CONTENT_ELEMENT_ID)
+        self.assertEqual(element["content"], "正文")
+        self.assertEqual(self.api.calls[1], ("send", "ou_1", "card_1"))
+        self.assertIsNotNone(self.registry.get("om_1"))
+
+    async def test_updates_send_only_element_content_with_increasing_sequence(self):
+        await self.registry.send("ou_1", "blue", "生成中", "")
+        for text in ("你", "你好", "你好", "你好，世界"):
+            self.assertTrue(await self.registry.update("om_1", text))
+        contents = [call for call in self.api.calls if call[0] == "content"]
+        # 内容未变化的更新被跳过
+        self.assertEqual([call[3] for call in contents], ["你", "你好", "你好，世界"])
+        self.assertTrue(all(call[2] == CONTENT_ELEMENT_ID for call in contents))
+        self.assertEqual(self.api.sequences(), [1, 2, 3])
+
+    async def test_finish_settles_then_updates_whole_card(self):
+        await self.registry.send("ou_1", "blue", "生成中", "")
+        await self.registry.update("om_1", "部分")
+        self.assertTrue(await self.registry.finish("om_1", "全部内容", "green", "完成"))
+        settings_call, update_call = self.api.calls[-2:]
+        self.assertEqual(settings_call[0], "settings")
+        self.assertFalse(settings_call[2]["config"]["streaming_mode"])
+        self.assertEqual(update_call[0], "update")
+        final = update_call[2]
+        self.assertEqual(final["header"]["template"], "green")
+        self.assertEqual(final["header"]["title"]["content"], "完成")
+        self.assertEqual(final["body"]["elements"][0]["content"], "全部内容")
+        self.assertEqual(self.api.sequences(), [1, 2, 3])
+        self.assertIsNone(self.registry.get("om_1"))
+
+    async def test_finish_retry_after_failed_update_keeps_sequence_increasing(self):
+        await self.registry.send("ou_1", "blue", "生成中", "")
+        self.api.fail_ops.add("update")
+        self.assertFalse(await self.registry.finish("om_1", "全部", "green", "完成"))
+        self.assertIsNotNone(self.registry.get("om_1"))
+        self.api.fail_ops.clear()
+        self.assertTrue(await self.registry.finish("om_1", "全部", "green", "完成"))
+        # 已关闭流式模式的卡片重试时不再重复 settings
+        self.assertEqual([call[0] for call in self.api.calls[2:]], ["settings", "update", "update"])
+        self.assertEqual(self.api.sequences(), [1, 2, 3])
+
+    async def test_send_failure_returns_none(self):
+        api = StubCardKitApi(fail_ops=("create",))
+        registry = StreamingCardRegistry(api=api)
+        self.assertIsNone(await registry.send("ou_1", "blue", "生成中", ""))
+        self.assertEqual(registry.stats(), {"active_cards": 0})
+
+
+class TestFeishuServiceStreamingMode(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.api = StubCardKitApi()
+        self.registry = StreamingCardRegistry(api=self.api)
+        patches = [
+            patch.object(settings, "FEISHU_STREAMING_CARD_ENABLED", True),
+            patch("app.services.feishu_service.streaming_cards", self.registry),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    async def test_optimization_stream_uses_element_updates(self):
+        message_id = await FeishuService.send_optimization_stream_start_card("ou_1", "写一首诗")
+        self.assertEqual(message_id, "om_1")
+        self.assertEqual(FeishuService.stream_min_interval(message_id), settings.CARDKIT_STREAM_MIN_INTERVAL)
+
+        await FeishuService.update_optimization_stream_card(message_id, "写一首诗", "```markdown\n# 角色")
+        content = self.api.calls[-1]
+        self.assertEqual(content[0], "content")
+        self.assertEqual(content[3], "**原始提示词**：\n写一首诗\n\n**优化结果**：\n# 角色")
+
+        await FeishuService.update_optimization_stream_card(message_id, "写一首诗", "# 角色\n诗人", is_finished=True)
+        self.assertEqual([call[0] for call in self.api.calls[-2:]], ["settings", "update"])
+        self.assertEqual(self.api.calls[-1][2]["header"]["title"]["content"], "✅ 提示词优化完成")
+        self.assertIsNone(FeishuService.stream_min_interval(message_id))
+
+    async def test_disabled_streaming_card_falls_back(self):
+        with patch.object(settings, "FEISHU_STREAMING_CARD_ENABLED", False):
+            self.assertIsNone(await FeishuService.send_streaming_card("ou_1", "blue", "t", "c"))
+        self.assertEqual(self.api.calls, [])
+
+
+if __name__ == "__main__":
+    unittest.main()